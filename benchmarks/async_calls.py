@@ -0,0 +1,99 @@
+##
+# async_calls.py - compare a thread pool with asyncio (evsamples.aio) for many small API calls
+#
+# Run from the top folder of this repository (needs aiohttp):
+#
+#   python -m benchmarks.async_calls
+#
+# Makes --calls list_resources calls against a local mock server that waits --latency seconds before answering
+# each one, first from a pool of threads sharing one ApiSession, then from a single thread through AsyncSession,
+# at each level of concurrency. With enough concurrency both are limited by latency alone; the difference is
+# that the threaded version needs one thread (and its stack) per call in flight. The mock server runs in a child
+# process so that its threads don't compete with the client's for the interpreter lock.
+##
+import argparse
+import asyncio
+import multiprocessing
+import time
+
+from exavault import ResourcesApi
+
+from benchmarks.mock_server import MockServer
+from benchmarks.mock_server import send_json
+from evsamples.aio import AsyncSession
+from evsamples.pool import imap_unordered
+from evsamples.session import ApiSession
+
+CONCURRENCY = [8, 64, 256]
+
+LISTING = {
+    'responseStatus': 200,
+    'totalResults': 1,
+    'returnedResults': 1,
+    'data': [{'id': 1, 'type': 'resource', 'attributes': {'name': 'report.csv', 'path': '/report.csv', 'type': 'file',
+                                                          'size': 1024, 'hash': 'abc'}}],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark threads vs asyncio for many small API calls')
+    parser.add_argument('--calls', type=int, default=1000, help='number of API calls per run (default: 1000)')
+    parser.add_argument('--latency', type=float, default=0.1, help='seconds per request (default: 0.1)')
+    return parser.parse_args()
+
+
+def list_resources(request, query, body):
+    send_json(request, LISTING)
+
+
+def serve(latency, urls):
+    with MockServer(latency=latency) as server:
+        server.route('GET', '/resources/list', list_resources)
+        urls.put(server.url)
+        while True:
+            time.sleep(3600)
+
+
+def time_threads(url, calls, concurrency):
+    resources_api = ApiSession(url, pool_size=concurrency).api(ResourcesApi)
+    started = time.time()
+    for _, _, error in imap_unordered(
+            lambda i: resources_api.list_resources('key', 'token', '/', limit=1), range(calls), concurrency):
+        if error is not None:
+            raise error
+    return time.time() - started
+
+
+async def _run_async(url, calls, concurrency):
+    async with AsyncSession(url, limit=concurrency) as session:
+        resources_api = session.api(ResourcesApi)
+        await asyncio.gather(*[resources_api.list_resources('key', 'token', '/', limit=1) for _ in range(calls)])
+
+
+def time_async(url, calls, concurrency):
+    started = time.time()
+    asyncio.run(_run_async(url, calls, concurrency))
+    return time.time() - started
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    urls = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(args.latency, urls))
+    server.daemon = True
+    server.start()
+    url = urls.get()
+
+    try:
+        print("{0: >11} {1: >12} {2: >10}".format('Concurrency', 'Threads (s)', 'Async (s)'))
+        for concurrency in CONCURRENCY:
+            thread_seconds = time_threads(url, args.calls, concurrency)
+            async_seconds = time_async(url, args.calls, concurrency)
+            print("{0: >11} {1: >12.2f} {2: >10.2f}".format(concurrency, thread_seconds, async_seconds))
+    finally:
+        server.terminate()
+
+    print("")
+    print("Ideal time at each level is calls * latency / concurrency: {}".format(
+        ", ".join("{:.2f}s".format(args.calls * args.latency / c) for c in CONCURRENCY)))
@@ -0,0 +1,97 @@
+##
+# download_modes.py - compare a server-side zip download with parallel per-file downloads
+#
+# Run from the top folder of this repository:
+#
+#   python -m benchmarks.download_modes
+#
+# A local mock server stands in for ExaVault. It waits `latency` seconds before answering each request, sends
+# at most `bandwidth` bytes/second per connection, and for multi-file downloads spends size / zip_rate seconds
+# "compressing" before the first byte goes out. Those knobs are rough; change them to match what you see from
+# your own account before trusting the numbers.
+##
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from exavault import ResourcesApi
+
+from benchmarks.mock_server import MockServer
+from benchmarks.mock_server import send_bytes
+from evsamples.download import choose_download_mode
+from evsamples.download import download_many
+from evsamples.download import download_to_file
+from evsamples.session import ApiSession
+
+# (file count, size of each file in bytes)
+SCENARIOS = [
+    (4, 20 * 1024 * 1024),
+    (50, 1024 * 1024),
+    (500, 16 * 1024),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark zip vs parallel downloads against a mock server')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request (default: 0.05)')
+    parser.add_argument('--bandwidth', type=float, default=50, help='MB/s per connection (default: 50)')
+    parser.add_argument('--zip-rate', type=float, default=100, help='MB/s the server compresses at (default: 100)')
+    parser.add_argument('--zip-ratio', type=float, default=0.3,
+                        help='compressed size as a fraction of the original (default: 0.3)')
+    parser.add_argument('--workers', type=int, default=8, help='parallel download workers (default: 8)')
+    return parser.parse_args()
+
+
+def make_download_route(args, file_size):
+    bandwidth = args.bandwidth * 1024 ** 2
+
+    def download(request, query, body):
+        resources = query.get('resources[]', [])
+        if len(resources) > 1:
+            total = file_size * len(resources)
+            time.sleep(total / (args.zip_rate * 1024 ** 2))
+            send_bytes(request, int(total * args.zip_ratio), bandwidth, 'download.zip')
+        else:
+            send_bytes(request, file_size, bandwidth)
+
+    return download
+
+
+def time_zip(resources_api, resources, target_dir):
+    started = time.time()
+    download_to_file(resources_api, 'key', 'token', resources, os.path.join(target_dir, 'download.zip'))
+    return time.time() - started
+
+
+def time_parallel(resources_api, resources, target_dir, workers):
+    jobs = [(resource, os.path.join(target_dir, 'file{}.csv'.format(i))) for i, resource in enumerate(resources)]
+    started = time.time()
+    for result in download_many(resources_api, 'key', 'token', jobs, workers=workers, retries=0):
+        if result.error is not None:
+            raise result.error
+    return time.time() - started
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    print("{0: >6} {1: >10} {2: >9} {3: >12} {4: >8}".format('Files', 'Size (MB)', 'Zip (s)', 'Parallel (s)', 'Auto'))
+    for file_count, file_size in SCENARIOS:
+        with MockServer(latency=args.latency) as server:
+            server.route('GET', '/resources/download', make_download_route(args, file_size))
+
+            resources_api = ApiSession(server.url, pool_size=args.workers).api(ResourcesApi)
+
+            resources = ['id:{}'.format(i) for i in range(file_count)]
+            target_dir = tempfile.mkdtemp()
+            try:
+                zip_seconds = time_zip(resources_api, resources, target_dir)
+                parallel_seconds = time_parallel(resources_api, resources, target_dir, args.workers)
+            finally:
+                shutil.rmtree(target_dir)
+
+        print("{0: >6} {1: >10.1f} {2: >9.2f} {3: >12.2f} {4: >8}".format(
+            file_count, file_count * file_size / (1024 ** 2), zip_seconds, parallel_seconds,
+            choose_download_mode(file_count, file_count * file_size)))
@@ -0,0 +1,130 @@
+##
+# log_analytics.py - compare per-entry Python loops with the pandas-based evsamples.analytics module
+#
+# Run from the top folder of this repository (needs pandas):
+#
+#   python -m benchmarks.log_analytics
+#
+# Builds --rows synthetic SessionActivityEntry objects, the same objects getSessionLogs returns, and answers the
+# same three questions both ways: failed logins per user, logins per hour and status, and users with at least
+# --threshold failures inside a sliding --window. The pandas timings include copying the entries into a frame.
+##
+import argparse
+import collections
+import datetime
+import random
+import time
+
+from exavault import SessionActivityEntry
+from exavault import SessionActivityEntryAttributes
+
+from evsamples.analytics import counts_by
+from evsamples.analytics import detect_brute_force
+from evsamples.analytics import failed_logins
+from evsamples.analytics import session_logs_frame
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark per-entry loops vs pandas for activity log analysis')
+    parser.add_argument('--rows', type=int, default=1000000, help='number of synthetic log entries (default: 1000000)')
+    parser.add_argument('--users', type=int, default=5000, help='number of distinct usernames (default: 5000)')
+    parser.add_argument('--days', type=float, default=7, help='time span of the log entries (default: 7)')
+    parser.add_argument('--window', type=float, default=5, help='brute-force window in minutes (default: 5)')
+    parser.add_argument('--threshold', type=int, default=10,
+                        help='failures inside the window that count as brute force (default: 10)')
+    return parser.parse_args()
+
+
+def make_entries(rows, users, days, bursts=20):
+    """Random logins spread over `days`, plus `bursts` runs of 30 rapid failures from an intruder account."""
+    random.seed(0)
+    start = datetime.datetime(2020, 1, 1)
+    span = int(days * 86400)
+    logins = []
+    for _ in range(rows - bursts * 30):
+        user = random.randrange(users)
+        logins.append((random.randrange(span), 'user{}'.format(user), '10.0.{}.{}'.format(user // 250, user % 250),
+                       'failed' if random.random() < 0.3 else 'success'))
+    for burst in range(bursts):
+        burst_start = random.randrange(span - 150)
+        for attempt in range(30):
+            logins.append((burst_start + attempt * 5, 'intruder{}'.format(burst), '192.0.2.{}'.format(burst), 'failed'))
+    logins.sort()
+
+    entries = []
+    for i, (offset, username, ip_address, status) in enumerate(logins):
+        attributes = SessionActivityEntryAttributes(
+            created=(start + datetime.timedelta(seconds=offset)).strftime('%Y-%m-%d %H:%M:%S'),
+            username=username, ip_address=ip_address, status=status, operation='PASS', protocol='web',
+            file_name='', bytes_transferred=0, duration=0)
+        entries.append(SessionActivityEntry(id=i + 1, type='sessionActivity', attributes=attributes))
+    return entries
+
+
+def loop_analysis(entries, window, threshold):
+    by_user = collections.Counter()
+    by_hour = collections.Counter()
+    recent = collections.defaultdict(collections.deque)
+    peaks = collections.Counter()
+
+    for entry in entries:
+        attributes = entry.attributes
+        created = datetime.datetime.strptime(attributes.created, '%Y-%m-%d %H:%M:%S')
+        by_hour[(created.replace(minute=0, second=0), attributes.status)] += 1
+        if attributes.status != 'failed':
+            continue
+        by_user[attributes.username] += 1
+
+        # Entries arrive in time order, so each user's deque only has to drop failures from its front
+        failures = recent[attributes.username]
+        failures.append(created)
+        while failures[0] < created - window:
+            failures.popleft()
+        peaks[attributes.username] = max(peaks[attributes.username], len(failures))
+
+    brute_force = dict((user, peak) for user, peak in peaks.items() if peak >= threshold)
+    return by_user, by_hour, brute_force
+
+
+def frame_analysis(frame, window, threshold):
+    failures = failed_logins(frame)
+    by_user = counts_by(failures, 'username')
+    by_hour = counts_by(frame, ['hour', 'status'])
+    brute_force = detect_brute_force(failures, window=window, threshold=threshold)
+    return by_user, by_hour, brute_force
+
+
+def timed(fn, *args):
+    started = time.time()
+    result = fn(*args)
+    return result, time.time() - started
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    window = datetime.timedelta(minutes=args.window)
+
+    print("Building {} synthetic log entries...".format(args.rows))
+    entries = make_entries(args.rows, args.users, args.days)
+
+    (loop_users, loop_hours, loop_brute_force), loop_seconds = timed(loop_analysis, entries, window, args.threshold)
+    frame, frame_seconds = timed(session_logs_frame, entries)
+    (frame_users, frame_hours, frame_brute_force), analysis_seconds = timed(
+        frame_analysis, frame, window, args.threshold)
+
+    # Both approaches must agree before their timings mean anything
+    assert dict(loop_users) == frame_users.to_dict()
+    assert sum(loop_hours.values()) == frame_hours.sum()
+    assert loop_brute_force == frame_brute_force['peak'].to_dict()
+
+    print("")
+    print("{0: <34} {1: >10}".format("Approach", "Seconds"))
+    print("=" * 45)
+    print("{0: <34} {1: >10.2f}".format("Per-entry loop", loop_seconds))
+    print("{0: <34} {1: >10.2f}".format("pandas (including frame build)", frame_seconds + analysis_seconds))
+    print("{0: <34} {1: >10.2f}".format("pandas (frame build only)", frame_seconds))
+    print("{0: <34} {1: >10.2f}".format("pandas (analysis only)", analysis_seconds))
+    print("")
+    print("{} users with failed logins, {} flagged for brute force. Analysis is {:.1f}x faster once the frame "
+          "is built.".format(len(loop_users), len(loop_brute_force),
+                             loop_seconds / max(analysis_seconds, 1e-9)))
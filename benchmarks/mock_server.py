@@ -0,0 +1,112 @@
+##
+# mock_server.py - a tiny local stand-in for the ExaVault API, used by the benchmark scripts
+#
+# The samples' code is pointed at MockServer.url instead of your ACCOUNT_URL, so benchmarks measure the
+# client-side behaviour (connections, concurrency, paging) without touching a real account.
+# Routes are plain functions registered per benchmark; each receives the request handler, the parsed query
+# string and the request body, and uses send_json / send_bytes to reply.
+##
+import json
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+API_PREFIX = '/api/v2'
+
+
+def send_json(request, obj, status=200):
+    body = json.dumps(obj).encode('utf-8')
+    request.send_response(status)
+    request.send_header('Content-Type', 'application/json')
+    request.send_header('Content-Length', str(len(body)))
+    request.end_headers()
+    request.wfile.write(body)
+
+
+def send_bytes(request, size, bandwidth=None, filename='download.bin', block_size=64 * 1024):
+    """Send `size` filler bytes, throttled to `bandwidth` bytes/second per connection if given."""
+    request.send_response(200)
+    request.send_header('Content-Type', 'application/octet-stream')
+    request.send_header('Content-Length', str(size))
+    request.send_header('Content-Disposition', "attachment; filename*=UTF-8''{}".format(filename))
+    request.end_headers()
+    block = b'x' * block_size
+    remaining = size
+    while remaining > 0:
+        chunk = min(remaining, block_size)
+        request.wfile.write(block[:chunk])
+        remaining -= chunk
+        if bandwidth:
+            time.sleep(chunk / bandwidth)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, Nagle's algorithm and delayed ACKs add ~40ms
+    # to every keep-alive response
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self, method):
+        parsed = urlparse(self.path)
+        path = parsed.path[len(API_PREFIX):] if parsed.path.startswith(API_PREFIX) else parsed.path
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        handler = self.server.routes.get((method, path))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if handler is None:
+            send_json(self, {'responseStatus': 404, 'errors': [{'code': 'NOT_FOUND'}]}, status=404)
+        else:
+            handler(self, parse_qs(parsed.query), body)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+class MockServer(ThreadingHTTPServer):
+    """Local HTTP server on a free port that answers registered API routes after `latency` seconds."""
+
+    daemon_threads = True
+    # socketserver's default listen backlog of 5 drops bursts of new connections, which then wait a second for
+    # the client to retry; benchmarks open hundreds at once
+    request_queue_size = 1024
+
+    def __init__(self, latency=0.0):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), _Handler)
+        self.latency = latency
+        self.routes = {}
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}{}'.format(self.server_address[1], API_PREFIX)
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
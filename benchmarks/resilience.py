@@ -0,0 +1,112 @@
+##
+# resilience.py - run a bulk job against a mock server that fails, stalls and has an outage, with and without
+# evsamples.resilience
+#
+# Run from the top folder of this repository:
+#
+#   python -m benchmarks.resilience
+#
+# The mock server answers --failure-rate of requests with HTTP 503, leaves --stall-rate of them hanging for
+# --stall seconds, and answers everything with 503 for --outage seconds starting --outage-at seconds in. Each
+# strategy makes --calls list_resources calls from --workers threads and counts the calls that still failed, the
+# requests the server had to answer, and how many of those arrived during the outage.
+##
+import argparse
+import random
+import threading
+import time
+
+from exavault import ResourcesApi
+
+from benchmarks.mock_server import MockServer
+from benchmarks.mock_server import send_json
+from evsamples.pool import imap_unordered
+from evsamples.resilience import CallPolicy
+from evsamples.resilience import CircuitBreaker
+from evsamples.retry import call_with_retries
+from evsamples.session import ApiSession
+
+LISTING = {'responseStatus': 200, 'totalResults': 0, 'returnedResults': 0, 'data': []}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark retries, timeouts and a circuit breaker against a '
+                                                 'failing server')
+    parser.add_argument('--calls', type=int, default=2000, help='API calls per strategy (default: 2000)')
+    parser.add_argument('--workers', type=int, default=32, help='worker threads (default: 32)')
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per request (default: 0.01)')
+    parser.add_argument('--failure-rate', type=float, default=0.05,
+                        help='fraction of requests answered with 503 (default: 0.05)')
+    parser.add_argument('--stall-rate', type=float, default=0.002,
+                        help='fraction of requests left hanging (default: 0.002)')
+    parser.add_argument('--stall', type=float, default=5.0, help='seconds a hanging request lasts (default: 5)')
+    parser.add_argument('--outage-at', type=float, default=0.5,
+                        help='seconds after the start that the outage begins (default: 0.5)')
+    parser.add_argument('--outage', type=float, default=2.0, help='seconds the outage lasts (default: 2)')
+    return parser.parse_args()
+
+
+class FlakyRoute(object):
+    """A route handler that fails some requests at random, stalls a few, and fails all of them during an outage."""
+
+    def __init__(self, args):
+        self.args = args
+        self.requests = 0
+        self.outage_requests = 0
+        self._started = time.time()
+        self._lock = threading.Lock()
+
+    def __call__(self, request, query, body):
+        elapsed = time.time() - self._started
+        in_outage = self.args.outage_at <= elapsed < self.args.outage_at + self.args.outage
+        with self._lock:
+            self.requests += 1
+            if in_outage:
+                self.outage_requests += 1
+
+        time.sleep(self.args.latency)
+        if in_outage or random.random() < self.args.failure_rate:
+            send_json(request, {'responseStatus': 503, 'errors': [{'code': 'ERROR_UNAVAILABLE'}]}, 503)
+            return
+        if random.random() < self.args.stall_rate:
+            time.sleep(self.args.stall)
+        try:
+            send_json(request, LISTING)
+        except (IOError, OSError):
+            # The client stopped waiting for a stalled request and closed the connection
+            pass
+
+
+def run(url, args, policy, retries):
+    resources_api = ApiSession(url, pool_size=args.workers, policy=policy).api(ResourcesApi)
+
+    def call(_):
+        return call_with_retries(lambda: resources_api.list_resources('key', 'token', '/'), retries=retries)
+
+    started = time.time()
+    failed = sum(1 for _, _, error in imap_unordered(call, range(args.calls), args.workers) if error is not None)
+    return time.time() - started, failed
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    strategies = [
+        ('No retries', lambda: None, 0),
+        ('call_with_retries', lambda: None, 3),
+        ('CallPolicy', lambda: CallPolicy(timeout=(1, 1), retries=3), 0),
+        ('CallPolicy + breaker', lambda: CallPolicy(timeout=(1, 1), retries=3,
+                                                    breaker=CircuitBreaker(failure_threshold=10,
+                                                                           reset_timeout=0.5)), 0),
+    ]
+
+    print("{0: <24} {1: >8} {2: >7} {3: >9} {4: >13}".format(
+        'Strategy', 'Seconds', 'Failed', 'Requests', 'During outage'))
+    print("=" * 65)
+    for name, make_policy, retries in strategies:
+        with MockServer() as server:
+            route = FlakyRoute(args)
+            server.route('GET', '/resources/list', route)
+            seconds, failed = run(server.url, args, make_policy(), retries)
+
+        print("{0: <24} {1: >8.2f} {2: >7} {3: >9} {4: >13}".format(
+            name, seconds, failed, route.requests, route.outage_requests))
@@ -0,0 +1,115 @@
+##
+# throttling.py - run a bulk job against a mock server that rate limits, with and without evsamples.throttle
+#
+# Run from the top folder of this repository:
+#
+#   python -m benchmarks.throttling
+#
+# The mock server allows --server-rate requests per second (answering HTTP 429 with Retry-After beyond that) and
+# handles --capacity requests at once at full speed; past that every request slows down in proportion. Each
+# strategy makes --calls list_resources calls from --workers threads, retrying 429s as the samples do.
+##
+import argparse
+import threading
+import time
+
+from exavault import ResourcesApi
+
+from benchmarks.mock_server import MockServer
+from benchmarks.mock_server import send_json
+from evsamples.pool import imap_unordered
+from evsamples.retry import call_with_retries
+from evsamples.session import ApiSession
+from evsamples.throttle import AimdController
+from evsamples.throttle import Throttle
+from evsamples.throttle import TokenBucket
+
+LISTING = {'responseStatus': 200, 'totalResults': 0, 'returnedResults': 0, 'data': []}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark rate limiting strategies against a throttling server')
+    parser.add_argument('--calls', type=int, default=1000, help='API calls per strategy (default: 1000)')
+    parser.add_argument('--workers', type=int, default=64, help='worker threads (default: 64)')
+    parser.add_argument('--server-rate', type=float, default=100, help='requests/second allowed (default: 100)')
+    parser.add_argument('--capacity', type=int, default=8,
+                        help='requests the server handles at once before slowing down (default: 8)')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request at capacity (default: 0.05)')
+    return parser.parse_args()
+
+
+class ThrottlingRoute(object):
+    """A route handler that enforces a server-side request rate and concurrency capacity."""
+
+    def __init__(self, rate, capacity, latency):
+        self.rate = rate
+        self.capacity = capacity
+        self.latency = latency
+        self.active = 0
+        self.throttled = 0
+        self._tokens = rate / 10
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def __call__(self, request, query, body):
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.rate / 10, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                allowed = False
+            else:
+                self._tokens -= 1
+                self.active += 1
+                allowed = True
+                delay = self.latency * max(1.0, self.active / self.capacity)
+
+        if not allowed:
+            request.send_response(429)
+            request.send_header('Retry-After', '1')
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+        time.sleep(delay)
+        with self._lock:
+            self.active -= 1
+        send_json(request, LISTING)
+
+
+def run(url, args, throttle):
+    resources_api = ApiSession(url, pool_size=args.workers, throttle=throttle).api(ResourcesApi)
+
+    def call(_):
+        return call_with_retries(lambda: resources_api.list_resources('key', 'token', '/'), retries=20)
+
+    started = time.time()
+    for _, _, error in imap_unordered(call, range(args.calls), args.workers):
+        if error is not None:
+            raise error
+    return time.time() - started
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    strategies = [
+        ('No limit', lambda: None),
+        ('Token bucket at 90% of rate', lambda: Throttle(bucket=TokenBucket(args.server_rate * 0.9, burst=1))),
+        ('AIMD concurrency', lambda: Throttle(controller=AimdController(max_limit=args.workers))),
+        ('Token bucket + AIMD', lambda: Throttle(bucket=TokenBucket(args.server_rate * 0.9, burst=1),
+                                                 controller=AimdController(max_limit=args.workers))),
+    ]
+
+    print("{0: <28} {1: >8} {2: >10} {3: >6} {4: >11}".format('Strategy', 'Seconds', 'Calls/s', '429s', 'Final limit'))
+    print("=" * 67)
+    for name, make_throttle in strategies:
+        with MockServer() as server:
+            route = ThrottlingRoute(args.server_rate, args.capacity, args.latency)
+            server.route('GET', '/resources/list', route)
+            throttle = make_throttle()
+            seconds = run(server.url, args, throttle)
+
+        controller = throttle.controller if throttle is not None else None
+        print("{0: <28} {1: >8.2f} {2: >10.1f} {3: >6} {4: >11}".format(
+            name, seconds, args.calls / seconds, route.throttled,
+            '{:.1f}'.format(controller.limit) if controller is not None else '-'))
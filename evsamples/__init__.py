@@ -0,0 +1,6 @@
+##
+# evsamples - small helpers shared by the ExaVault sample scripts
+#
+# The sample scripts themselves are meant to be read top to bottom, so anything that several of them need
+# (thread pools, retries, paging and so on) lives in this package instead of being copied into each script.
+##
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+# Seconds a fetched account is served without asking the server again
+DEFAULT_TTL = 60
+
+# Seconds past the TTL that the old account is still served while a fresh one is fetched in the background
+DEFAULT_STALE_TTL = 600
+
+
+class _StoredResponse(object):
+    """Stands in for an HTTP response so that ApiClient.deserialize can rebuild a saved AccountResponse."""
+
+    def __init__(self, data):
+        self.data = data
+
+
+class AccountInfoCache(object):
+    """Serves AccountApi.get_account results from memory, and optionally from disk, for `ttl` seconds.
+
+    Once the cached account is older than ttl, get() still returns it straight away but starts a single
+    background refresh (stale-while-revalidate), for up to stale_ttl more seconds; after that get() waits for a
+    fresh copy, and callers that arrive while it is being fetched wait for that same fetch. A dashboard that
+    polls quota every few seconds then makes one call per ttl instead of one per refresh, and never waits on the
+    network while the cache is warm.
+
+    With path, every fetched account is saved to that JSON file and loaded again on start up, so separate runs
+    of a script share the cache. Thread-safe.
+    """
+
+    def __init__(self, account_api, api_key, access_token, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL, path=None,
+                 include='masterUser'):
+        self.account_api = account_api
+        self.api_key = api_key
+        self.access_token = access_token
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.path = path
+        self.include = include
+        self.account = None
+        self.fetched = None
+        self.fetches = 0
+        # The error from the last background refresh, if it failed; the stale account keeps being served
+        self.last_error = None
+        self._refreshing = False
+        self._lock = threading.Lock()
+        # Held while an account is being fetched, so that callers that find the cache empty or too old wait for
+        # that one fetch instead of all making their own
+        self._fetch_lock = threading.Lock()
+        if path is not None:
+            self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+            if not isinstance(saved, dict) or saved.get('include') != self.include:
+                return
+            account = self.account_api.api_client.deserialize(
+                _StoredResponse(json.dumps(saved['account'])), 'AccountResponse')
+            fetched = float(saved['fetched'])
+        except (ValueError, KeyError, TypeError):
+            # A truncated or corrupt cache file is the same as none: the account is fetched again and saved over it
+            return
+        self.account = account
+        self.fetched = fetched
+
+    def _save(self, account, fetched):
+        saved = {
+            'include': self.include,
+            'fetched': fetched,
+            'account': self.account_api.api_client.sanitize_for_serialization(account),
+        }
+        # Each process writes its own temporary file, and os.replace swaps it in atomically, so a reader (or a
+        # second process saving at the same time) never sees half a file
+        temp_path = '{}.{}.tmp'.format(self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(saved, f)
+        os.replace(temp_path, self.path)
+
+    def age(self):
+        """Seconds since the cached account was fetched, or None if there isn't one."""
+        return time.time() - self.fetched if self.fetched is not None else None
+
+    def refresh(self):
+        """Fetch the account from the server now, cache it and return it."""
+        kwargs = {'include': self.include} if self.include else {}
+        account = self.account_api.get_account(self.api_key, self.access_token, **kwargs)
+        fetched = time.time()
+        with self._lock:
+            self.account = account
+            self.fetched = fetched
+            self.fetches += 1
+            self.last_error = None
+            if self.path is not None:
+                self._save(account, fetched)
+        return account
+
+    def _refresh_in_background(self):
+        try:
+            with self._fetch_lock:
+                self.refresh()
+        except Exception as e:
+            self.last_error = e
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _fresh_account(self):
+        # Under _lock: the cached account if it can be served without fetching, otherwise None
+        age = self.age()
+        return self.account if age is not None and age < self.ttl else None
+
+    def get(self):
+        """Return the AccountResponse, fetching it only if the cached one is missing or too old to serve."""
+        with self._lock:
+            account = self._fresh_account()
+            if account is not None:
+                return account
+            age = self.age()
+            if age is not None and age < self.ttl + self.stale_ttl:
+                if not self._refreshing:
+                    self._refreshing = True
+                    refresher = threading.Thread(target=self._refresh_in_background)
+                    refresher.daemon = True
+                    refresher.start()
+                return self.account
+        with self._fetch_lock:
+            # Another caller may have fetched the account while this one waited its turn
+            with self._lock:
+                account = self._fresh_account()
+            if account is not None:
+                return account
+            return self.refresh()
+
+    def quota(self):
+        """Return (disk_used, disk_limit) in bytes, from the cache whenever possible."""
+        quota = self.get().data.attributes.quota
+        return quota.disk_used, quota.disk_limit
@@ -0,0 +1,180 @@
+import collections
+import datetime
+import json
+import os
+
+from dateutil.parser import parse as parse_datetime
+
+from evsamples.paging import iter_items
+from evsamples.pool import imap_unordered
+
+# Number of log entries requested per get_session_logs call
+LOG_PAGE_SIZE = 200
+
+
+def _as_utc(value):
+    """Turn a timestamp string or datetime into an aware datetime in UTC; one without an offset is taken as UTC.
+
+    Log timestamps may or may not carry a Z or an offset, and aware and naive datetimes can't be compared, so
+    everything FailedLoginMonitor compares goes through here first.
+    """
+    if not isinstance(value, datetime.datetime):
+        value = parse_datetime(value)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc)
+
+
+def split_window(start_date, end_date, slices):
+    """Split [start_date, end_date] into `slices` consecutive, equally sized (start, end) ranges."""
+    step = (end_date - start_date) / slices
+    bounds = [start_date + step * i for i in range(slices)] + [end_date]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_session_logs(activity_api, api_key, access_token, start_date, end_date, page_size=LOG_PAGE_SIZE,
+                      prefetch=True, **filters):
+    """Yield every SessionActivityEntry between start_date and end_date, following pagination.
+
+    filters (type, username, ip_address, path) are passed to every get_session_logs call.
+    """
+    def fetch_page(offset, limit):
+        return activity_api.get_session_logs(
+            api_key, access_token, start_date=start_date, end_date=end_date,
+            offset=offset, limit=limit, sort='date', **filters)
+
+    return iter_items(fetch_page, page_size, prefetch)
+
+
+def iter_webhook_logs(activity_api, api_key, access_token, start_date, end_date, page_size=LOG_PAGE_SIZE,
+                      prefetch=True, **filters):
+    """Yield every WebhookActivityEntry between start_date and end_date, following pagination.
+
+    filters (endpoint_url, event, status_code, username) are passed to every get_webhook_logs call.
+    """
+    def fetch_page(offset, limit):
+        return activity_api.get_webhook_logs(
+            api_key, access_token, start_date=start_date, end_date=end_date,
+            offset=offset, limit=limit, sort='date', **filters)
+
+    return iter_items(fetch_page, page_size, prefetch)
+
+
+def fetch_session_logs(activity_api, api_key, access_token, start_date, end_date, slices=8, workers=8,
+                       page_size=LOG_PAGE_SIZE, **filters):
+    """Yield every SessionActivityEntry in the window, fetching `slices` sub-ranges of it in parallel.
+
+    Each sub-range is paged through by its own worker. Entries are yielded a whole sub-range at a time, in
+    whatever order the sub-ranges finish. An entry on the boundary between two sub-ranges may be returned by
+    both calls, so entries are de-duplicated by id.
+    """
+    def fetch_slice(window):
+        return list(iter_session_logs(activity_api, api_key, access_token, window[0], window[1], page_size,
+                                      prefetch=False, **filters))
+
+    seen = set()
+    for _, entries, error in imap_unordered(fetch_slice, split_window(start_date, end_date, slices), workers):
+        if error is not None:
+            raise error
+        for entry in entries:
+            if entry.id not in seen:
+                seen.add(entry.id)
+                yield entry
+
+
+def count_failed_logins(entries):
+    """Return (failures per username, failures per IP address) Counters for entries with status 'failed'."""
+    by_user = collections.Counter()
+    by_ip = collections.Counter()
+    for entry in entries:
+        attributes = entry.attributes
+        if attributes.status == 'failed':
+            by_user[attributes.username] += 1
+            by_ip[attributes.ip_address] += 1
+    return by_user, by_ip
+
+
+class FailedLoginMonitor(object):
+    """Rolling failed-login counts that are kept up to date by fetching only new session log entries.
+
+    The monitor remembers the timestamp of the newest entry it has seen (the high-water mark) and the ids of
+    the entries at that timestamp, so each poll asks get_session_logs only for entries since then. Failed
+    logins from the last `window` are kept in by_user and by_ip Counters, and older ones are dropped as time
+    passes. Everything is saved to state_path after each poll, so a restarted monitor carries on where it
+    stopped instead of scanning the whole window again.
+    """
+
+    def __init__(self, state_path, window=datetime.timedelta(days=1)):
+        self.state_path = state_path
+        self.window = window
+        self.high_water = None
+        self.ids_at_high_water = set()
+        self.events = collections.deque()
+        self.by_user = collections.Counter()
+        self.by_ip = collections.Counter()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get('high_water'):
+            self.high_water = _as_utc(state['high_water'])
+        self.ids_at_high_water = set(state.get('ids_at_high_water', []))
+        for created, username, ip_address in state.get('events', []):
+            self._add_event(_as_utc(created), username, ip_address)
+
+    def save(self):
+        state = {
+            'high_water': self.high_water.isoformat() if self.high_water else None,
+            'ids_at_high_water': sorted(self.ids_at_high_water),
+            'events': [[created.isoformat(), username, ip_address] for created, username, ip_address in self.events],
+        }
+        # os.replace swaps the new state in atomically, so a crash never leaves a half-written state file
+        temp_path = '{}.{}.tmp'.format(self.state_path, os.getpid())
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _add_event(self, created, username, ip_address):
+        self.events.append((created, username, ip_address))
+        self.by_user[username] += 1
+        self.by_ip[ip_address] += 1
+
+    def _expire(self, cutoff):
+        while self.events and self.events[0][0] < cutoff:
+            _, username, ip_address = self.events.popleft()
+            for counter, key in ((self.by_user, username), (self.by_ip, ip_address)):
+                counter[key] -= 1
+                if counter[key] <= 0:
+                    del counter[key]
+
+    def poll(self, activity_api, api_key, access_token, now=None):
+        """Fetch log entries newer than the high-water mark and update the counts.
+
+        Returns the list of new failed-login SessionActivityEntry objects. now defaults to the current time; a
+        naive now is taken as UTC.
+        """
+        now = _as_utc(now) if now is not None else datetime.datetime.now(datetime.timezone.utc)
+        start_date = self.high_water or now - self.window
+        new_failures = []
+
+        for entry in iter_session_logs(activity_api, api_key, access_token, start_date, now, type='pass'):
+            created = _as_utc(entry.attributes.created)
+            if self.high_water is not None and (
+                    created < self.high_water or (created == self.high_water and entry.id in self.ids_at_high_water)):
+                continue
+
+            if self.high_water is None or created > self.high_water:
+                self.high_water = created
+                self.ids_at_high_water = set()
+            self.ids_at_high_water.add(entry.id)
+
+            if entry.attributes.status == 'failed':
+                self._add_event(created, entry.attributes.username, entry.attributes.ip_address)
+                new_failures.append(entry)
+
+        self._expire(now - self.window)
+        self.save()
+        return new_failures
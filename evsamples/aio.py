@@ -0,0 +1,206 @@
+##
+# An asyncio version of the ExaVault API classes. Requires Python 3.5+ and the aiohttp package.
+#
+# The generated API classes (ResourcesApi, UsersApi, ...) block until each call's response arrives, so running
+# many calls at once needs a thread per call. AsyncSession wraps the very same classes: each method still checks
+# its arguments and builds its request exactly as the generated code does, but the request is then sent with
+# aiohttp and the method returns a coroutine. Thousands of calls can be waiting on responses from one thread:
+#
+#     async with AsyncSession(ACCOUNT_URL, limit=50) as session:
+#         users_api = session.api(UsersApi)
+#         responses = await asyncio.gather(*[
+#             users_api.get_user_by_id(API_KEY, ACCESS_TOKEN, user_id) for user_id in user_ids])
+#
+# Responses are deserialized into the same model objects the blocking API returns, and failures raise the same
+# exavault.rest.ApiException, so helpers such as evsamples.retry.is_transient_error work on both.
+##
+import asyncio
+import json
+
+from exavault import ApiClient
+from exavault import Configuration
+from exavault import ResourcesApi
+from exavault.rest import ApiException
+
+# Requests allowed in flight at once, unless the session is created with a different limit
+DEFAULT_LIMIT = 50
+
+# Bytes read from the network at a time when downloading to a file
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class _PreparedRequest(Exception):
+    """Raised by _RequestRecorder in place of sending a request, carrying everything needed to send it."""
+
+    def __init__(self, method, url, query_params, headers, post_params, body):
+        super(_PreparedRequest, self).__init__(method, url)
+        self.method = method
+        self.url = url
+        self.query_params = query_params or []
+        self.headers = headers or {}
+        self.post_params = post_params or []
+        self.body = body
+        self.response_type = None
+
+
+class _RequestRecorder(ApiClient):
+    """An ApiClient that builds requests exactly like the real one, then returns them instead of sending them."""
+
+    def request(self, method, url, query_params=None, headers=None, post_params=None, body=None,
+                _preload_content=True, _request_timeout=None):
+        raise _PreparedRequest(method, url, query_params, headers, post_params, body)
+
+    def call_api(self, resource_path, method, *args, **kwargs):
+        try:
+            super(_RequestRecorder, self).call_api(resource_path, method, *args, **kwargs)
+        except _PreparedRequest as prepared:
+            prepared.response_type = kwargs.get('response_type')
+            return prepared
+        raise RuntimeError('{} {} was not prepared'.format(method, resource_path))
+
+
+class _Response(object):
+    """The parts of a response that ApiClient.deserialize and ApiException read."""
+
+    def __init__(self, status, reason, data, headers):
+        self.status = status
+        self.reason = reason
+        self.data = data
+        self.headers = headers
+
+    def getheaders(self):
+        return self.headers
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+
+def _text(value):
+    # urllib3 turns every header and query value into text with str(); aiohttp only accepts text headers, and
+    # str, int and float query values
+    return value if isinstance(value, str) else str(value)
+
+
+class AsyncApi(object):
+    """One of the generated API classes, with every method returning a coroutine instead of blocking."""
+
+    def __init__(self, session, api):
+        self._session = session
+        self._api = api
+
+    def __getattr__(self, name):
+        method = getattr(self._api, name)
+
+        async def call(*args, **kwargs):
+            return await self._session.send(method(*args, **kwargs))
+
+        call.__name__ = name
+        call.__doc__ = method.__doc__
+        return call
+
+
+class AsyncSession(object):
+    """An aiohttp connection pool for one account, handing out asyncio versions of the API classes.
+
+    At most `limit` requests are in flight at once; the rest wait their turn without holding a connection or a
+    thread. `timeout` is the total number of seconds allowed for each request, or None for no limit.
+    Use it as an async context manager so the connections are closed when you are done.
+    """
+
+    def __init__(self, host, limit=DEFAULT_LIMIT, timeout=None):
+        configuration = Configuration()
+        configuration.host = host
+        self.limit = limit
+        self.timeout = timeout
+        self._recorder = _RequestRecorder(configuration)
+        self._apis = {}
+        self._http = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError("AsyncSession needs the aiohttp package: pip install aiohttp")
+
+        self._aiohttp = aiohttp
+        self._semaphore = asyncio.Semaphore(self.limit)
+        self._http = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.limit),
+            timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._http.close()
+
+    def api(self, api_class):
+        """Return the session's AsyncApi for api_class (ResourcesApi, UsersApi, SharesApi, ...)."""
+        if api_class not in self._apis:
+            self._apis[api_class] = AsyncApi(self, api_class(self._recorder))
+        return self._apis[api_class]
+
+    def _request_kwargs(self, prepared):
+        headers = dict((name, _text(value)) for name, value in prepared.headers.items())
+        kwargs = {'params': [(name, _text(value)) for name, value in prepared.query_params]}
+        content_type = headers.get('Content-Type', 'application/json')
+
+        if prepared.method in ('GET', 'HEAD'):
+            pass
+        elif content_type == 'multipart/form-data':
+            # Let aiohttp write the Content-Type, which carries the multipart boundary
+            del headers['Content-Type']
+            form = self._aiohttp.FormData()
+            for name, value in prepared.post_params:
+                if isinstance(value, tuple):
+                    filename, data, mimetype = value
+                    form.add_field(name, data, filename=filename, content_type=mimetype)
+                else:
+                    form.add_field(name, _text(value))
+            kwargs['data'] = form
+        elif content_type == 'application/x-www-form-urlencoded':
+            kwargs['data'] = [(name, _text(value)) for name, value in prepared.post_params]
+        else:
+            kwargs['data'] = json.dumps(prepared.body) if prepared.body is not None else '{}'
+
+        kwargs['headers'] = headers
+        return kwargs
+
+    async def _check(self, response):
+        if not 200 <= response.status <= 299:
+            # A copy of aiohttp's headers is still a case-insensitive CIMultiDict, so retry.retry_after finds a
+            # lowercase retry-after header as it does with urllib3's
+            raise ApiException(http_resp=_Response(
+                response.status, response.reason, await response.read(), response.headers.copy()))
+
+    async def send(self, prepared):
+        """Send a request prepared by one of the API methods, and return its deserialized response."""
+        async with self._semaphore:
+            async with self._http.request(prepared.method, prepared.url, **self._request_kwargs(prepared)) as response:
+                await self._check(response)
+                data = await response.read()
+
+        if not prepared.response_type:
+            return None
+        return self._recorder.deserialize(
+            _Response(response.status, response.reason, data, response.headers.copy()), prepared.response_type)
+
+    async def download_to_file(self, api_key, access_token, resources, target_path, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                               progress=None, **kwargs):
+        """Download resources (one file, or several as a zip archive) into target_path as the bytes arrive.
+
+        progress, if given, is called with the running byte count after every chunk. Returns the bytes written.
+        """
+        # As in evsamples.download, download_with_http_info is used because download post-processes the response
+        prepared = ResourcesApi(self._recorder).download_with_http_info(api_key, access_token, resources, **kwargs)
+        written = 0
+
+        async with self._semaphore:
+            async with self._http.request(prepared.method, prepared.url, **self._request_kwargs(prepared)) as response:
+                await self._check(response)
+                with open(target_path, 'wb') as f:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        f.write(chunk)
+                        written += len(chunk)
+                        if progress is not None:
+                            progress(written)
+        return written
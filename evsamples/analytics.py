@@ -0,0 +1,122 @@
+##
+# Column-oriented analysis of session and webhook activity logs. Requires the pandas package.
+#
+# Log entries are copied into a pandas DataFrame once, and every question after that (failures per user, logins
+# per hour, brute-force bursts) is answered with whole-column operations instead of a Python loop per entry.
+##
+
+# Columns copied out of each SessionActivityEntry's attributes
+SESSION_COLUMNS = ('created', 'username', 'ip_address', 'status', 'operation', 'protocol', 'file_name',
+                   'bytes_transferred', 'duration')
+
+# Keys copied out of each WebhookActivityEntry's attributes. The client leaves these as the raw response dict.
+WEBHOOK_COLUMNS = (('created', 'created'), ('username', 'username'), ('ip_address', 'ipAddress'),
+                   ('event', 'event'), ('status', 'status'), ('endpoint_url', 'endpointUrl'),
+                   ('resource_path', 'resourcePath'))
+
+# Columns stored as categoricals: few distinct values repeated on many rows
+CATEGORY_COLUMNS = ('username', 'ip_address', 'status', 'operation', 'protocol', 'event', 'endpoint_url')
+
+
+def _pandas():
+    try:
+        import pandas
+    except ImportError:
+        raise ImportError("Activity log analytics needs the pandas package: pip install pandas")
+    return pandas
+
+
+def _frame(ids, columns):
+    pandas = _pandas()
+    frame = pandas.DataFrame(columns)
+    frame.insert(0, 'id', pandas.Series(ids, dtype='int64'))
+    frame['created'] = pandas.to_datetime(frame['created'])
+    for name in CATEGORY_COLUMNS:
+        if name in frame:
+            frame[name] = frame[name].astype('category')
+    return frame
+
+
+def session_logs_frame(entries):
+    """Return a DataFrame with one row per SessionActivityEntry and one column per SESSION_COLUMNS name."""
+    ids = []
+    columns = dict((name, []) for name in SESSION_COLUMNS)
+    appenders = [(columns[name].append, name) for name in SESSION_COLUMNS]
+    for entry in entries:
+        ids.append(entry.id)
+        attributes = entry.attributes
+        for append, name in appenders:
+            append(getattr(attributes, name))
+    return _frame(ids, columns)
+
+
+def webhook_logs_frame(entries):
+    """Return a DataFrame with one row per WebhookActivityEntry and one column per WEBHOOK_COLUMNS name."""
+    ids = []
+    columns = dict((name, []) for name, _ in WEBHOOK_COLUMNS)
+    for entry in entries:
+        ids.append(entry.id)
+        attributes = entry.attributes or {}
+        for name, key in WEBHOOK_COLUMNS:
+            columns[name].append(attributes.get(key))
+    return _frame(ids, columns)
+
+
+def failed_logins(frame):
+    """Return only the rows of a session log frame with a 'failed' status.
+
+    Fetch the logs with type='pass' to limit them to logins, as the failed-login sample does.
+    """
+    return frame[frame['status'] == 'failed']
+
+
+def counts_by(frame, by, freq='h'):
+    """Count rows grouped by one or more columns, most common first.
+
+    `by` is a column name or a list of them. The special name 'hour' groups by the created time floored to
+    `freq` (one hour by default), so counts_by(frame, ['hour', 'status']) gives logins per hour per status.
+    """
+    keys = list(by) if isinstance(by, (list, tuple)) else [by]
+    groupers = [frame['created'].dt.floor(freq).rename('hour') if key == 'hour' else frame[key] for key in keys]
+    return frame.groupby(groupers, observed=True).size().sort_values(ascending=False)
+
+
+def detect_brute_force(frame, by='username', window='5min', threshold=10):
+    """Find users (or IP addresses, with by='ip_address') with at least `threshold` failures inside `window`.
+
+    `frame` should hold failed attempts only, e.g. failed_logins(session_logs_frame(entries)). The window
+    slides across every failure, not fixed clock buckets, so a burst that straddles the hour still counts.
+    Returns a DataFrame indexed by `by` with the peak number of failures seen in one window, when that
+    window ended, and the total number of failures.
+    """
+    pandas = _pandas()
+    import numpy
+
+    failures = frame[[by, 'created']].dropna()
+    if failures.empty:
+        return pandas.DataFrame(columns=['peak', 'peak_end', 'failures'])
+
+    # Sort by group, then time, and give every row a single sortable number: its group code times a stride
+    # larger than the whole time span, plus its offset in seconds. One searchsorted over those numbers then
+    # finds, for every row at once, the first row of the same group that is still inside the window.
+    codes, groups = pandas.factorize(failures[by])
+    seconds = (failures['created'] - failures['created'].min()).dt.total_seconds().to_numpy()
+    window_seconds = pandas.Timedelta(window).total_seconds()
+    stride = seconds.max() + window_seconds + 1
+    keys = codes * stride + seconds
+    order = numpy.argsort(keys, kind='stable')
+    keys = keys[order]
+    in_window = numpy.arange(len(keys)) - numpy.searchsorted(keys, keys - window_seconds, side='left') + 1
+
+    result = pandas.DataFrame({
+        by: numpy.asarray(groups)[codes[order]],
+        'in_window': in_window,
+        'created': failures['created'].to_numpy()[order],
+    })
+    peaks = result.loc[result.groupby(by, observed=True)['in_window'].idxmax()].set_index(by)
+    report = pandas.DataFrame({
+        'peak': peaks['in_window'],
+        'peak_end': peaks['created'],
+        'failures': result.groupby(by, observed=True).size(),
+    })
+    return report[report['peak'] >= threshold].sort_values('peak', ascending=False)
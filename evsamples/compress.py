@@ -0,0 +1,83 @@
+import os
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from exavault.models.compress_files_request_body import CompressFilesRequestBody
+
+from evsamples.retry import call_with_retries
+from evsamples.retry import is_unsent_error
+from evsamples.upload import upload_many
+
+
+class PipelineTimings(object):
+    """Wall-clock timings of an upload_and_compress run, in seconds."""
+
+    def __init__(self):
+        self.upload = 0.0
+        self.compress_calls = []
+        self.compress_tail = 0.0
+        self.total = 0.0
+
+    def summary(self):
+        return "upload phase {:.2f}s, {} compress call(s) totalling {:.2f}s, {:.2f}s waiting on compress after the " \
+               "last upload, {:.2f}s overall".format(self.upload, len(self.compress_calls), sum(self.compress_calls),
+                                                     self.compress_tail, self.total)
+
+
+def batch_archive_name(archive_name, number):
+    """'delivery.zip', 3 -> 'delivery_3.zip'"""
+    root, extension = os.path.splitext(archive_name)
+    return '{}_{}{}'.format(root, number, extension or '.zip')
+
+
+def upload_and_compress(resources_api, api_key, access_token, jobs, parent_resource, archive_name, batch_size=None,
+                        workers=8, retries=3):
+    """Upload (local_path, remote_path) jobs concurrently and compress the uploaded files into zip archives.
+
+    The id: reference of each file is collected as its upload finishes. With batch_size, an archive named after
+    archive_name (see batch_archive_name) is requested as soon as each batch_size uploads have finished, while the
+    rest keep uploading; otherwise a single archive of everything is requested once the last upload is done.
+    Compression runs on its own thread so that it never holds up the uploads.
+
+    Returns (archives, failed_uploads, timings): the ResourceResponse of every archive created, the UploadResult
+    of every upload that failed, and a PipelineTimings. Files whose upload failed are left out of the archives.
+    """
+    timings = PipelineTimings()
+    failed = []
+    batch = []
+    pending = []
+    started = time.time()
+
+    def compress(resources, name):
+        body = CompressFilesRequestBody(resources=resources, parent_resource=parent_resource, archive_name=name)
+        call_started = time.time()
+        # Like the other creates, a compress request that may have reached the account isn't sent again
+        response, _ = call_with_retries(
+            lambda: resources_api.compress_files(api_key, access_token, body=body), retries=retries,
+            retry_if=is_unsent_error)
+        timings.compress_calls.append(time.time() - call_started)
+        return response
+
+    with ThreadPoolExecutor(max_workers=1) as compressor:
+        def submit(resources):
+            name = batch_archive_name(archive_name, len(pending) + 1) if batch_size else archive_name
+            pending.append(compressor.submit(compress, resources, name))
+
+        for result in upload_many(resources_api, api_key, access_token, jobs, workers=workers, retries=retries):
+            if result.error is not None:
+                failed.append(result)
+                continue
+            batch.append('id:{}'.format(result.resource.data.id))
+            if batch_size and len(batch) >= batch_size:
+                submit(batch)
+                batch = []
+        if batch:
+            submit(batch)
+        timings.upload = time.time() - started
+
+        archives = [future.result() for future in pending]
+
+    timings.total = time.time() - started
+    timings.compress_tail = timings.total - timings.upload
+    return archives, failed, timings
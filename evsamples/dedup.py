@@ -0,0 +1,272 @@
+import hashlib
+import mmap
+import os
+import posixpath
+import sqlite3
+import time
+
+from exavault.models.copy_resources_request_body import CopyResourcesRequestBody
+from exavault.models.update_resource_by_id_request_body import UpdateResourceByIdRequestBody
+from exavault.rest import ApiException
+
+from evsamples.pool import imap_unordered
+from evsamples.retry import call_with_retries
+from evsamples.retry import is_unsent_error
+from evsamples.upload import DEFAULT_CHUNK_SIZE
+from evsamples.upload import UploadResult
+from evsamples.upload import upload_many
+from evsamples.upload import upload_one
+from evsamples.walk import walk_resources
+
+# Bytes of a memory-mapped file handed to the hash function at a time
+HASH_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Files smaller than this are sent again rather than copied on the server: a copy plus a rename is two round
+# trips, which takes longer than uploading a small file once
+MIN_COPY_SIZE = 1024 * 1024
+
+# Number of index changes to batch into each sqlite transaction
+COMMIT_EVERY = 100
+
+
+def file_digest(local_path):
+    """Return the BLAKE2b digest of a file's contents, hashed straight out of a memory map without copying.
+
+    hashlib releases the GIL while it hashes, so several files can be hashed at once on a thread pool.
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(local_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        # mmap refuses empty files, and there is nothing to hash in them anyway
+        if size:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                with memoryview(mapped) as view:
+                    for offset in range(0, size, HASH_BLOCK_SIZE):
+                        digest.update(view[offset:offset + HASH_BLOCK_SIZE])
+            finally:
+                mapped.close()
+    return digest.hexdigest()
+
+
+class UploadIndex(object):
+    """A local sqlite index of file contents: what each local file hashes to, and what was uploaded where.
+
+    Digests are cached by local path, size and modification time, so a file that hasn't changed since the last
+    run isn't read again. Each upload is recorded by remote path with the digest, size and resource id of what
+    was sent, which is how content already in the account is found without downloading anything. Use it as a
+    context manager so that pending entries are committed on the way out.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS hashes (local_path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, digest TEXT)')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS uploads ('
+            ' remote_path TEXT PRIMARY KEY, digest TEXT, size INTEGER, resource_id INTEGER)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS uploads_digest ON uploads (digest)')
+        self._uncommitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def cached_digest(self, local_path, stat):
+        """Return the digest recorded for local_path if its size and modification time still match, or None."""
+        row = self.connection.execute(
+            'SELECT digest FROM hashes WHERE local_path = ? AND size = ? AND mtime = ?',
+            (os.path.abspath(local_path), stat.st_size, stat.st_mtime_ns)).fetchone()
+        return row[0] if row else None
+
+    def remember_digest(self, local_path, stat, digest):
+        self._execute('INSERT OR REPLACE INTO hashes (local_path, size, mtime, digest) VALUES (?, ?, ?, ?)',
+                      (os.path.abspath(local_path), stat.st_size, stat.st_mtime_ns, digest))
+
+    def uploaded(self, remote_path):
+        """Return (digest, size, resource_id) of what was last uploaded to remote_path, or None."""
+        return self.connection.execute(
+            'SELECT digest, size, resource_id FROM uploads WHERE remote_path = ?', (remote_path,)).fetchone()
+
+    def find(self, digest):
+        """Return (remote_path, resource_id) for every upload recorded with this digest."""
+        return self.connection.execute(
+            'SELECT remote_path, resource_id FROM uploads WHERE digest = ?', (digest,)).fetchall()
+
+    def record(self, remote_path, digest, size, resource_id):
+        self._execute('INSERT OR REPLACE INTO uploads (remote_path, digest, size, resource_id) VALUES (?, ?, ?, ?)',
+                      (remote_path, digest, size, resource_id))
+
+    def _execute(self, sql, parameters):
+        self.connection.execute(sql, parameters)
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+
+def list_remote_files(resources_api, api_key, access_token, top, workers=8):
+    """Return {path: Resource} for every file below top in the account, or {} if top doesn't exist yet."""
+    remote = {}
+    try:
+        for _, _, files in walk_resources(resources_api, api_key, access_token, top, workers=workers):
+            remote.update((resource.attributes.path, resource) for resource in files)
+    except ApiException as e:
+        if e.status != 404:
+            raise
+    return remote
+
+
+def _copy_resource(resources_api, api_key, access_token, source_id, remote_path, retries, backoff):
+    # copyResources always keeps the source's name, so the copy is renamed afterwards if the target's differs
+    folder, name = posixpath.split(remote_path)
+    body = CopyResourcesRequestBody(resources=['id:{}'.format(source_id)], parent_resource=folder or '/')
+    # A copy that may have been made is not asked for again, or the folder could end up with two of them
+    copied, attempts = call_with_retries(
+        lambda: resources_api.copy_resources(api_key, access_token, body=body), retries=retries, backoff=backoff,
+        retry_if=is_unsent_error)
+    if copied.data.attributes.name == name:
+        return copied, attempts
+    try:
+        # Note that updateResourceById takes the access token before the API key
+        renamed, tries = call_with_retries(
+            lambda: resources_api.update_resource_by_id(access_token, api_key, copied.data.id,
+                                                        body=UpdateResourceByIdRequestBody(name=name)),
+            retries=retries, backoff=backoff)
+    except Exception:
+        # Don't leave the copy behind under the source's name; the caller uploads the file instead
+        try:
+            call_with_retries(lambda: resources_api.delete_resource_by_id(copied.data.id, api_key, access_token),
+                              retries=retries, backoff=backoff)
+        except ApiException as e:
+            if e.status != 404:
+                raise
+        raise
+    return renamed, attempts + tries
+
+
+def copy_one(resources_api, api_key, access_token, source_id, local_path, remote_path, retries=3, backoff=1.0,
+             chunk_size=DEFAULT_CHUNK_SIZE):
+    """Copy resource source_id to remote_path on the server, uploading local_path there instead if that fails.
+
+    A copy that can't be renamed to remote_path's name is deleted again before the upload, so it isn't left in
+    the folder under the source's name.
+
+    Never raises; check UploadResult.error. UploadResult.action says whether the file was 'copied' or 'uploaded'.
+    """
+    result = UploadResult(local_path, remote_path, os.path.getsize(local_path))
+    started = time.time()
+    try:
+        result.resource, result.attempts = _copy_resource(
+            resources_api, api_key, access_token, source_id, remote_path, retries, backoff)
+        result.action = 'copied'
+    except Exception:
+        # The source may have been deleted or moved since it was indexed; sending the bytes always works
+        result = upload_one(resources_api, api_key, access_token, local_path, remote_path, retries, backoff,
+                            chunk_size)
+    result.seconds = time.time() - started
+    return result
+
+
+def upload_deduplicated(resources_api, api_key, access_token, jobs, index, remote_root=None, workers=8, retries=3,
+                        backoff=1.0, chunk_size=DEFAULT_CHUNK_SIZE, min_copy_size=MIN_COPY_SIZE):
+    """Upload (local_path, remote_path) jobs, sending only content that isn't in the account already.
+
+    Every file is hashed first (see file_digest; unchanged files reuse the digest cached in index). Then:
+
+    - a file whose remote path was last uploaded with the same digest is skipped;
+    - a file whose content was uploaded somewhere else, before or earlier in this run, is copied on the server
+      from that resource, as long as it is at least min_copy_size bytes and its remote path is free;
+    - everything else is uploaded, with one upload per distinct content.
+
+    With remote_root, the files below it are listed first. Index entries are then only trusted if the listing
+    still shows the same resource at the same size, so files deleted or changed in the account are sent again.
+    Without it the index is trusted as it is.
+
+    Yields an UploadResult for every job as it finishes, with action set to 'skipped', 'copied' or 'uploaded'.
+    Uploads run first, on `workers` threads, and the copies that depend on them run after.
+    """
+    jobs = list(jobs)
+    remote = None
+    if remote_root is not None:
+        remote = list_remote_files(resources_api, api_key, access_token, remote_root, workers)
+
+    def in_place(remote_path, size, resource_id):
+        if remote is None:
+            return True
+        resource = remote.get(remote_path)
+        return resource is not None and resource.id == resource_id and resource.attributes.size == size
+
+    # Hash whatever the index doesn't already know, several files at a time
+    stats = dict((local_path, os.stat(local_path)) for local_path, _ in jobs)
+    digests = {}
+    for local_path in stats:
+        digest = index.cached_digest(local_path, stats[local_path])
+        if digest is not None:
+            digests[local_path] = digest
+    unhashed = [local_path for local_path in stats if local_path not in digests]
+    for local_path, digest, error in imap_unordered(file_digest, unhashed, workers=workers):
+        if error is not None:
+            raise error
+        digests[local_path] = digest
+        index.remember_digest(local_path, stats[local_path], digest)
+
+    uploads = []
+    copies = []
+    # digest -> resource id of a copy of that content known to be in the account
+    sources = {}
+    # digest -> the first remote path that the content is being uploaded to in this run
+    first_upload = {}
+    for local_path, remote_path in jobs:
+        digest = digests[local_path]
+        size = stats[local_path].st_size
+        previous = index.uploaded(remote_path)
+        if previous is not None and previous[0] == digest and in_place(remote_path, size, previous[2]):
+            result = UploadResult(local_path, remote_path, size)
+            result.action = 'skipped'
+            yield result
+            continue
+
+        if digest not in sources:
+            for path, resource_id in index.find(digest):
+                if in_place(path, size, resource_id):
+                    sources[digest] = resource_id
+                    break
+
+        target_free = remote_path not in remote if remote is not None else previous is None
+        if size >= min_copy_size and target_free and (digest in sources or digest in first_upload):
+            copies.append((local_path, remote_path))
+        else:
+            first_upload.setdefault(digest, remote_path)
+            uploads.append((local_path, remote_path))
+
+    for result in upload_many(resources_api, api_key, access_token, uploads, workers, retries, backoff, chunk_size):
+        if result.error is None:
+            digest = digests[result.local_path]
+            index.record(result.remote_path, digest, result.size, result.resource.data.id)
+            sources.setdefault(digest, result.resource.data.id)
+        yield result
+
+    def copy(job):
+        local_path, remote_path = job
+        source_id = sources.get(digests[local_path])
+        if source_id is None:
+            # The upload this copy was waiting for failed, so there is nothing to copy from
+            return upload_one(resources_api, api_key, access_token, local_path, remote_path, retries, backoff,
+                              chunk_size)
+        return copy_one(resources_api, api_key, access_token, source_id, local_path, remote_path, retries, backoff,
+                        chunk_size)
+
+    for _, result, _ in imap_unordered(copy, copies, workers=workers):
+        if result.error is None:
+            index.record(result.remote_path, digests[result.local_path], result.size, result.resource.data.id)
+        yield result
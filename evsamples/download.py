@@ -0,0 +1,95 @@
+import os
+import time
+
+from evsamples.pool import imap_unordered
+from evsamples.retry import call_with_retries
+
+# Size of each read from the HTTP response while streaming a download to disk
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+def download_to_file(resources_api, api_key, access_token, resources, target_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                     progress=None, **kwargs):
+    """Stream ResourcesApi.download straight into target_path, chunk_size bytes at a time.
+
+    Passing _preload_content=False makes the generated client hand back the raw urllib3 response instead
+    of reading the whole body into memory, so memory use stays flat however big the download is.
+    progress, if given, is called with the running byte count after every chunk. Returns the bytes written.
+    """
+    # download_with_http_info is used rather than download because, depending on the library version,
+    # download either returns the whole body or saves it to a temporary file of its own choosing.
+    response = resources_api.download_with_http_info(
+        api_key, access_token, resources, _preload_content=False, _return_http_data_only=True, **kwargs)
+    written = 0
+    try:
+        with open(target_path, 'wb') as f:
+            for chunk in response.stream(chunk_size):
+                f.write(chunk)
+                written += len(chunk)
+                if progress is not None:
+                    progress(written)
+    finally:
+        response.release_conn()
+    return written
+
+
+class DownloadResult(object):
+    """Outcome of downloading one resource to a local file."""
+
+    def __init__(self, resource, local_path):
+        self.resource = resource
+        self.local_path = local_path
+        self.size = 0
+        self.seconds = 0.0
+        self.attempts = 0
+        self.error = None
+
+
+def download_one(resources_api, api_key, access_token, resource, local_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                 retries=3, backoff=1.0):
+    """Stream a single resource to local_path, retrying transient failures. Never raises; check .error."""
+    result = DownloadResult(resource, local_path)
+    started = time.time()
+    try:
+        local_dir = os.path.dirname(local_path)
+        if local_dir and not os.path.isdir(local_dir):
+            try:
+                os.makedirs(local_dir)
+            except OSError:
+                # Another worker may have created it at the same moment
+                if not os.path.isdir(local_dir):
+                    raise
+        result.size, result.attempts = call_with_retries(
+            lambda: download_to_file(resources_api, api_key, access_token, [resource], local_path, chunk_size),
+            retries=retries, backoff=backoff)
+    except Exception as e:
+        result.error = e
+    result.seconds = time.time() - started
+    return result
+
+
+def download_many(resources_api, api_key, access_token, jobs, workers=8, retries=3, backoff=1.0,
+                  chunk_size=DEFAULT_CHUNK_SIZE):
+    """Download (resource, local_path) jobs concurrently, yielding a DownloadResult as each one finishes.
+
+    Every worker shares resources_api's ApiClient, so its connection pool (ApiSession's pool_size) should be
+    at least `workers` for each download to get its own pooled connection.
+    """
+    def work(job):
+        return download_one(resources_api, api_key, access_token, job[0], job[1], chunk_size, retries, backoff)
+
+    for _, result, _ in imap_unordered(work, jobs, workers=workers):
+        yield result
+
+
+def choose_download_mode(file_count, total_size, zip_min_files=200, zip_max_average_size=512 * 1024):
+    """Pick 'single', 'zip' or 'parallel' for downloading file_count files totalling total_size bytes.
+
+    A server-side zip saves a request per file, but the server has to compress everything before the first
+    byte is sent. That only pays off for lots of small files; otherwise separate parallel downloads finish first.
+    """
+    if file_count <= 1:
+        return 'single'
+    if file_count >= zip_min_files and total_size / file_count <= zip_max_average_size:
+        return 'zip'
+    return 'parallel'
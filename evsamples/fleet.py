@@ -0,0 +1,98 @@
+import hashlib
+import os
+import re
+import time
+
+from exavault import AccountApi
+
+from evsamples.account import DEFAULT_TTL
+from evsamples.account import AccountInfoCache
+from evsamples.pool import imap_unordered
+from evsamples.records import read_records
+from evsamples.retry import call_with_retries
+from evsamples.retry import error_summary
+from evsamples.session import ApiSession
+
+
+class FleetAccount(object):
+    """Credentials for one account in a fleet, and what fetch_fleet found out about it."""
+
+    def __init__(self, name, account_url, api_key, access_token):
+        self.name = name
+        self.account_url = account_url
+        self.api_key = api_key
+        self.access_token = access_token
+        self.account = None
+        self.seconds = 0.0
+        self.error = None
+
+    @property
+    def cache_file_name(self):
+        """A file name for this account's cached info that is safe on any file system and unique to the account.
+
+        The name is read from the fleet file and can hold anything, so it is cut down to letters, digits, dots,
+        dashes and underscores, and a hash of the name and URL is added so that accounts never share a file.
+        """
+        slug = re.sub(r'[^A-Za-z0-9._-]+', '_', self.name).strip('._')[:40] or 'account'
+        digest = hashlib.sha1(u'{}\n{}'.format(self.name, self.account_url).encode('utf-8')).hexdigest()[:12]
+        return '{}-{}.json'.format(slug, digest)
+
+    @property
+    def quota(self):
+        return self.account.data.attributes.quota if self.account is not None else None
+
+    @property
+    def master_email(self):
+        if self.account is None:
+            return None
+        for included in self.account.included or []:
+            if included.type == 'user':
+                return included.attributes.email
+        return None
+
+
+def read_fleet(path):
+    """Read FleetAccounts from a .csv, .jsonl or .json file with account_url, api_key and access_token fields.
+
+    An optional name field labels the account in reports; it defaults to the host name of its URL.
+    """
+    accounts = []
+    for number, record in enumerate(read_records(path), 1):
+        if not isinstance(record, dict):
+            raise ValueError('Fleet record {} in {} must be an object, not {}'.format(
+                number, path, type(record).__name__))
+        missing = [field for field in ('account_url', 'api_key', 'access_token') if not record.get(field)]
+        if missing:
+            raise ValueError('Account {} in {} has no {}'.format(number, path, ', '.join(missing)))
+        name = str(record.get('name') or record['account_url'].split('//')[-1].split('/')[0])
+        accounts.append(FleetAccount(name, record['account_url'], record['api_key'], record['access_token']))
+    return accounts
+
+
+def fetch_fleet(accounts, workers=16, include='masterUser', retries=2, cache_dir=None, ttl=DEFAULT_TTL):
+    """Call getAccount for every FleetAccount at once, yielding each one as its answer (or error) comes back.
+
+    Every account has its own host and credentials, so each gets its own single-connection ApiSession; up to
+    `workers` accounts are asked at the same time, so a whole fleet takes about as long as its slowest account.
+    With cache_dir, each account is fetched through an AccountInfoCache saved to its cache_file_name there, and
+    accounts fetched less than ttl seconds ago aren't asked again.
+    """
+    def fetch(fleet_account):
+        account_api = ApiSession(fleet_account.account_url, pool_size=1).api(AccountApi)
+        started = time.time()
+        if cache_dir is not None:
+            cache = AccountInfoCache(account_api, fleet_account.api_key, fleet_account.access_token, ttl=ttl,
+                                     stale_ttl=0, path=os.path.join(cache_dir, fleet_account.cache_file_name),
+                                     include=include)
+            fleet_account.account, _ = call_with_retries(cache.get, retries=retries)
+        else:
+            kwargs = {'include': include} if include else {}
+            fleet_account.account, _ = call_with_retries(
+                lambda: account_api.get_account(fleet_account.api_key, fleet_account.access_token, **kwargs),
+                retries=retries)
+        fleet_account.seconds = time.time() - started
+
+    for fleet_account, _, error in imap_unordered(fetch, accounts, workers=workers):
+        if error is not None:
+            fleet_account.error = error_summary(error)
+        yield fleet_account
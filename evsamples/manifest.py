@@ -0,0 +1,60 @@
+import os
+import sqlite3
+
+# Number of recorded downloads to batch into each sqlite transaction
+COMMIT_EVERY = 100
+
+
+def _fingerprint(resource):
+    attributes = resource.attributes
+    modified = attributes.updated_at.isoformat() if attributes.updated_at is not None else None
+    return attributes.size, attributes.hash, modified
+
+
+class SyncManifest(object):
+    """A local sqlite index of downloaded resources, keyed by resource id.
+
+    Each entry remembers the size, hash and modification time that list_resources reported when the file was
+    downloaded, along with where it was saved. A resource whose listing still matches, and whose local copy is
+    still there at the expected size, doesn't need downloading again. Use it as a context manager so that
+    pending entries are committed on the way out.
+    """
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS resources ('
+            ' id INTEGER PRIMARY KEY, path TEXT, size INTEGER, hash TEXT, modified TEXT, local_path TEXT)')
+        self._uncommitted = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def is_current(self, resource, local_path):
+        """Return True if resource was already downloaded to local_path and hasn't changed since."""
+        row = self.connection.execute(
+            'SELECT size, hash, modified, local_path FROM resources WHERE id = ?', (resource.id,)).fetchone()
+        if row is None or tuple(row[:3]) != _fingerprint(resource) or row[3] != local_path:
+            return False
+        return os.path.isfile(local_path) and os.path.getsize(local_path) == resource.attributes.size
+
+    def record(self, resource, local_path):
+        """Remember that resource has been downloaded to local_path."""
+        size, hash_, modified = _fingerprint(resource)
+        self.connection.execute(
+            'INSERT OR REPLACE INTO resources (id, path, size, hash, modified, local_path) VALUES (?, ?, ?, ?, ?, ?)',
+            (resource.id, resource.attributes.path, size, hash_, modified, local_path))
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
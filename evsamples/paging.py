@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of items requested per call to a list endpoint
+DEFAULT_PAGE_SIZE = 100
+
+
+def _has_more(page, offset, limit):
+    returned = len(page.data or [])
+    if not returned:
+        return False
+    # Some endpoints, such as the ActivityApi logs, always report a totalResults of 0. A total of 0 (or none at
+    # all) alongside some results means the total is unknown, so keep going for as long as pages come back full
+    total = getattr(page, 'total_results', None)
+    if total:
+        return offset + returned < total
+    return returned >= limit
+
+
+def iter_pages(fetch_page, page_size=DEFAULT_PAGE_SIZE, prefetch=True):
+    """Yield every page of a paginated list call, one response object at a time.
+
+    fetch_page(offset, limit) must make the API call and return its collection response (anything with
+    .data and, ideally, .total_results). Without a usable total, pages are fetched until one comes back short.
+    With prefetch on, page N+1 is requested on a background thread while the caller works through page N, so at
+    most two pages are held in memory at once.
+    """
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        offset = 0
+        page = fetch_page(offset, page_size)
+        while True:
+            more = _has_more(page, offset, page_size)
+            next_offset = offset + len(page.data or [])
+            upcoming = pool.submit(fetch_page, next_offset, page_size) if more and prefetch else None
+
+            yield page
+
+            if not more:
+                return
+            page = upcoming.result() if upcoming is not None else fetch_page(next_offset, page_size)
+            offset = next_offset
+
+
+def iter_items(fetch_page, page_size=DEFAULT_PAGE_SIZE, prefetch=True):
+    """Like iter_pages, but yields the individual items from each page's .data."""
+    for page in iter_pages(fetch_page, page_size, prefetch):
+        for item in page.data or []:
+            yield item
+
+
+def iter_resources(resources_api, api_key, access_token, resource, page_size=DEFAULT_PAGE_SIZE, prefetch=True,
+                   **kwargs):
+    """Lazily yield every Resource from ResourcesApi.list_resources, fetching pages as they are needed.
+
+    Extra keyword arguments (type, name, sort, include, ...) are passed to every list_resources call.
+    """
+    def fetch_page(offset, limit):
+        return resources_api.list_resources(api_key, access_token, resource, offset=offset, limit=limit, **kwargs)
+
+    return iter_items(fetch_page, page_size, prefetch)
@@ -0,0 +1,31 @@
+import itertools
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def imap_unordered(fn, items, workers=8, max_pending=None):
+    """Call fn(item) for every item on a bounded thread pool.
+
+    Yields (item, result, error) tuples in completion order; exactly one of result/error is meaningful.
+    At most max_pending calls (default 2 * workers) are queued at a time, so items may be a lazy
+    generator of any length without every job being materialized up front.
+    """
+    if max_pending is None:
+        max_pending = workers * 2
+    items = iter(items)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        for item in itertools.islice(items, max_pending):
+            pending[pool.submit(fn, item)] = item
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+
+            # Top the queue back up with as many new jobs as just finished
+            for item in itertools.islice(items, len(done)):
+                pending[pool.submit(fn, item)] = item
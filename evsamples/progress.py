@@ -0,0 +1,37 @@
+import time
+
+
+class RateReporter(object):
+    """Print a running total and its rate per second, at most once every `interval` seconds.
+
+        reporter = RateReporter('Downloaded', unit='MB', scale=1024 ** 2)
+        reporter.update(total_bytes)   # call as often as you like
+        reporter.finish(total_bytes)   # always prints the final line
+    """
+
+    def __init__(self, description, unit='', scale=1, interval=2.0):
+        self.description = description
+        self.unit = unit
+        self.scale = scale
+        self.interval = interval
+        self.started = time.time()
+        self.last_report = self.started
+
+    def rate(self, total):
+        elapsed = time.time() - self.started
+        return total / elapsed if elapsed else 0.0
+
+    def _report(self, total):
+        amount = '{:.1f}'.format(total / self.scale) if self.scale != 1 else str(total)
+        print("{} {} {} ({:.1f} {}/s)".format(
+            self.description, amount, self.unit, self.rate(total) / self.scale, self.unit))
+
+    def update(self, total):
+        now = time.time()
+        if now - self.last_report >= self.interval:
+            self.last_report = now
+            self._report(total)
+
+    def finish(self, total):
+        self._report(total)
+        return self.rate(total)
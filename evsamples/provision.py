@@ -0,0 +1,230 @@
+import io
+import json
+import os
+import posixpath
+import time
+
+from exavault.models.add_folder_request_body import AddFolderRequestBody
+from exavault.models.add_notification_request_body import AddNotificationRequestBody
+from exavault.rest import ApiException
+
+from evsamples.paging import iter_items
+from evsamples.pool import imap_unordered
+from evsamples.records import parse_bool
+from evsamples.records import split_list
+from evsamples.retry import call_with_retries
+from evsamples.retry import is_unsent_error
+
+# Values the API accepts for a notification's action
+NOTIFICATION_ACTIONS = ('upload', 'download', 'delete', 'all')
+
+
+def load_spec(path):
+    """Read a provisioning spec from a .json, .yaml or .yml file (YAML needs the PyYAML package).
+
+    The spec is a mapping with a `folders` list. Each folder has a `path` (relative to the optional top level
+    `root`) and optionally a list of `notifications`, each with an `action` and any of usernames, recipients,
+    message and send_email. Top level `notification_defaults` fill in whatever a notification leaves out:
+
+        root: /clients
+        notification_defaults: {usernames: [notice_user_all], send_email: true}
+        folders:
+          - path: acme/uploads
+            notifications: [{action: upload, recipients: [ops@example.com]}]
+          - path: acme/downloads
+            notifications: [{action: download}]
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with io.open(path, encoding='utf-8') as f:
+        if extension == '.json':
+            return json.load(f)
+        if extension in ('.yaml', '.yml'):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("Reading YAML specs needs the PyYAML package: pip install pyyaml")
+            return yaml.safe_load(f)
+    raise ValueError("Don't know how to read {} files; use .json, .yaml or .yml".format(extension))
+
+
+class ProvisionPlan(object):
+    """The folders and notifications a spec asks for, in the order they can be created.
+
+    parent_levels holds the folders that other folders sit inside, grouped by depth: every folder in a level
+    can be created at the same time once the levels before it exist. leaves are the remaining folders, which
+    nothing depends on, and notifications maps a folder path to the AddNotificationRequestBody objects for it.
+    Folders in `existing` (paths already in the account) are left out of both, though their notifications aren't.
+    """
+
+    def __init__(self, spec, existing=()):
+        root = '/' + (spec.get('root') or '').strip('/')
+        defaults = spec.get('notification_defaults') or {}
+
+        folders = []
+        self.notifications = {}
+        for entry in spec.get('folders') or []:
+            if isinstance(entry, str):
+                entry = {'path': entry}
+            path = posixpath.normpath(posixpath.join(root, entry['path'].strip('/')))
+            if path not in self.notifications:
+                folders.append(path)
+                self.notifications[path] = []
+            for notification in entry.get('notifications') or []:
+                self.notifications[path].append(build_notification_body(path, notification, defaults))
+
+        # Every folder above a listed folder has to exist first, down to (but not including) the account root
+        parents = set()
+        for path in folders:
+            parent = posixpath.dirname(path)
+            while parent != '/':
+                parents.add(parent)
+                parent = posixpath.dirname(parent)
+
+        existing = set(existing)
+        levels = {}
+        for path in parents.difference(existing):
+            levels.setdefault(path.count('/'), []).append(path)
+        self.parent_levels = [sorted(levels[depth]) for depth in sorted(levels)]
+        self.leaves = [path for path in folders if path not in parents and path not in existing]
+
+    @property
+    def folder_count(self):
+        return sum(len(level) for level in self.parent_levels) + len(self.leaves)
+
+    @property
+    def notification_count(self):
+        return sum(len(bodies) for bodies in self.notifications.values())
+
+
+def build_notification_body(path, spec, defaults=None):
+    """Build an AddNotificationRequestBody for the folder at path from a spec entry, filling gaps from defaults."""
+    values = dict(defaults or {})
+    values.update((key, value) for key, value in spec.items() if value not in (None, ''))
+    if values.get('action') not in NOTIFICATION_ACTIONS:
+        raise ValueError("Notification on {} needs an action of {}".format(path, ', '.join(NOTIFICATION_ACTIONS)))
+
+    return AddNotificationRequestBody(
+        type='folder',
+        resource=path,
+        action=values['action'],
+        usernames=split_list(values.get('usernames')) or ['notice_user_all'],
+        send_email=parse_bool(values.get('send_email'), default=True),
+        recipients=split_list(values.get('recipients')) or None,
+        message=values.get('message'),
+    )
+
+
+class ProvisionResult(object):
+    """Outcome of one provisioning call: creating a folder, or adding a notification to one."""
+
+    def __init__(self, kind, path, action=None):
+        self.kind = kind
+        self.path = path
+        self.action = action
+        self.existed = False
+        self.attempts = 0
+        self.seconds = 0.0
+        self.error = None
+
+
+def existing_notifications(notifications_api, api_key, access_token):
+    """Return the (path, action) of every folder notification already in the account."""
+    def fetch_page(offset, limit):
+        return notifications_api.list_notifications(api_key, access_token, type='folder', offset=offset,
+                                                    limit=limit)
+
+    return set((notification.attributes.path.rstrip('/'), notification.attributes.action)
+               for notification in iter_items(fetch_page))
+
+
+def provision(resources_api, notifications_api, api_key, access_token, plan, workers=16, retries=5, backoff=2.0,
+              skip_existing=True):
+    """Create the folders and notifications of a ProvisionPlan, yielding a ProvisionResult for every call.
+
+    Parent folders are created a level at a time, each level in parallel. Then every leaf folder is created
+    and given its notifications as one job, with up to `workers` jobs at once. Notifications on parent folders,
+    and on folders that already existed, run alongside them. A folder that already exists (HTTP 409) counts as
+    created, and with skip_existing the account's folder notifications are listed first so that running the
+    same spec again doesn't add a second copy of any of them. For the same reason a notification is only sent
+    again if the first try can't have reached the account (see retry.is_unsent_error).
+    """
+    existing = set()
+    if skip_existing and plan.notification_count:
+        existing = existing_notifications(notifications_api, api_key, access_token)
+
+    def add_folder(path):
+        result = ProvisionResult('folder', path)
+        started = time.time()
+        try:
+            _, result.attempts = call_with_retries(
+                lambda: resources_api.add_folder(api_key, access_token, body=AddFolderRequestBody(path=path)),
+                retries=retries, backoff=backoff)
+        except ApiException as e:
+            if e.status == 409:
+                result.existed = True
+            else:
+                result.error = e
+        except Exception as e:
+            result.error = e
+        result.seconds = time.time() - started
+        return result
+
+    def add_notification(body):
+        result = ProvisionResult('notification', body.resource, body.action)
+        started = time.time()
+        if (body.resource, body.action) in existing:
+            result.existed = True
+            return result
+        try:
+            _, result.attempts = call_with_retries(
+                lambda: notifications_api.add_notification(api_key, access_token, body=body),
+                retries=retries, backoff=backoff, retry_if=is_unsent_error)
+        except Exception as e:
+            result.error = e
+        result.seconds = time.time() - started
+        return result
+
+    failed_folders = set()
+    for level in plan.parent_levels:
+        for _, result, _ in imap_unordered(add_folder, level, workers=workers):
+            if result.error is not None:
+                failed_folders.add(result.path)
+            yield result
+
+    def parent_failed(path):
+        parent = posixpath.dirname(path)
+        while parent != '/':
+            if parent in failed_folders:
+                return True
+            parent = posixpath.dirname(parent)
+        return False
+
+    def job(item):
+        kind, value = item
+        if kind == 'notification':
+            return [add_notification(value)]
+        results = [add_folder(value)]
+        if results[0].error is None:
+            results.extend(add_notification(body) for body in plan.notifications[value])
+        return results
+
+    # Leaf folders under a parent that couldn't be created would fail too, so they are reported and skipped
+    items = []
+    for path in plan.leaves:
+        if parent_failed(path):
+            result = ProvisionResult('folder', path)
+            result.error = ValueError('a parent folder could not be created')
+            yield result
+        else:
+            items.append(('folder', path))
+    # Notifications on parent folders, and on folders that were already there, don't wait on any leaf
+    leaves = set(plan.leaves)
+    for path in sorted(plan.notifications):
+        if path not in leaves and path not in failed_folders and not parent_failed(path):
+            items.extend(('notification', body) for body in plan.notifications[path])
+
+    for _, results, error in imap_unordered(job, items, workers=workers):
+        if error is not None:
+            raise error
+        for result in results:
+            yield result
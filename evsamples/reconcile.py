@@ -0,0 +1,335 @@
+import fnmatch
+import posixpath
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from dateutil.parser import parse as parse_datetime
+from exavault.models.delete_resources_request_body import DeleteResourcesRequestBody
+from exavault.models.update_share_request_body import UpdateShareRequestBody
+from exavault.models.update_user_request_body import UpdateUserRequestBody
+from exavault.models.user_permissions import UserPermissions
+from exavault.rest import ApiException
+
+from evsamples.paging import DEFAULT_PAGE_SIZE
+from evsamples.paging import iter_items
+from evsamples.pool import imap_unordered
+from evsamples.provision import ProvisionPlan
+from evsamples.provision import provision
+from evsamples.records import parse_bool
+from evsamples.records import split_list
+from evsamples.retry import call_with_retries
+from evsamples.retry import is_transient_error
+from evsamples.retry import is_unsent_error
+from evsamples.shares import ACCESS_NAMES
+from evsamples.shares import AccessProfiles
+from evsamples.shares import build_share_body
+from evsamples.users import PERMISSION_NAMES
+from evsamples.users import PermissionProfiles
+from evsamples.users import build_add_user_body
+
+# User fields that reconcile compares and updates, as (spec field, UserAttributes attribute)
+USER_FIELDS = (
+    ('email', 'email'),
+    ('nickname', 'nickname'),
+    ('home_resource', 'home_path'),
+    ('role', 'role'),
+    ('time_zone', 'time_zone'),
+    ('expiration', 'expiration'),
+    ('locked', 'locked'),
+)
+
+# Folders deleted per deleteResources call
+DELETE_BATCH_SIZE = 100
+
+
+def _folder_path(path):
+    return posixpath.normpath('/' + path.strip('/'))
+
+
+def _flags(obj, names):
+    """The names of the flags that are set on a UsersPermissions/UserPermissions/AccessMode object."""
+    return frozenset(name for name in names if getattr(obj, name, None))
+
+
+class AccountState(object):
+    """The users, folders and shares in an account, indexed by username, path and share name."""
+
+    def __init__(self):
+        self.users = {}
+        self.folders = set()
+        self.shares = {}
+        self.list_calls = 0
+
+
+def fetch_state(resources_api, users_api, shares_api, api_key, access_token, root='/', page_size=DEFAULT_PAGE_SIZE):
+    """List the account's users, shares and the folders below root, all three at once, into an AccountState.
+
+    Folders are found with a single paginated name search (name='*') below root, which covers the whole tree
+    in one listing rather than one listing per folder.
+    """
+    state = AccountState()
+    lock = threading.Lock()
+
+    def counted(fetch_page):
+        def fetch(offset, limit):
+            with lock:
+                state.list_calls += 1
+            return fetch_page(offset, limit)
+        return fetch
+
+    def list_users():
+        for user in iter_items(counted(lambda offset, limit: users_api.list_users(
+                api_key, access_token, offset=offset, limit=limit)), page_size):
+            state.users[user.attributes.username] = user
+
+    def list_shares():
+        for share in iter_items(counted(lambda offset, limit: shares_api.list_shares(
+                api_key, access_token, offset=offset, limit=limit)), page_size):
+            # Shares are matched by name; if two have the same name, the first one listed is the one managed
+            state.shares.setdefault(share.attributes.name, share)
+
+    def list_folders():
+        try:
+            for resource in iter_items(counted(lambda offset, limit: resources_api.list_resources(
+                    api_key, access_token, root, offset=offset, limit=limit, name='*')), page_size):
+                if resource.attributes.type == 'dir':
+                    state.folders.add(_folder_path(resource.attributes.path))
+        except ApiException as e:
+            # The root folder isn't there yet, so neither is anything in it
+            if e.status != 404:
+                raise
+        else:
+            if root != '/':
+                state.folders.add(_folder_path(root))
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        for future in [pool.submit(list_users), pool.submit(list_shares), pool.submit(list_folders)]:
+            future.result()
+    return state
+
+
+class Change(object):
+    """One create, update or delete that reconcile has to make, and how it went once applied.
+
+    kind is 'folder', 'user' or 'share'; key is the path, username or share name. fields lists what an update
+    changes. call makes the API call and is None for folder creates, which are made together by provision.
+    """
+
+    def __init__(self, kind, action, key, call=None, fields=()):
+        self.kind = kind
+        self.action = action
+        self.key = key
+        self.call = call
+        self.fields = list(fields)
+        self.password = None
+        self.attempts = 0
+        self.error = None
+
+    def __str__(self):
+        text = '{} {} {}'.format(self.action, self.kind, self.key)
+        return text + ' ({})'.format(', '.join(self.fields)) if self.fields else text
+
+
+class ReconcilePlan(object):
+    """The changes that make an account match a spec, worked out from an AccountState without any API calls.
+
+    The spec is a mapping (see provision.load_spec for reading one from JSON or YAML):
+
+        root: /clients                  # folders are relative to this, and only folders below it are pruned
+        folders: [acme/uploads, acme/downloads]
+        user_defaults: {role: user, permissions: download upload list, time_zone: UTC}
+        users: [{username: acme, email: ops@acme.example, home_resource: /clients/acme, password: ...}]
+        share_defaults: {access: download upload}
+        shares: [{name: acme-exchange, resources: /clients/acme/uploads}]
+        user_scope: "client_*"          # users that prune may delete
+        share_scope: "client*"          # shares that prune may delete
+
+    Users are compared on USER_FIELDS and permissions, and shares on their resources and access, but only for
+    the fields the spec sets; passwords are only ever set when something is created. Folders used as a home
+    folder or shared by a share are created if they are missing. With prune, users and shares matching the
+    scopes, and folders below root, that the spec doesn't mention are deleted; the master user never is, and
+    nor is the home folder of any user, or a folder shared by any share, that is left in place.
+    """
+
+    def __init__(self, spec, state, resources_api, users_api, shares_api, api_key, access_token, prune=False):
+        self.root = _folder_path(spec.get('root') or '/')
+        self.existing_folders = state.folders
+        self.folder_creates = []
+        self.changes = []
+        self.deletes = []
+        self._api_key = api_key
+        self._access_token = access_token
+        self._resources_api = resources_api
+        self._users_api = users_api
+        self._shares_api = shares_api
+
+        desired_folders = set()
+        for entry in spec.get('folders') or []:
+            path = entry['path'] if isinstance(entry, dict) else entry
+            desired_folders.add(posixpath.normpath(posixpath.join(self.root, path.strip('/'))))
+        desired_users = self._plan_users(spec, state, desired_folders)
+        desired_shares = self._plan_shares(spec, state, desired_folders)
+
+        self.folder_creates = sorted(path for path in desired_folders if path not in state.folders)
+        if prune:
+            self._plan_deletes(spec, state, desired_folders, desired_users, desired_shares)
+
+    @property
+    def change_count(self):
+        return len(self.folder_creates) + len(self.changes) + len(self.deletes)
+
+    def _plan_users(self, spec, state, desired_folders):
+        defaults = spec.get('user_defaults') or {}
+        profiles = PermissionProfiles()
+        desired = set()
+        for record in spec.get('users') or []:
+            values = dict(defaults)
+            values.update((key, value) for key, value in record.items() if value not in (None, ''))
+            username = values.get('username')
+            desired.add(username)
+            if values.get('home_resource'):
+                desired_folders.add(_folder_path(values['home_resource']))
+
+            current = state.users.get(username)
+            if current is None:
+                body = build_add_user_body(values, profiles)
+                self.changes.append(Change('user', 'create', username, partial(
+                    self._users_api.add_user, self._api_key, self._access_token, body=body)))
+                continue
+            if current.attributes.role == 'master':
+                continue
+
+            changed = {}
+            for field, attribute in USER_FIELDS:
+                if field in values and not self._same_user_value(field, values[field],
+                                                                 getattr(current.attributes, attribute)):
+                    changed[field] = parse_bool(values[field]) if field == 'locked' else values[field]
+            if 'permissions' in values:
+                wanted = frozenset(name.lower() for name in split_list(values['permissions']))
+                if wanted != _flags(current.attributes.permissions, PERMISSION_NAMES):
+                    changed['permissions'] = UserPermissions(**{name: name in wanted for name in PERMISSION_NAMES})
+            if changed:
+                body = UpdateUserRequestBody(**changed)
+                call = partial(self._users_api.update_user, self._api_key, self._access_token, current.id, body=body)
+                self.changes.append(Change('user', 'update', username, call, sorted(changed)))
+        return desired
+
+    @staticmethod
+    def _same_user_value(field, wanted, current):
+        if field == 'locked':
+            return parse_bool(wanted) == bool(current)
+        if field == 'home_resource':
+            return current is not None and _folder_path(wanted) == _folder_path(current)
+        if field == 'expiration':
+            if not wanted or not current:
+                return not wanted and not current
+            return parse_datetime(str(wanted)) == parse_datetime(str(current))
+        return str(wanted) == (current or '')
+
+    def _plan_shares(self, spec, state, desired_folders):
+        defaults = spec.get('share_defaults') or {}
+        profiles = AccessProfiles()
+        desired = set()
+        for record in spec.get('shares') or []:
+            body = build_share_body(record, profiles, defaults)
+            body.resources = [_folder_path(path) for path in body.resources]
+            desired.add(body.name)
+            desired_folders.update(body.resources)
+
+            current = state.shares.get(body.name)
+            if current is None:
+                change = Change('share', 'create', body.name,
+                                partial(self._shares_api.add_share, self._api_key, self._access_token, body=body))
+                change.password = body.password
+                self.changes.append(change)
+                continue
+
+            changed = {}
+            record_fields = set(record) | set(defaults)
+            if 'resources' in record_fields and set(body.resources) != set(
+                    _folder_path(path) for path in current.attributes.paths or []):
+                changed['resources'] = body.resources
+            if 'access' in record_fields and _flags(body.access_mode, ACCESS_NAMES) != _flags(
+                    current.attributes.access_mode, ACCESS_NAMES):
+                changed['access_mode'] = body.access_mode
+            if changed:
+                update = UpdateShareRequestBody(**changed)
+                # Note that updateShareById takes the body first and the share's id last
+                call = partial(self._shares_api.update_share_by_id, update, self._api_key, self._access_token,
+                               current.id)
+                self.changes.append(Change('share', 'update', body.name, call, sorted(changed)))
+        return desired
+
+    def _plan_deletes(self, spec, state, desired_folders, desired_users, desired_shares):
+        user_scope = spec.get('user_scope')
+        if user_scope:
+            for username, user in sorted(state.users.items()):
+                if (username not in desired_users and user.attributes.role != 'master' and
+                        fnmatch.fnmatch(username, user_scope)):
+                    self.deletes.append(Change('user', 'delete', username, partial(
+                        self._users_api.delete_user, user.id, self._api_key, self._access_token)))
+
+        share_scope = spec.get('share_scope')
+        if share_scope:
+            for name, share in sorted(state.shares.items()):
+                if name not in desired_shares and fnmatch.fnmatch(name, share_scope):
+                    self.deletes.append(Change('share', 'delete', name, partial(
+                        self._shares_api.delete_share_by_id, share.id, self._api_key, self._access_token)))
+
+        # A folder is kept if it is wanted, is the home folder of a user or shared by a share that stays, or holds
+        # something that is; of the rest only the topmost are deleted, which removes everything inside them too
+        deleted = set((change.kind, change.key) for change in self.deletes)
+        in_use = set(desired_folders)
+        for username, user in state.users.items():
+            if ('user', username) not in deleted and user.attributes.home_path:
+                in_use.add(_folder_path(user.attributes.home_path))
+        for name, share in state.shares.items():
+            if ('share', name) not in deleted:
+                in_use.update(_folder_path(path) for path in share.attributes.paths or [])
+        keep = set()
+        for path in in_use:
+            while path != '/':
+                keep.add(path)
+                path = posixpath.dirname(path)
+        unwanted = set(path for path in state.folders
+                       if path.startswith(self.root.rstrip('/') + '/') and path not in keep)
+        topmost = sorted(path for path in unwanted if posixpath.dirname(path) not in unwanted)
+        for start in range(0, len(topmost), DELETE_BATCH_SIZE):
+            batch = topmost[start:start + DELETE_BATCH_SIZE]
+            self.deletes.append(Change('folder', 'delete', ', '.join(batch), partial(
+                self._resources_api.delete_resources, self._api_key, self._access_token,
+                body=DeleteResourcesRequestBody(resources=batch))))
+
+
+def apply_plan(plan, resources_api, api_key, access_token, workers=16, retries=5, backoff=2.0):
+    """Make the changes in a ReconcilePlan, yielding every Change as it is done (check Change.error).
+
+    Missing folders are created first, parents before children (see provision), then users and shares are
+    created and updated `workers` at a time, and finally anything pruned is deleted: shares and users first,
+    then folders. Updates and deletes are retried on any transient failure, since making them twice does no
+    harm. A user or share create is only retried when it can't have reached the account (see
+    retry.is_unsent_error); any other failure is left for the next run, which will see whether it was made.
+    """
+    if plan.folder_creates:
+        folder_plan = ProvisionPlan({'folders': plan.folder_creates}, existing=plan.existing_folders)
+        for result in provision(resources_api, None, api_key, access_token, folder_plan, workers=workers,
+                                retries=retries, backoff=backoff):
+            change = Change('folder', 'create', result.path)
+            change.attempts = result.attempts
+            change.error = result.error
+            yield change
+
+    def run(change):
+        try:
+            retry_if = is_unsent_error if change.action == 'create' else is_transient_error
+            _, change.attempts = call_with_retries(change.call, retries=retries, backoff=backoff, retry_if=retry_if)
+        except Exception as e:
+            change.error = e
+        return change
+
+    for batch in (plan.changes, [change for change in plan.deletes if change.kind != 'folder'],
+                  [change for change in plan.deletes if change.kind == 'folder']):
+        for _, change, _ in imap_unordered(run, batch, workers=workers):
+            yield change
@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+import os
+
+
+def read_records(path):
+    """Yield one dict per record from a .csv, .jsonl/.ndjson or .json (list of objects) file.
+
+    CSV values are all strings; use parse_bool and split_list to interpret them.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        with io.open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                yield row
+    elif extension in ('.jsonl', '.ndjson'):
+        with io.open(path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    elif extension == '.json':
+        with io.open(path, encoding='utf-8') as f:
+            for record in json.load(f):
+                yield record
+    else:
+        raise ValueError("Don't know how to read {} files; use .csv, .jsonl or .json".format(extension))
+
+
+def parse_bool(value, default=False):
+    """Interpret a CSV/JSON value such as 'yes', 'true', '1', True or '' as a bool."""
+    if value is None or value == '':
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'y')
+
+
+def split_list(value):
+    """Turn 'a b c', 'a|b|c', 'a,b,c' or ['a', 'b', 'c'] into a list of non-empty strings."""
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    for separator in ('|', ','):
+        value = value.replace(separator, ' ')
+    return value.split()
@@ -0,0 +1,226 @@
+import collections
+import io
+import json
+import random
+import threading
+import time
+
+from urllib.parse import urlparse
+
+from exavault.rest import ApiException
+
+from evsamples.retry import backoff_delay
+from evsamples.retry import error_summary
+from evsamples.retry import is_transient_error
+from evsamples.retry import is_unsent_error
+from evsamples.retry import retry_after
+
+# HTTP methods that can safely be sent twice: repeating them leaves the account the same as sending them once
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+# (connect, read) timeouts in seconds for calls that don't set their own with _request_timeout. The read timeout
+# is the longest wait for the next bytes of a response, not for the whole of it, so long downloads aren't cut off
+DEFAULT_TIMEOUT = (10.0, 120.0)
+
+# Failed calls an ErrorReport keeps the details of; any beyond that are only counted
+DEFAULT_REPORT_LIMIT = 1000
+
+# Longest a CallPolicy keeps a call waiting for an open CircuitBreaker before giving up on it, in seconds
+DEFAULT_MAX_HOLD = 300.0
+
+
+class CircuitOpenError(ApiException):
+    """Raised in place of making a call while a CircuitBreaker is open.
+
+    It looks like an HTTP 503 with a Retry-After header of the time left until the breaker lets a call through
+    again, so call_with_retries and CallPolicy treat it as a transient failure and wait that long before retrying.
+    """
+
+    def __init__(self, wait):
+        ApiException.__init__(self, status=503, reason='Circuit open')
+        self.headers = {'Retry-After': '{:.2f}'.format(wait)}
+        self.body = 'Too many failed calls in a row; not calling the API for another {:.1f}s'.format(wait)
+
+
+class CircuitBreaker(object):
+    """Stops calling an account that keeps failing, so a large job waits out an outage instead of adding to it.
+
+    After failure_threshold transient failures in a row (see retry.is_transient_error) the breaker opens, and for
+    the next reset_timeout seconds every call fails straight away with CircuitOpenError. After that a single
+    trial call is let through: if it works the breaker closes again, and if it fails the breaker opens for
+    another reset_timeout. Any answer from the account that isn't a transient failure counts as working.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.times_opened = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raise CircuitOpenError if a call shouldn't be made now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN:
+                # Another thread is making the trial call; check back about when it should have finished
+                raise CircuitOpenError(min(1.0, self.reset_timeout))
+            wait = self._opened_at + self.reset_timeout - time.time()
+            if wait > 0:
+                raise CircuitOpenError(wait)
+            self.state = self.HALF_OPEN
+
+    def record(self, succeeded):
+        """Record how a call that before_call let through turned out."""
+        with self._lock:
+            if succeeded:
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and
+                                                self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.time()
+                self.times_opened += 1
+
+
+class ErrorReport(object):
+    """A thread safe account of the calls made through a CallPolicy: how many, how many retries, and every failure.
+
+    Each call the policy finally gives up on is kept as a dict (time, method, path, status, error type, attempts
+    and error_summary), up to `limit` of them, so a long job can end with a summary instead of a stack trace.
+    """
+
+    def __init__(self, limit=DEFAULT_REPORT_LIMIT):
+        self.limit = limit
+        self.calls = 0
+        self.retries = 0
+        self.failures = []
+        self.failure_count = 0
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def count_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def count_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add(self, method, path, error, attempts):
+        status = getattr(error, 'status', None) if isinstance(error, ApiException) else None
+        with self._lock:
+            self.failure_count += 1
+            self._counts['HTTP {}'.format(status) if status else type(error).__name__] += 1
+            if len(self.failures) < self.limit:
+                self.failures.append({
+                    'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                    'method': method,
+                    'path': path,
+                    'status': status,
+                    'error_type': type(error).__name__,
+                    'attempts': attempts,
+                    'error': error_summary(error),
+                })
+
+    def counts(self):
+        """Failures by kind, e.g. {'HTTP 503': 12, 'CircuitOpenError': 3, 'ReadTimeoutError': 1}."""
+        with self._lock:
+            return dict(self._counts)
+
+    def summary(self):
+        """Describe the report on one line."""
+        with self._lock:
+            text = '{} calls, {} retries, {} failed'.format(self.calls, self.retries, self.failure_count)
+            if self._counts:
+                text += ' ({})'.format(', '.join('{} {}'.format(count, kind)
+                                                 for kind, count in self._counts.most_common()))
+            return text
+
+    def save(self, path):
+        """Write every kept failure to path as JSON lines."""
+        with self._lock:
+            failures = list(self.failures)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            for failure in failures:
+                f.write(u'{}\n'.format(json.dumps(failure)))
+
+
+class CallPolicy(object):
+    """Timeouts, retries and a circuit breaker applied to every API call made through an ApiSession.
+
+    Pass one to ApiSession(policy=...) and every call made by any API class the session hands out gets:
+
+    - `timeout` as its (connect, read) timeout, unless the call sets its own with _request_timeout
+    - up to `retries` retries of transient failures (see retry.is_transient_error), waiting as call_with_retries
+      does, but never longer than max_backoff whatever Retry-After asks for. Only IDEMPOTENT_METHODS are retried
+      on any transient failure; a POST or PATCH is only sent again if it can't have reached the account (see
+      retry.is_unsent_error)
+    - a check with `breaker` (a CircuitBreaker) before every attempt. A call the breaker holds back was never
+      sent, so whatever its method it waits for the breaker to let it through, for up to max_hold seconds, and
+      that waiting doesn't use up its retries. The waits are jittered so that held calls don't all arrive at once
+    - its final failure, and every retry, recorded in `report` (an ErrorReport, made for you if not given)
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=3, backoff=1.0, max_backoff=30.0, breaker=None,
+                 report=None, idempotent_methods=IDEMPOTENT_METHODS, max_hold=DEFAULT_MAX_HOLD):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker
+        self.report = report if report is not None else ErrorReport()
+        self.idempotent_methods = idempotent_methods
+        self.max_hold = max_hold
+
+    def call(self, method, url, send, timeout=None):
+        """Make a request with send(timeout), which returns the response or raises, following the policy."""
+        if timeout is None:
+            timeout = self.timeout
+        idempotent = method.upper() in self.idempotent_methods
+        self.report.count_call()
+        attempt = 0
+        held = 0.0
+        while True:
+            if self.breaker is not None:
+                try:
+                    self.breaker.before_call()
+                except CircuitOpenError as e:
+                    wait = retry_after(e)
+                    if held + wait > self.max_hold:
+                        self.report.add(method, urlparse(url).path, e, attempt)
+                        raise
+                    wait += random.uniform(0, min(wait, self.backoff))
+                    held += wait
+                    time.sleep(wait)
+                    continue
+
+            attempt += 1
+            try:
+                response = send(timeout)
+            except Exception as e:
+                transient = is_transient_error(e)
+                if self.breaker is not None:
+                    self.breaker.record(not transient)
+                retryable = transient if idempotent else is_unsent_error(e)
+                if attempt > self.retries or not retryable:
+                    self.report.add(method, urlparse(url).path, e, attempt)
+                    raise
+                delay = retry_after(e)
+                if delay is None:
+                    delay = backoff_delay(attempt, self.backoff, self.max_backoff)
+                self.report.count_retry()
+                time.sleep(min(delay, self.max_backoff))
+                continue
+            if self.breaker is not None:
+                self.breaker.record(True)
+            return response
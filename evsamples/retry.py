@@ -0,0 +1,103 @@
+import math
+import random
+import socket
+import time
+
+from urllib3.exceptions import ConnectTimeoutError
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+from urllib3.exceptions import ProtocolError
+from urllib3.exceptions import TimeoutError as Urllib3TimeoutError
+
+from exavault.rest import ApiException
+
+# HTTP statuses that are worth trying again: throttling and server-side failures
+TRANSIENT_STATUSES = (408, 429, 500, 502, 503, 504)
+
+# HTTP statuses that mean the account turned a request away without acting on it
+REJECTED_STATUSES = (429, 503)
+
+# Errors below the HTTP layer that are worth trying again: dropped or refused connections and timeouts. Other
+# OSErrors, such as a missing or unreadable local file, won't be fixed by trying again
+TRANSIENT_EXCEPTIONS = (ProtocolError, NewConnectionError, Urllib3TimeoutError, ConnectionError, TimeoutError,
+                        socket.timeout)
+
+
+def is_transient_error(error):
+    """Return True if error looks like a temporary failure that a retry may fix."""
+    if isinstance(error, ApiException):
+        return error.status is None or error.status in TRANSIENT_STATUSES
+    # urllib3 gives up on a connection with MaxRetryError; whether it is worth trying again depends on why
+    if isinstance(error, MaxRetryError):
+        return error.reason is None or is_transient_error(error.reason)
+    return isinstance(error, TRANSIENT_EXCEPTIONS)
+
+
+def is_unsent_error(error):
+    """Return True if error shows that the account never acted on the request: it was throttled or turned away
+    (429, 503), or the connection couldn't be made at all.
+
+    Calls that aren't safe to repeat, such as creating a user or a share, should only be retried on these. After
+    a read timeout or a 500 the call may well have worked, and sending it again would create a second copy or
+    fail with "already exists".
+    """
+    if isinstance(error, ApiException):
+        return error.status in REJECTED_STATUSES
+    if isinstance(error, MaxRetryError):
+        return error.reason is not None and is_unsent_error(error.reason)
+    return isinstance(error, (NewConnectionError, ConnectTimeoutError, ConnectionRefusedError))
+
+
+def error_summary(error):
+    """Describe error on one line, e.g. 'HTTP 429 Too Many Requests: {"responseStatus":429,...}'."""
+    if isinstance(error, ApiException):
+        body = error.body.decode('utf-8', 'replace') if isinstance(error.body, bytes) else error.body
+        summary = 'HTTP {} {}'.format(error.status, error.reason or '').strip()
+        return '{}: {}'.format(summary, ' '.join(body.split())) if body else summary
+    return ' '.join('{}: {}'.format(type(error).__name__, error).split())
+
+
+def retry_after(error):
+    """Return the number of seconds a throttled response asked us to wait, or None.
+
+    A negative value counts as 0, and one that isn't a finite number (nan, inf) as no header at all.
+    """
+    headers = getattr(error, 'headers', None)
+    if not headers:
+        return None
+    try:
+        seconds = float(headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(seconds):
+        return None
+    return max(0.0, seconds)
+
+
+def backoff_delay(attempt, backoff=1.0, max_backoff=30.0):
+    """Seconds to wait before retry number `attempt`: exponential in attempt, capped, with half of it jittered."""
+    delay = min(max_backoff, backoff * (2 ** (attempt - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def call_with_retries(fn, retries=3, backoff=1.0, max_backoff=30.0, retry_if=is_transient_error):
+    """Call fn() and retry transient failures with jittered exponential backoff.
+
+    Returns (result, attempts). The last error is re-raised once retries are used up, and
+    non-transient errors (bad credentials, missing paths, ...) are raised straight away. A Retry-After
+    header on a throttled response is used in place of the backoff delay, up to max_backoff.
+
+    retry_if decides which errors are retried; pass is_unsent_error for calls that aren't safe to repeat.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return fn(), attempt
+        except Exception as e:
+            if attempt > retries or not retry_if(e):
+                raise
+            delay = retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt, backoff, max_backoff)
+            time.sleep(min(delay, max_backoff))
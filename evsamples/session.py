@@ -0,0 +1,99 @@
+import socket
+
+from exavault import ApiClient
+from exavault import Configuration
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+# Connections each session keeps open to the account, unless a sample asks for more (e.g. one per worker thread)
+DEFAULT_POOL_SIZE = 8
+
+# Send TCP keep-alive probes on idle pooled connections, so that a connection left idle between two calls (for
+# example while waiting on a slow upload elsewhere) is not silently dropped by a firewall or NAT in between
+KEEPALIVE_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+for _name, _value in (('TCP_KEEPIDLE', 60), ('TCP_KEEPINTVL', 15), ('TCP_KEEPCNT', 4)):
+    if hasattr(socket, _name):
+        KEEPALIVE_OPTIONS.append((socket.IPPROTO_TCP, getattr(socket, _name), _value))
+
+
+class _SessionApiClient(ApiClient):
+    """An ApiClient that sends every request through a Throttle (see evsamples.throttle) and/or a CallPolicy
+    (see evsamples.resilience).
+
+    The policy wraps the throttle, so every retry waits its turn like any other request, but the policy's waits
+    between retries don't hold a throttle slot.
+    """
+
+    def __init__(self, configuration, throttle=None, policy=None):
+        ApiClient.__init__(self, configuration)
+        self.throttle = throttle
+        self.policy = policy
+
+    def request(self, method, url, **kwargs):
+        if self.policy is None:
+            return self._send(method, url, **kwargs)
+
+        def send(timeout):
+            kwargs['_request_timeout'] = timeout
+            return self._send(method, url, **kwargs)
+
+        return self.policy.call(method, url, send, timeout=kwargs.get('_request_timeout'))
+
+    def _send(self, method, url, **kwargs):
+        if self.throttle is None:
+            return ApiClient.request(self, method, url, **kwargs)
+        with self.throttle.slot():
+            return ApiClient.request(self, method, url, **kwargs)
+
+
+class ApiSession(object):
+    """A single ApiClient, and so a single pool of HTTP connections, shared by every API class a sample uses.
+
+    Creating ResourcesApi(), SharesApi() and so on without arguments gives each of them its own ApiClient, with
+    its own connection pool, and every one of those has to open (and TLS handshake) its own connections. Ask the
+    session for them instead and they all reuse the same connections:
+
+        session = ApiSession(ACCOUNT_URL)
+        resources_api = session.api(ResourcesApi)
+        shares_api = session.api(SharesApi)
+
+    pool_size is the number of connections kept open to the account. Give it at least the number of threads that
+    will be making calls at the same time, or the extra threads will open connections that are then thrown away.
+
+    throttle, an evsamples.throttle.Throttle, limits the rate and/or concurrency of every call made through any of
+    the session's APIs.
+
+    policy, an evsamples.resilience.CallPolicy, gives every call made through any of the session's APIs a timeout,
+    retries of transient failures where it is safe to repeat the call, and a circuit breaker, and records how they
+    went in policy.report.
+    """
+
+    def __init__(self, host, pool_size=DEFAULT_POOL_SIZE, keepalive=True, throttle=None, policy=None):
+        configuration = Configuration()
+        configuration.host = host
+        configuration.connection_pool_maxsize = max(configuration.connection_pool_maxsize, pool_size)
+        if throttle is not None or policy is not None:
+            self.api_client = _SessionApiClient(configuration, throttle, policy)
+        else:
+            self.api_client = ApiClient(configuration)
+
+        # urllib3 creates the connection pool for the account on the first request, with these arguments
+        pool_kw = self.api_client.rest_client.pool_manager.connection_pool_kw
+        if keepalive:
+            pool_kw['socket_options'] = HTTPConnection.default_socket_options + KEEPALIVE_OPTIONS
+        if policy is not None:
+            # The policy decides which calls are sent again. Left to itself urllib3 would also resend a GET, PUT
+            # or DELETE whose response timed out, on top of the policy's own retries; it still retries
+            # connections that fail before anything has been sent
+            pool_kw['retries'] = Retry(total=3, read=0)
+        self._apis = {}
+
+    @property
+    def configuration(self):
+        return self.api_client.configuration
+
+    def api(self, api_class):
+        """Return the session's instance of api_class (ResourcesApi, UsersApi, ...), bound to its ApiClient."""
+        if api_class not in self._apis:
+            self._apis[api_class] = api_class(self.api_client)
+        return self._apis[api_class]
@@ -0,0 +1,185 @@
+import secrets
+import string
+import time
+
+from dateutil.parser import parse as parse_datetime
+from exavault.models.access_mode import AccessMode
+from exavault.models.add_share_request_body import AddShareRequestBody
+from exavault.models.update_share_request_body import UpdateShareRequestBody
+
+from evsamples.paging import iter_items
+from evsamples.pool import imap_unordered
+from evsamples.records import parse_bool
+from evsamples.records import split_list
+from evsamples.retry import call_with_retries
+from evsamples.retry import error_summary
+from evsamples.retry import is_unsent_error
+
+# Fields a record must provide (or take from the defaults) to create a share
+REQUIRED_FIELDS = ('name', 'resources')
+
+# Every flag on an AccessMode object
+ACCESS_NAMES = ('download', 'upload', 'modify', 'delete')
+
+# A record's password field set to this gets a newly generated password instead
+GENERATE_PASSWORD = 'generate'
+
+# Length of generated share passwords
+PASSWORD_LENGTH = 16
+
+
+class AccessProfiles(object):
+    """Hands out one shared AccessMode object per distinct set of access names."""
+
+    def __init__(self):
+        self._profiles = {}
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def get(self, names):
+        key = frozenset(name.lower() for name in names)
+        unknown = key.difference(ACCESS_NAMES)
+        if unknown:
+            raise ValueError("Unknown access mode(s): {}".format(', '.join(sorted(unknown))))
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = AccessMode(**{name: name in key for name in ACCESS_NAMES})
+            self._profiles[key] = profile
+        return profile
+
+
+def generate_password(length=PASSWORD_LENGTH):
+    """Return a random password with at least one lower case letter, upper case letter, digit and symbol."""
+    alphabet = string.ascii_letters + string.digits + '!?#%+-='
+    while True:
+        password = ''.join(secrets.choice(alphabet) for _ in range(length))
+        if (any(c.islower() for c in password) and any(c.isupper() for c in password) and
+                any(c.isdigit() for c in password) and any(not c.isalnum() for c in password)):
+            return password
+
+
+def build_share_body(spec, profiles, defaults=None):
+    """Build an AddShareRequestBody from a spec record (see read_records), filling gaps from defaults.
+
+    resources and access may be lists or space/comma/pipe separated strings; access names are ACCESS_NAMES.
+    A password of GENERATE_PASSWORD is replaced with a generated one, which is on the returned body.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Expected an object with the share's fields, not {}".format(type(spec).__name__))
+    values = dict(defaults or {})
+    values.update((key, value) for key, value in spec.items() if value not in (None, ''))
+    missing = [field for field in REQUIRED_FIELDS if not values.get(field)]
+    if missing:
+        raise ValueError("Missing required field(s): {}".format(', '.join(missing)))
+
+    password = values.get('password')
+    if password == GENERATE_PASSWORD:
+        password = generate_password()
+    expiration = values.get('expiration')
+    if isinstance(expiration, str):
+        expiration = parse_datetime(expiration)
+
+    return AddShareRequestBody(
+        type=values.get('type', 'shared_folder'),
+        name=values['name'],
+        resources=split_list(values['resources']),
+        access_mode=profiles.get(split_list(values.get('access'))),
+        password=password,
+        expiration=expiration,
+        require_email=parse_bool(values.get('require_email')),
+    )
+
+
+class ShareResult(object):
+    """Outcome of creating, listing or changing the password of one share."""
+
+    def __init__(self, action, name, share_id=None):
+        self.action = action
+        self.name = name
+        self.share_id = share_id
+        self.hash = None
+        self.paths = None
+        self.password = None
+        self.attempts = 0
+        self.seconds = 0.0
+        self.error = None
+
+    @classmethod
+    def from_share(cls, share, action):
+        result = cls(action, share.attributes.name)
+        _fill(result, share)
+        return result
+
+    def record(self):
+        """The result as a dict for a JSON report; password only appears when it was just set."""
+        record = {'action': self.action, 'name': self.name, 'id': self.share_id, 'hash': self.hash,
+                  'paths': self.paths}
+        if self.password is not None:
+            record['password'] = self.password
+        if self.error is not None:
+            record['error'] = error_summary(self.error)
+        return record
+
+
+def _fill(result, share):
+    result.share_id = share.id
+    result.hash = share.attributes.hash
+    result.paths = share.attributes.paths
+
+
+def add_shares(shares_api, api_key, access_token, bodies, workers=8, retries=5, backoff=2.0):
+    """Submit AddShareRequestBody objects concurrently, yielding a ShareResult as each call finishes.
+
+    Calls that were throttled (429), turned away (503) or couldn't connect are retried with backoff. Other
+    failures, such as a timeout waiting for the answer, aren't: the share may have been created already, and
+    sending the request again would make a second share with the same name.
+    """
+    def work(body):
+        result = ShareResult('created', body.name)
+        started = time.time()
+        try:
+            response, result.attempts = call_with_retries(
+                lambda: shares_api.add_share(api_key, access_token, body=body), retries=retries, backoff=backoff,
+                retry_if=is_unsent_error)
+            _fill(result, response.data)
+            result.password = body.password
+        except Exception as e:
+            result.error = e
+        result.seconds = time.time() - started
+        return result
+
+    for _, result, _ in imap_unordered(work, bodies, workers=workers):
+        yield result
+
+
+def iter_shares(shares_api, api_key, access_token, page_size=100, **filters):
+    """Lazily yield every Share from SharesApi.list_shares; filters (name, type, scope, ...) go to every call."""
+    def fetch_page(offset, limit):
+        return shares_api.list_shares(api_key, access_token, offset=offset, limit=limit, **filters)
+
+    return iter_items(fetch_page, page_size)
+
+
+def rotate_passwords(shares_api, api_key, access_token, shares, workers=8, retries=5, backoff=2.0,
+                     length=PASSWORD_LENGTH):
+    """Give every Share in shares a newly generated password, concurrently, yielding a ShareResult for each."""
+    def work(share):
+        result = ShareResult('rotated', share.attributes.name, share.id)
+        started = time.time()
+        password = generate_password(length)
+        try:
+            # Note that updateShareById takes the body first and the share's id last
+            response, result.attempts = call_with_retries(
+                lambda: shares_api.update_share_by_id(UpdateShareRequestBody(password=password), api_key,
+                                                      access_token, share.id),
+                retries=retries, backoff=backoff)
+            _fill(result, response.data)
+            result.password = password
+        except Exception as e:
+            result.error = e
+        result.seconds = time.time() - started
+        return result
+
+    for _, result, _ in imap_unordered(work, shares, workers=workers):
+        yield result
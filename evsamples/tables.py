@@ -0,0 +1,138 @@
+import csv
+import datetime
+import io
+import json
+
+# Rows buffered before each write in the columnar (Parquet/Arrow) formats
+BATCH_SIZE = 10000
+
+# Output formats understood by open_table, and the file extension used for each
+FORMATS = {'csv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+
+class Column(object):
+    """One column of a report: how to get its value from an object, and how to write it.
+
+    kind is one of 'int', 'str', 'bool' or 'timestamp'; it sets the column type in Parquet/Arrow output.
+    In CSV output a True bool is written as true_text (or 'true'), False as '', and None as none_text.
+    """
+
+    def __init__(self, header, key, getter, kind='str', true_text=None, none_text=''):
+        self.header = header
+        self.key = key
+        self.getter = getter
+        self.kind = kind
+        self.true_text = true_text
+        self.none_text = none_text
+
+    def text(self, value):
+        if value is None:
+            return self.none_text
+        if self.kind == 'bool':
+            return (self.true_text or 'true') if value else ''
+        return str(value)
+
+
+def _json_value(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return value
+
+
+class CsvTableWriter(object):
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = io.open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([column.header for column in columns])
+
+    def write(self, obj):
+        self.writer.writerow([column.text(column.getter(obj)) for column in self.columns])
+
+    def close(self):
+        self.file.close()
+
+
+class JsonlTableWriter(object):
+    def __init__(self, path, columns):
+        self.columns = columns
+        self.file = io.open(path, 'w', encoding='utf-8')
+
+    def write(self, obj):
+        record = dict((column.key, _json_value(column.getter(obj))) for column in self.columns)
+        self.file.write(json.dumps(record) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ArrowTableWriter(object):
+    """Writes Parquet or Arrow IPC files in batches of BATCH_SIZE rows. Requires the pyarrow package."""
+
+    def __init__(self, path, columns, format='parquet'):
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("Writing {} files needs the pyarrow package: pip install pyarrow".format(format))
+
+        self.pyarrow = pyarrow
+        self.columns = columns
+        types = {
+            'int': pyarrow.int64(),
+            'str': pyarrow.string(),
+            'bool': pyarrow.bool_(),
+            'timestamp': pyarrow.timestamp('us', tz='UTC'),
+        }
+        self.schema = pyarrow.schema([(column.key, types[column.kind]) for column in columns])
+        if format == 'parquet':
+            import pyarrow.parquet
+            self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        else:
+            import pyarrow.ipc
+            self.writer = pyarrow.ipc.new_file(path, self.schema)
+        self._reset()
+
+    def _reset(self):
+        self.batch = [[] for _ in self.columns]
+        self.rows = 0
+
+    def write(self, obj):
+        for values, column in zip(self.batch, self.columns):
+            values.append(column.getter(obj))
+        self.rows += 1
+        if self.rows >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pyarrow.Table.from_arrays(
+                [self.pyarrow.array(values, type=field.type) for values, field in zip(self.batch, self.schema)],
+                schema=self.schema))
+            self._reset()
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class open_table(object):
+    """Context manager returning a writer with .write(obj) for the given format (see FORMATS)."""
+
+    def __init__(self, path, columns, format='csv'):
+        if format not in FORMATS:
+            raise ValueError("Unknown format {}; choose from {}".format(format, ', '.join(sorted(FORMATS))))
+        self.path = path
+        self.columns = columns
+        self.format = format
+
+    def __enter__(self):
+        if self.format == 'csv':
+            self.writer = CsvTableWriter(self.path, self.columns)
+        elif self.format == 'jsonl':
+            self.writer = JsonlTableWriter(self.path, self.columns)
+        else:
+            self.writer = ArrowTableWriter(self.path, self.columns, self.format)
+        return self.writer
+
+    def __exit__(self, *exc_info):
+        self.writer.close()
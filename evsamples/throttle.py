@@ -0,0 +1,125 @@
+import contextlib
+import threading
+import time
+
+from exavault.rest import ApiException
+
+
+class TokenBucket(object):
+    """Limits calls to `rate` per second on average, allowing bursts of up to `burst` calls at once.
+
+    Thread-safe: every thread calling acquire() draws from the same bucket, so one TokenBucket shared by all of a
+    sample's workers limits the sample as a whole.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Take `tokens` from the bucket, sleeping until enough have refilled."""
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AimdController(object):
+    """Adjusts how many calls may run at once: additive increase, multiplicative decrease.
+
+    The limit grows by one each time a limit's worth of calls succeed in a row while the limit is in full use
+    (there is no point raising a limit that isn't being reached), and is multiplied by `decrease`
+    when a call is throttled (HTTP 429) or takes more than `latency_tolerance` times the usual latency, which is
+    what happens once the server starts queueing our requests. The usual latency is a moving average of
+    successful calls only, each moving it `baseline_weight` of the way, so neither a quick error nor one
+    unusually fast answer can make every normal call look slow for the rest of the run. Only calls started after
+    the last decrease can trigger another one, so a burst of 429s from calls that were already in flight counts
+    once. Calls that fail any other way leave the limit as it is.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, decrease=0.5, latency_tolerance=3.0,
+                 baseline_weight=0.1):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.baseline_weight = baseline_weight
+        self.baseline = None
+        self.in_flight = 0
+        self.decreases = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @contextlib.contextmanager
+    def slot(self):
+        """Wait until fewer than `limit` calls are running, then run the body as one of them."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+        started = time.time()
+        outcome = None
+        try:
+            yield
+            outcome = 'ok'
+        except ApiException as e:
+            if e.status == 429:
+                outcome = 'throttled'
+            raise
+        finally:
+            self._record(started, time.time() - started, outcome)
+
+    def _record(self, started, seconds, outcome):
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+            slow = False
+            if outcome == 'ok':
+                slow = (self.latency_tolerance and self.baseline and
+                        seconds > self.baseline * self.latency_tolerance)
+                if self.baseline is None:
+                    self.baseline = seconds
+                else:
+                    self.baseline += self.baseline_weight * (seconds - self.baseline)
+            if outcome == 'throttled' or slow:
+                if started >= self._last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease)
+                    self._last_decrease = time.time()
+                    self.decreases += 1
+            elif outcome == 'ok' and saturated:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+
+
+class Throttle(object):
+    """A TokenBucket and/or an AimdController applied together to every call made through an ApiSession.
+
+    Either part may be None. Pass one Throttle to ApiSession(throttle=...) and every API class the session hands
+    out waits its turn, so the limits hold across all of a sample's threads and APIs.
+    """
+
+    def __init__(self, bucket=None, controller=None):
+        self.bucket = bucket
+        self.controller = controller
+
+    @contextlib.contextmanager
+    def slot(self):
+        # The rate token is taken before waiting for a concurrency slot, so that calls waiting on the bucket
+        # don't hold slots and make the controller think the limit is in full use
+        if self.bucket is not None:
+            self.bucket.acquire()
+        if self.controller is None:
+            yield
+        else:
+            with self.controller.slot():
+                yield
@@ -0,0 +1,174 @@
+import json
+import mimetypes
+import mmap
+import os
+import posixpath
+import time
+
+from evsamples.pool import imap_unordered
+from evsamples.retry import call_with_retries
+
+# Files larger than this are sent in pieces of this size with upload_chunked
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Suffix of the sidecar file that records how much of an interrupted chunked upload the server has confirmed
+STATE_SUFFIX = '.evupload'
+
+
+class UploadResult(object):
+    """Outcome of uploading one local file."""
+
+    def __init__(self, local_path, remote_path, size):
+        self.local_path = local_path
+        self.remote_path = remote_path
+        self.size = size
+        self.seconds = 0.0
+        self.attempts = 0
+        self.resource = None
+        self.error = None
+        # 'uploaded', or 'skipped' / 'copied' when evsamples.dedup found the content in the account already
+        self.action = 'uploaded'
+
+    @property
+    def bytes_per_second(self):
+        return self.size / self.seconds if self.seconds else 0.0
+
+
+def iter_local_files(local_root, remote_root):
+    """Walk local_root and yield (local_path, remote_path) pairs mirroring the tree under remote_root."""
+    remote_root = '/' + remote_root.strip('/')
+    for dirpath, dirnames, filenames in os.walk(local_root):
+        dirnames.sort()
+        relative_dir = os.path.relpath(dirpath, local_root)
+        parts = [] if relative_dir == os.curdir else relative_dir.split(os.sep)
+        for filename in sorted(filenames):
+            if filename.endswith(STATE_SUFFIX):
+                continue
+            yield (os.path.join(dirpath, filename),
+                   posixpath.join(remote_root, *(parts + [filename])))
+
+
+def _load_state(state_path, remote_path, size, mtime):
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (IOError, OSError, ValueError):
+        return 0
+    # Only trust the saved offset if it belongs to this exact version of the file and destination
+    if (state.get('remote_path'), state.get('size'), state.get('mtime')) != (remote_path, size, mtime):
+        return 0
+    offset = state.get('offset', 0)
+    return offset if 0 < offset < size else 0
+
+
+def _save_state(state_path, remote_path, size, mtime, offset):
+    with open(state_path, 'w') as f:
+        json.dump({'remote_path': remote_path, 'size': size, 'mtime': mtime, 'offset': offset}, f)
+
+
+def _upload_chunk(resources_api, api_key, access_token, remote_path, size, offset, data, allow_overwrite):
+    # The generated ResourcesApi.upload_file only accepts a path and reads the entire file into memory,
+    # so we build the same request ourselves with just this chunk's bytes as the multipart file part.
+    query_params = [('path', remote_path), ('fileSize', size), ('resume', True)]
+    if allow_overwrite is not None:
+        query_params.append(('allowOverwrite', allow_overwrite))
+    header_params = {
+        'ev-api-key': api_key,
+        'ev-access-token': access_token,
+        'offsetBytes': str(offset),
+        'Accept': 'application/json',
+        'Content-Type': 'multipart/form-data',
+    }
+    filename = posixpath.basename(remote_path)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    return resources_api.api_client.call_api(
+        '/resources/upload', 'POST', {}, query_params, header_params,
+        post_params=[('file', (filename, data, mimetype))], files={},
+        response_type='ResourceResponse', auth_settings=[], _return_http_data_only=True)
+
+
+def upload_chunked(resources_api, api_key, access_token, local_path, remote_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                   retries=3, backoff=1.0, allow_overwrite=None, state_path=None):
+    """Upload local_path in chunk_size pieces using the API's resume/offsetBytes parameters.
+
+    The file is memory-mapped and only one chunk is copied into memory at a time. After every confirmed
+    chunk the offset is saved to a sidecar state file (local_path + STATE_SUFFIX unless state_path is
+    given), so running the same upload again after an interruption continues from the last confirmed
+    byte. Each chunk is retried on its own. Returns (ResourceResponse, total attempts).
+    """
+    if state_path is None:
+        state_path = local_path + STATE_SUFFIX
+    stat = os.stat(local_path)
+    size = stat.st_size
+    offset = _load_state(state_path, remote_path, size, stat.st_mtime)
+
+    resource = None
+    attempts = 0
+    with open(local_path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            while True:
+                data = mapped[offset:offset + chunk_size]
+                resource, tries = call_with_retries(
+                    lambda: _upload_chunk(resources_api, api_key, access_token, remote_path, size, offset, data,
+                                          allow_overwrite),
+                    retries=retries, backoff=backoff)
+                attempts += tries
+                offset += len(data)
+                if offset >= size:
+                    break
+                _save_state(state_path, remote_path, size, stat.st_mtime, offset)
+        finally:
+            mapped.close()
+
+    if os.path.exists(state_path):
+        os.remove(state_path)
+    return resource, attempts
+
+
+def upload_resumable(resources_api, api_key, access_token, local_path, remote_path, chunk_size=DEFAULT_CHUNK_SIZE,
+                     retries=0, backoff=1.0, allow_overwrite=None):
+    """Upload local_path, switching to upload_chunked when it is bigger than chunk_size.
+
+    Returns (ResourceResponse, attempts) and raises if the upload ultimately fails.
+    """
+    size = os.path.getsize(local_path)
+    if chunk_size and size > chunk_size:
+        return upload_chunked(resources_api, api_key, access_token, local_path, remote_path, chunk_size,
+                              retries=retries, backoff=backoff, allow_overwrite=allow_overwrite)
+
+    kwargs = {'file': local_path}
+    if allow_overwrite is not None:
+        kwargs['allow_overwrite'] = allow_overwrite
+    return call_with_retries(
+        lambda: resources_api.upload_file(api_key, access_token, remote_path, size, **kwargs),
+        retries=retries, backoff=backoff)
+
+
+def upload_one(resources_api, api_key, access_token, local_path, remote_path, retries=3, backoff=1.0,
+               chunk_size=DEFAULT_CHUNK_SIZE):
+    """Upload a single file, retrying transient failures. Never raises; check UploadResult.error."""
+    result = UploadResult(local_path, remote_path, os.path.getsize(local_path))
+    started = time.time()
+    try:
+        result.resource, result.attempts = upload_resumable(
+            resources_api, api_key, access_token, local_path, remote_path, chunk_size,
+            retries=retries, backoff=backoff, allow_overwrite=True)
+    except Exception as e:
+        result.error = e
+    result.seconds = time.time() - started
+    return result
+
+
+def upload_many(resources_api, api_key, access_token, jobs, workers=8, retries=3, backoff=1.0,
+                chunk_size=DEFAULT_CHUNK_SIZE):
+    """Upload (local_path, remote_path) jobs concurrently, yielding an UploadResult as each one finishes.
+
+    All workers share resources_api and therefore its ApiClient and connection pool, so make sure the
+    pool holds at least `workers` connections, e.g. ApiSession(host, pool_size=workers).api(ResourcesApi).
+    """
+    def work(job):
+        return upload_one(resources_api, api_key, access_token, job[0], job[1], retries, backoff, chunk_size)
+
+    for _, result, _ in imap_unordered(work, jobs, workers=workers):
+        yield result
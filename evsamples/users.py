@@ -0,0 +1,102 @@
+import time
+
+from exavault.models.add_user_request_body import AddUserRequestBody
+from exavault.models.users_permissions import UsersPermissions
+
+from evsamples.pool import imap_unordered
+from evsamples.records import parse_bool
+from evsamples.records import split_list
+from evsamples.retry import call_with_retries
+from evsamples.retry import is_unsent_error
+
+# Fields a record must provide (or take from the defaults) to create a user
+REQUIRED_FIELDS = ('username', 'email', 'password', 'home_resource')
+
+# Every flag on a UsersPermissions object, in the order the API documents them
+PERMISSION_NAMES = (
+    'download', 'upload', 'modify', 'delete', 'list', 'change_password',
+    'share', 'notification', 'view_form_data', 'delete_form_data',
+)
+
+
+class PermissionProfiles(object):
+    """Hands out one shared UsersPermissions object per distinct set of permission names."""
+
+    def __init__(self):
+        self._profiles = {}
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def get(self, names):
+        key = frozenset(name.lower() for name in names)
+        unknown = key.difference(PERMISSION_NAMES)
+        if unknown:
+            raise ValueError("Unknown permission(s): {}".format(', '.join(sorted(unknown))))
+        profile = self._profiles.get(key)
+        if profile is None:
+            profile = UsersPermissions(**{name: name in key for name in PERMISSION_NAMES})
+            self._profiles[key] = profile
+        return profile
+
+
+def build_add_user_body(spec, profiles, defaults=None):
+    """Build an AddUserRequestBody from a spec record (see read_records), filling gaps from defaults.
+
+    permissions may be a list or a space/comma/pipe separated string of PERMISSION_NAMES.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Expected an object with the user's fields, not {}".format(type(spec).__name__))
+    values = dict(defaults or {})
+    values.update((key, value) for key, value in spec.items() if value not in (None, ''))
+    missing = [field for field in REQUIRED_FIELDS if not values.get(field)]
+    if missing:
+        raise ValueError("Missing required field(s): {}".format(', '.join(missing)))
+
+    return AddUserRequestBody(
+        username=values['username'],
+        home_resource=values['home_resource'],
+        email=values['email'],
+        password=values['password'],
+        role=values.get('role', 'user'),
+        permissions=profiles.get(split_list(values.get('permissions'))),
+        time_zone=values.get('time_zone', 'UTC'),
+        nickname=values.get('nickname'),
+        expiration=values.get('expiration'),
+        welcome_email=parse_bool(values.get('welcome_email')),
+    )
+
+
+class AddUserResult(object):
+    """Outcome of creating one user."""
+
+    def __init__(self, username):
+        self.username = username
+        self.user_id = None
+        self.attempts = 0
+        self.seconds = 0.0
+        self.error = None
+
+
+def add_users(users_api, api_key, access_token, bodies, workers=4, retries=5, backoff=2.0):
+    """Submit AddUserRequestBody objects concurrently, yielding an AddUserResult as each call finishes.
+
+    Calls that were throttled (429), turned away (503) or couldn't connect are retried with backoff, honouring
+    Retry-After, so keep `workers` modest: more workers than the account's rate limit allows just means more
+    retries. Other failures aren't retried, since the user may have been created before the error.
+    """
+    def work(body):
+        result = AddUserResult(body.username)
+        started = time.time()
+        try:
+            response, result.attempts = call_with_retries(
+                lambda: users_api.add_user(api_key, access_token, body=body), retries=retries, backoff=backoff,
+                retry_if=is_unsent_error)
+            result.user_id = response.data.id
+        except Exception as e:
+            result.error = e
+        result.seconds = time.time() - started
+        return result
+
+    for _, result, _ in imap_unordered(work, bodies, workers=workers):
+        yield result
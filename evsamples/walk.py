@@ -0,0 +1,52 @@
+import collections
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from evsamples.paging import DEFAULT_PAGE_SIZE
+from evsamples.paging import iter_resources
+
+
+def list_folder(resources_api, api_key, access_token, path, page_size=DEFAULT_PAGE_SIZE):
+    """Return (folders, files) for every Resource directly inside path, following pagination."""
+    folders = []
+    files = []
+    for resource in iter_resources(resources_api, api_key, access_token, path, page_size=page_size):
+        if resource.attributes.type == 'dir':
+            folders.append(resource)
+        else:
+            files.append(resource)
+    return folders, files
+
+
+def walk_resources(resources_api, api_key, access_token, top, workers=8, max_depth=None,
+                   page_size=DEFAULT_PAGE_SIZE):
+    """Walk the folder tree below top, like os.walk, yielding (path, folders, files) for each folder.
+
+    folders and files are lists of Resource objects. Up to `workers` folders are listed at the same time, so
+    a whole level of sibling folders is fetched in parallel and a tree takes roughly depth x round trips to
+    walk rather than folder count x round trips. Folders are yielded as soon as they have been listed, which
+    means the order is not fixed, but a folder is always yielded before any folder inside it.
+
+    As with os.walk, removing entries from `folders` before asking for the next tuple stops the walk from
+    descending into them. max_depth limits how far below top the walk goes (0 lists only top itself).
+    """
+    waiting = collections.deque([(top, 0)])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while waiting or running:
+            # Keep every worker busy while there are folders left to list
+            while waiting and len(running) < workers:
+                path, depth = waiting.popleft()
+                future = pool.submit(list_folder, resources_api, api_key, access_token, path, page_size)
+                running[future] = (path, depth)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, depth = running.pop(future)
+                folders, files = future.result()
+
+                yield path, folders, files
+
+                if max_depth is None or depth < max_depth:
+                    waiting.extend((folder.attributes.path, depth + 1) for folder in folders)
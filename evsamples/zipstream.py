@@ -0,0 +1,232 @@
+import os
+import queue
+import threading
+import zipfile
+import zlib
+
+from evsamples.retry import call_with_retries
+from evsamples.upload import _upload_chunk
+
+# Bytes read from each local file at a time while it is being zipped
+READ_SIZE = 1024 * 1024
+
+# Pieces of about READ_SIZE bytes iter_zip lets its writing thread get ahead by
+QUEUE_CHUNKS = 4
+
+# Archive bytes sent per upload request
+UPLOAD_CHUNK_SIZE = 16 * 1024 * 1024
+
+# Extensions of files that are already compressed: deflating them again costs CPU time and saves next to nothing
+COMPRESSED_EXTENSIONS = frozenset([
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.mp3', '.mp4', '.m4a', '.mov', '.avi', '.mkv',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.7z', '.rar', '.docx', '.xlsx', '.pptx', '.pdf',
+])
+
+# Values accepted for iter_zip's compression argument
+COMPRESSION_MODES = ('auto', 'deflate', 'store')
+
+# Put on iter_zip's queue after the last of the archive
+_DONE = object()
+
+
+class _Cancelled(Exception):
+    """Raised in the thread writing an archive when the reader of iter_zip has gone away."""
+
+
+class _QueueSink(object):
+    """A write-only, unseekable file object that hands what zipfile writes to it on to a queue, READ_SIZE bytes at
+    a time. The queue is bounded, so the thread writing the archive can't get far ahead of the one reading it."""
+
+    def __init__(self, chunks, cancelled):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.discard = False
+        self._pending = bytearray()
+
+    def write(self, data):
+        if not self.discard:
+            self._pending += data
+            if len(self._pending) >= READ_SIZE:
+                self.flush()
+        return len(data)
+
+    def flush(self):
+        if self._pending and not self.discard:
+            self.put(bytes(self._pending))
+            self._pending = bytearray()
+
+    def put(self, item):
+        while True:
+            if self.cancelled.is_set():
+                raise _Cancelled()
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+def _compress_type(local_path, compression):
+    if compression == 'store':
+        return zipfile.ZIP_STORED
+    if compression == 'auto' and os.path.splitext(local_path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def iter_zip(entries, compression='auto', level=None):
+    """Zip (local_path, name_in_archive) entries on the fly, yielding the archive's bytes as they are produced.
+
+    compression is 'deflate', 'store', or 'auto' to store files that are already compressed (see
+    COMPRESSED_EXTENSIONS) and deflate the rest. level is the zlib level, 1 (fastest) to 9 (smallest), or None
+    for zlib's default. Nothing is written to disk: the archive is written by ZipFile.write in a background
+    thread, and at most QUEUE_CHUNKS pieces of about READ_SIZE bytes are waiting to be read at a time. Each file's
+    CRC and sizes are written after its data, so the output never has to be seeked back into.
+    """
+    chunks = queue.Queue(QUEUE_CHUNKS)
+    cancelled = threading.Event()
+    sink = _QueueSink(chunks, cancelled)
+
+    def write_archive():
+        try:
+            archive = zipfile.ZipFile(sink, 'w', allowZip64=True)
+            try:
+                for local_path, name in entries:
+                    archive.write(local_path, name, compress_type=_compress_type(local_path, compression),
+                                  compresslevel=level)
+            except BaseException:
+                # Don't send the end of an archive that is missing files
+                sink.discard = True
+                raise
+            finally:
+                archive.close()
+            sink.flush()
+            sink.put(_DONE)
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            try:
+                sink.put(e)
+            except _Cancelled:
+                pass
+
+    writer = threading.Thread(target=write_archive)
+    writer.daemon = True
+    writer.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        cancelled.set()
+        writer.join()
+
+
+def _encoded_name(name):
+    # The name as ZipInfo stores it: ASCII if it can be, otherwise UTF-8 with the language encoding flag set
+    try:
+        return name.encode('ascii')
+    except UnicodeEncodeError:
+        return name.encode('utf-8')
+
+
+def _deflated_size(local_path, level):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    size = 0
+    with open(local_path, 'rb') as source:
+        while True:
+            data = source.read(READ_SIZE)
+            if not data:
+                break
+            size += len(compressor.compress(data))
+    return size + len(compressor.flush())
+
+
+def zip_size(entries, compression='auto', level=None):
+    """Return the exact size of the archive iter_zip would produce, without building it.
+
+    Everything but the file data is worked out from the entries' names and sizes, the way zipfile lays out its
+    headers, data descriptors and central directory. A stored file's data is its size, so it isn't read at all. A
+    deflated file's compressed size can't be known without compressing it, so each of those is run through zlib,
+    at the same level, and only the length of the output is kept.
+    """
+    offset = 0
+    directory_size = 0
+    count = 0
+    for local_path, name in entries:
+        info = zipfile.ZipInfo.from_file(local_path, name)
+        encoded_name = _encoded_name(info.filename)
+        file_size = info.file_size
+        if _compress_type(local_path, compression) == zipfile.ZIP_STORED:
+            compress_size = file_size
+        else:
+            compress_size = _deflated_size(local_path, level)
+
+        # Local header, with a ZIP64 extra field (20 bytes) if zipfile expects the file might need it
+        zip64 = file_size * 1.05 > zipfile.ZIP64_LIMIT
+        header_offset = offset
+        offset += zipfile.sizeFileHeader + len(encoded_name) + (20 if zip64 else 0)
+        # The data, then its CRC and sizes as a data descriptor
+        offset += compress_size + (24 if zip64 else 16)
+
+        # Central directory entry, with an 8 byte ZIP64 field for each value too large for its 4 byte one
+        large_values = 0
+        if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+            large_values += 2
+        if header_offset > zipfile.ZIP64_LIMIT:
+            large_values += 1
+        directory_size += zipfile.sizeCentralDir + len(encoded_name)
+        if large_values:
+            directory_size += 4 + 8 * large_values
+        count += 1
+
+    size = offset + directory_size + zipfile.sizeEndCentDir
+    if (count > zipfile.ZIP_FILECOUNT_LIMIT or offset > zipfile.ZIP64_LIMIT or
+            directory_size > zipfile.ZIP64_LIMIT):
+        size += zipfile.sizeEndCentDir64 + zipfile.sizeEndCentDir64Locator
+    return size
+
+
+def upload_zip(resources_api, api_key, access_token, entries, remote_path, compression='auto', level=None,
+               chunk_size=UPLOAD_CHUNK_SIZE, retries=3, backoff=1.0, allow_overwrite=None):
+    """Zip local files on the fly and upload the archive to remote_path, without a temporary file.
+
+    The upload API needs the total size before the first byte is sent, so it is worked out first with zip_size,
+    which reads only the files that will be deflated. The archive is then built once and sent chunk_size bytes per
+    request using the API's resume/offsetBytes parameters. Each request is retried on its own. Returns
+    (ResourceResponse, archive size, total attempts).
+    """
+    size = zip_size(entries, compression, level)
+    resource = None
+    attempts = 0
+    offset = 0
+    pending = bytearray()
+
+    def send(data):
+        return call_with_retries(
+            lambda: _upload_chunk(resources_api, api_key, access_token, remote_path, size, offset, data,
+                                  allow_overwrite),
+            retries=retries, backoff=backoff)
+
+    archive = iter_zip(entries, compression, level)
+    try:
+        for data in archive:
+            pending += data
+            while len(pending) >= chunk_size and offset + chunk_size < size:
+                resource, tries = send(bytes(pending[:chunk_size]))
+                attempts += tries
+                offset += chunk_size
+                del pending[:chunk_size]
+    finally:
+        # Stops the thread building the archive if a chunk couldn't be sent
+        archive.close()
+
+    if offset + len(pending) != size:
+        raise ValueError('The files changed while {} was being uploaded: expected {} bytes, got {}'.format(
+            remote_path, size, offset + len(pending)))
+    resource, tries = send(bytes(pending))
+    return resource, size, attempts + tries
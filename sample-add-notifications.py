@@ -1,6 +1,8 @@
+import argparse
 import datetime
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import ResourcesApi
@@ -8,9 +10,21 @@ from exavault import NotificationsApi
 from exavault.models.add_folder_request_body import AddFolderRequestBody
 from exavault.models.add_notification_request_body import AddNotificationRequestBody
 
+from evsamples.provision import ProvisionPlan
+from evsamples.provision import load_spec
+from evsamples.provision import provision
+from evsamples.session import ApiSession
+
 ##
 # sample_get_notification.py
 # Use the NotificationsApi to create a Notification on a folder
+#
+# With --spec, a whole layout of folders and notifications is created from a JSON or YAML file instead (YAML
+# needs `pip install pyyaml`; see evsamples/provision.py for the format). Shared parent folders are created
+# once, a level at a time, and then every other folder and notification is created --workers at a time.
+# Folders and notifications that are already there are left alone, so the same spec can be applied again:
+#
+#   python sample-add-notifications.py --spec dropzones.yaml --workers 32
 ##
 
 # To use this script, add your credentials to a file named .env which is located in the same directory as the script
@@ -35,7 +49,51 @@ ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Create folders with upload and download notifications')
+    parser.add_argument('--spec', help='create the folders and notifications described in this .json or .yaml file')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='with --spec, API calls to make at the same time (default: 16)')
+    return parser.parse_args()
+
+
+def provision_spec(args):
+    try:
+        plan = ProvisionPlan(load_spec(args.spec))
+    except (IOError, ImportError, KeyError, ValueError) as e:
+        print('Could not read {}: {}'.format(args.spec, e))
+        sys.exit(1)
+
+    # Both APIs come from one session sized for --workers, so every worker thread reuses a pooled connection
+    session = ApiSession(ACCOUNT_URL, pool_size=args.workers)
+    print("Creating {} folders ({} parent levels) and {} notifications".format(
+        plan.folder_count, len(plan.parent_levels), plan.notification_count))
+
+    counts = {'created': 0, 'existed': 0, 'failed': 0}
+    started = time.time()
+    for result in provision(session.api(ResourcesApi), session.api(NotificationsApi), API_KEY, ACCESS_TOKEN, plan,
+                            workers=args.workers):
+        what = result.path if result.kind == 'folder' else '{} notification on {}'.format(result.action, result.path)
+        if result.error is not None:
+            counts['failed'] += 1
+            print("FAILED {}: {}".format(what, result.error))
+        elif result.existed:
+            counts['existed'] += 1
+        else:
+            counts['created'] += 1
+
+    print("Created {created}, already there {existed}, failed {failed}".format(**counts) +
+          " in {:.2f}s".format(time.time() - started))
+    if counts['failed']:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.spec:
+        provision_spec(args)
+        sys.exit(0)
+
     # We are demonstrating the use of the NotificationsApi, which can be used to manage notification settings
     # for files and folders.
     #
@@ -43,11 +101,12 @@ if __name__ == "__main__":
     # an existing file or folder that you want to create a notification for, you won't need the step where
     # we use the ResourcesApi to create the folders first.
     #
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api. We have to override this setting for each of the API classes we use.
+    # ApiSession creates a single ApiClient configured with the host URL for our account. Every API class we ask it
+    # for is bound to that one client, so the ResourcesApi and NotificationsApi below share the same pool of HTTP
+    # connections instead of each opening their own.
 
-    resources_api = ResourcesApi()
-    resources_api.api_client.configuration.host = ACCOUNT_URL
+    session = ApiSession(ACCOUNT_URL)
+    resources_api = session.api(ResourcesApi)
 
     try:
         # We will create a new folder tree for the demo. The top-level folder will
@@ -87,11 +146,9 @@ if __name__ == "__main__":
 
     # If we got this far without the program ending, we were able to set up our folders to create 
     # notifications, and now we can use the NotificationsApi to create those.
-    # We have to override the default configuration of the API object with an updated host URL so that 
-    # our code will reach the correct URL for the api.
+    # It comes from the same session, so it reuses the connection the folders were just created over.
 
-    notifications_api = NotificationsApi()
-    notifications_api.api_client.configuration.host = ACCOUNT_URL
+    notifications_api = session.api(NotificationsApi)
 
     try:
         # API methods that take a JSON body, such as the add_folder method, require us to submit an object with the
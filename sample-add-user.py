@@ -1,14 +1,38 @@
+import argparse
+import csv
 import datetime
+import io
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import UsersApi
 from exavault.models.add_user_request_body import AddUserRequestBody
 from exavault.models.users_permissions import UsersPermissions
 
+from evsamples.records import read_records
+from evsamples.retry import error_summary
+from evsamples.session import ApiSession
+from evsamples.throttle import AimdController
+from evsamples.throttle import Throttle
+from evsamples.throttle import TokenBucket
+from evsamples.users import PermissionProfiles
+from evsamples.users import add_users
+from evsamples.users import build_add_user_body
+
 ##
 # sample_add_user.py - Use the UsersApi to create a new user with a home directory
+#
+# Run with --from-file to create many users at once from a .csv, .jsonl or .json file. Each record needs
+# username, email and password, and may also set home_resource, role, permissions, time_zone, nickname,
+# expiration and welcome_email. permissions is a list of permission names, e.g. "download upload list".
+# Results are written to a CSV report (files/add_users_report.csv unless you pass --report):
+#
+#   python sample-add-user.py --from-file new_users.csv --workers 8
+#
+# Add --rate to stay under a number of requests per second, and --adaptive to let the number of users created at
+# once rise and fall (up to --workers) with how quickly the server is answering and whether it is throttling us.
 ##
 
 
@@ -35,14 +59,95 @@ API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
+# Values used for any field a record in --from-file leaves out
+BULK_DEFAULTS = {
+    'home_resource': '/Home directory for api users',
+    'role': 'user',
+    'permissions': 'download upload modify delete list change_password share notification',
+    'time_zone': 'UTC',
+    'welcome_email': False,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Add users to your ExaVault account')
+    parser.add_argument('--from-file', help='create every user listed in this .csv, .jsonl or .json file')
+    parser.add_argument('--report', default=os.path.join(os.path.dirname(__file__), "files/add_users_report.csv"),
+                        help='where to write the CSV report of created users and failures')
+    parser.add_argument('--workers', type=int, default=4, help='number of users to create at once (default: 4)')
+    parser.add_argument('--retries', type=int, default=5,
+                        help="times to retry a user that was throttled, turned away or couldn't connect (default: 5)")
+    parser.add_argument('--rate', type=float, help='most requests to send per second (default: no limit)')
+    parser.add_argument('--adaptive', action='store_true',
+                        help='adjust how many users are created at once, up to --workers, to avoid throttling')
+    return parser.parse_args()
+
+
+def add_users_from_file(args):
+    # Every worker thread shares one ApiClient, with room in its connection pool for each of them.
+    # A Throttle on the session makes every request from every worker wait for a token from the shared rate
+    # limit (--rate), and/or for a free slot under the AIMD controller's concurrency limit (--adaptive). The
+    # controller starts low, adds a slot as calls keep succeeding, and halves when the server answers 429 or slows.
+    throttle = None
+    if args.rate or args.adaptive:
+        throttle = Throttle(bucket=TokenBucket(args.rate) if args.rate else None,
+                            controller=AimdController(max_limit=args.workers) if args.adaptive else None)
+    users_api = ApiSession(ACCOUNT_URL, pool_size=args.workers, throttle=throttle).api(UsersApi)
+
+    # Users with the same permissions share a single UsersPermissions object rather than each building their own
+    profiles = PermissionProfiles()
+    created = 0
+    failed = 0
+    invalid = []
+    started = time.time()
+
+    with io.open(args.report, 'w', newline='', encoding='utf-8') as report_file:
+        report = csv.writer(report_file)
+        report.writerow(['Username', 'Status', 'Id', 'Error'])
+
+        def request_bodies():
+            # Records that can't be turned into a request (missing username, unknown permission, ...) go straight
+            # into the report instead of stopping the whole import
+            for number, spec in enumerate(read_records(args.from_file), 1):
+                try:
+                    yield build_add_user_body(spec, profiles, BULK_DEFAULTS)
+                except ValueError as e:
+                    invalid.append(number)
+                    username = spec.get('username') if isinstance(spec, dict) else None
+                    report.writerow([username or 'record #{}'.format(number), 'invalid', '', str(e)])
+
+        for result in add_users(users_api, API_KEY, ACCESS_TOKEN, request_bodies(),
+                                workers=args.workers, retries=args.retries):
+            if result.error is not None:
+                failed += 1
+                report.writerow([result.username, 'failed', '', error_summary(result.error)])
+                print("FAILED {}: {}".format(result.username, error_summary(result.error)))
+            else:
+                created += 1
+                report.writerow([result.username, 'created', result.user_id, ''])
+
+    elapsed = time.time() - started
+    print("Created {} users ({} failed, {} invalid) in {:.1f}s using {} permission profiles: {:.1f} users/s".format(
+        created, failed, len(invalid), elapsed, len(profiles), created / elapsed if elapsed else 0))
+    if throttle is not None and throttle.controller is not None:
+        print("Adaptive concurrency ended at {:.1f} (reduced {} times)".format(
+            throttle.controller.limit, throttle.controller.decreases))
+    print("Report written to {}".format(os.path.abspath(args.report)))
+    if failed or invalid:
+        sys.exit(1)
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.from_file:
+        add_users_from_file(args)
+        sys.exit(0)
+
     # We are demonstrating the use of the UsersApi, which is used to create, update and remove users in your account.
     #
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api.
-    users_api = UsersApi()
-    users_api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    users_api = ApiSession(ACCOUNT_URL).api(UsersApi)
 
     try:
         # API methods that take a JSON body, such as the add_user method, require us to submit an object with the
@@ -1,13 +1,35 @@
+import argparse
 import datetime
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import ResourcesApi
 from exavault.models.compress_files_request_body import CompressFilesRequestBody
 
+from evsamples.compress import upload_and_compress
+from evsamples.session import ApiSession
+from evsamples.upload import iter_local_files
+from evsamples.upload import upload_resumable
+from evsamples.zipstream import COMPRESSION_MODES
+from evsamples.zipstream import upload_zip
+
 ##
 # sample_compress_files.py - Use the Resources API to compress files
+#
+# By default the sample files are uploaded one after another, and compressed once they are all there. Use
+# --pipeline to upload --workers files at once instead, and --directory to package the files of a local folder
+# rather than copies of the sample file. With --batch-size, an archive is requested for every batch of that many
+# files as soon as they have been uploaded, while the rest are still uploading:
+#
+#   python sample-compress-files.py --pipeline --directory ./delivery --workers 16 --batch-size 500
+#
+# Use --local-zip to build the zip file here instead: the files are zipped on the fly, with nothing written to
+# disk, and only the archive is uploaded, so there is no upload per file and no wait for the server to compress.
+# --compression store skips compressing files (JPEGs, for example, hardly shrink) and --level trades speed for size:
+#
+#   python sample-compress-files.py --local-zip --directory ./delivery --compression auto --level 1
 ##
 
 
@@ -34,18 +56,94 @@ API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Upload files and compress them into a zip archive')
+    parser.add_argument('--copies', type=int, default=6, help='copies of the sample file to upload (default: 6)')
+    parser.add_argument('--pipeline', action='store_true',
+                        help='upload files concurrently and compress each batch as soon as it is uploaded')
+    parser.add_argument('--local-zip', action='store_true',
+                        help='zip the files locally while uploading the archive, instead of compressing on the server')
+    parser.add_argument('--directory',
+                        help='with --pipeline or --local-zip, upload and compress the files in this local folder')
+    parser.add_argument('--workers', type=int, default=8, help='with --pipeline, files uploaded at once (default: 8)')
+    parser.add_argument('--batch-size', type=int,
+                        help='with --pipeline, files per archive (default: everything in one archive)')
+    parser.add_argument('--compression', choices=COMPRESSION_MODES, default='auto',
+                        help='with --local-zip, "store" files as they are, "deflate" them, or "auto" to store files '
+                             'that are already compressed (.jpg, .zip, ...) and deflate the rest (default: auto)')
+    parser.add_argument('--level', type=int, choices=range(1, 10), metavar='1-9',
+                        help='with --local-zip, deflate level from 1 (fastest) to 9 (smallest)')
+    return parser.parse_args()
+
+
+def pipeline(args, parent_folder, filename):
+    # All of the upload threads, and the thread that asks for archives, share one pooled ApiClient
+    resources_api = ApiSession(ACCOUNT_URL, pool_size=args.workers + 1).api(ResourcesApi)
+
+    if args.directory:
+        jobs = list(iter_local_files(args.directory, "/{}".format(parent_folder)))
+    else:
+        jobs = [(filename, "/{}/dog{}.jpg".format(parent_folder, i)) for i in range(args.copies)]
+
+    # upload_and_compress runs the uploads on --workers threads and collects the "id:" reference of each file as
+    # its upload finishes. Each time --batch-size files are in (or, without it, once all of them are), it hands a
+    # compressFiles call to a separate thread, so later files keep uploading while the archive is being built.
+    try:
+        archives, failed, timings = upload_and_compress(
+            resources_api, API_KEY, ACCESS_TOKEN, jobs, parent_resource="/{}".format(parent_folder),
+            archive_name='zipped_files.zip', batch_size=args.batch_size, workers=args.workers)
+    except Exception as e:
+        print('Exception when uploading and compressing files:', str(e))
+        sys.exit(4)
+
+    for result in failed:
+        print("FAILED {}: {}".format(result.remote_path, result.error))
+    for archive in archives:
+        print("Created archive at {}".format(archive.data.attributes.path))
+    print("Uploaded {} of {} files to {}: {}".format(
+        len(jobs) - len(failed), len(jobs), parent_folder, timings.summary()))
+    if failed:
+        sys.exit(1)
+
+
+def local_zip(args, parent_folder, filename):
+    resources_api = ApiSession(ACCOUNT_URL).api(ResourcesApi)
+
+    # Each entry is a local file and the name it will have inside the archive
+    if args.directory:
+        entries = [(local_path, remote_path.lstrip('/'))
+                   for local_path, remote_path in iter_local_files(args.directory, '')]
+    else:
+        entries = [(filename, "dog{}.jpg".format(i)) for i in range(args.copies)]
+    target_filename = "/{}/zipped_files.zip".format(parent_folder)
+
+    # upload_zip builds the archive as it uploads it, a chunk at a time, so it never exists in full on disk or in
+    # memory. The uploadFile method needs the archive's size up front, so the files that will be deflated are read
+    # twice: once to measure their compressed size, once to send them. Stored files are only read once.
+    started = time.time()
+    try:
+        result, size, attempts = upload_zip(resources_api, API_KEY, ACCESS_TOKEN, entries, target_filename,
+                                            compression=args.compression, level=args.level)
+    except Exception as e:
+        print('Exception when uploading the zip file:', str(e))
+        sys.exit(4)
+
+    print("Created archive at {} with {} files, {} bytes in {} upload request(s), in {:.2f}s".format(
+        result.data.attributes.path, len(entries), size, attempts, time.time() - started))
+
+
 if __name__ == "__main__":
+    args = parse_args()
 
     # We are demonstrating the use of the ResourcesApi, which is used for file operations (upload, download, delete, etc)
     #
     # For this demo, we'll create a new folder and upload some files into it. Then we'll compress some of the files into
     # a new zip file in the folder
 
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api. We have to override this setting
-    # for each of the API classes we use
-    resources_api = ResourcesApi()
-    resources_api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    resources_api = ApiSession(ACCOUNT_URL).api(ResourcesApi)
 
     # We will create a new folder tree for the demo. The top-level folder will
     # have a different name each time you run this script
@@ -55,13 +153,19 @@ if __name__ == "__main__":
     # It will have a different name in the account each time it is uploaded
     filename = os.path.join(os.path.dirname(__file__), "files/dog.jpg")
 
-    target_size = os.path.getsize(filename)
+    if args.pipeline:
+        pipeline(args, parent_folder, filename)
+        sys.exit(0)
+    if args.local_zip:
+        local_zip(args, parent_folder, filename)
+        sys.exit(0)
 
     # We'll store the IDs, which we'll grab from the responses from new
     # resource uploads, that we want to compress
     compress_resources = []
+    started = time.time()
 
-    for i in range(6):
+    for i in range(args.copies):
         # We're  uploading the same file under different names to make sure we
         # have multiple files in our target folder
         target_filename = "/{}/dog{}.jpg".format(parent_folder, i)
@@ -70,8 +174,9 @@ if __name__ == "__main__":
             # The uploadFile method of the ResourcesApi class will let us upload a file to our account
             # See https://www.exavault.com/developer/api-docs/#operation/uploadFile for the details of this method
             #
-            result = resources_api.upload_file(
-                API_KEY, ACCESS_TOKEN, target_filename, target_size, file=filename)
+            # upload_resumable calls uploadFile for us, switching to a resumable, chunked upload for large files
+            # so that they are never read into memory all at once.
+            result, _ = upload_resumable(resources_api, API_KEY, ACCESS_TOKEN, filename, target_filename)
 
             # We want to make an archive that contains the files we've uploaded
             # The ResourcesApi.upload_file method returns a swagger_client.model.ResourceResponse object
@@ -82,9 +187,10 @@ if __name__ == "__main__":
             print('Exception setting up files:', str(e))
             sys.exit(1)
 
-    print("Uploaded starting files to {}".format(parent_folder))
+    upload_seconds = time.time() - started
+    print("Uploaded starting files to {} in {:.2f}s".format(parent_folder, upload_seconds))
 
-    # If we got this far, we have a folder that contains 5 jpg files
+    # If we got this far, we have a folder that contains the jpg files
     # Next we are going to use the same ResourcesApi to compress those files into a zip file
     # Compressing files doesn't remove the files from the account
 
@@ -101,10 +207,12 @@ if __name__ == "__main__":
             parent_resource='/',
             archive_name='zipped_files.zip',
         )
+        compress_started = time.time()
         result = resources_api.compress_files(API_KEY, ACCESS_TOKEN, body=request_body)
 
         # The ResourcesApi.compress_files method returns a swagger_client.model.ResourceResponse object
-        print("Created archive at {}".format(result.data.attributes.path))
+        print("Created archive at {} in {:.2f}s ({:.2f}s overall)".format(
+            result.data.attributes.path, time.time() - compress_started, time.time() - started))
 
     except Exception as e:
         print('Exception when compressing files:', str(e))
@@ -1,13 +1,38 @@
+import argparse
 import datetime
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import ResourcesApi
 
+from evsamples.download import choose_download_mode
+from evsamples.download import download_many
+from evsamples.download import download_to_file
+from evsamples.manifest import SyncManifest
+from evsamples.paging import iter_resources
+from evsamples.resilience import CallPolicy
+from evsamples.resilience import CircuitBreaker
+from evsamples.retry import error_summary
+from evsamples.session import ApiSession
+from evsamples.walk import walk_resources
+from evsamples.progress import RateReporter
+
 ##
 # sample_download_csv_files.py
 # Use the ResourcesApi to download all of the CSV files found within a folder tree
+#
+# When several files match, they are either zipped together by the server and downloaded as one file, or
+# downloaded individually in parallel into files/csv_mirror. By default the script picks whichever should be
+# quicker from the number and size of the files; use --mode zip or --mode parallel to choose yourself.
+#
+# With --sync, files/csv_mirror is kept up to date instead: a small sqlite index remembers what has been
+# downloaded, and only files that are new or have changed since the last run are downloaded again.
+#
+# Every API call goes through a CallPolicy: it has a timeout, listings and downloads that fail with a temporary
+# error (a 5xx, a 429 or a dropped connection) are tried again, and a circuit breaker pauses all the workers for
+# a while if the account fails several calls in a row, rather than the whole run stopping at the first error.
 ##
 
 
@@ -34,56 +59,197 @@ API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
-if __name__ == "__main__":
-    # We are demonstrating the use of the ResourcesApi, which can be used to
-    # manage files and folders in your account.
+MIRROR_ROOT = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "csv_mirror")
+MANIFEST_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "csv_mirror.sqlite")
+ERRORS_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "csv_errors.jsonl")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Download the CSV files in the "Sample Files and Folders" folder')
+    parser.add_argument('--mode', choices=['auto', 'zip', 'parallel'], default='auto',
+                        help='download matching files as one server-side zip, or each file separately in parallel '
+                             '(default: choose from the number and size of the files)')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='number of files to download, or folders to list, at once (default: 8)')
+    parser.add_argument('--recursive', action='store_true',
+                        help='also look for CSV files in every folder below "Sample Files and Folders"')
+    parser.add_argument('--max-depth', type=int,
+                        help='with --recursive, how many levels of subfolders to look in (default: all)')
+    parser.add_argument('--sync', action='store_true',
+                        help='only download files that are new or changed since the last --sync run '
+                             '(implies --mode parallel)')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='times to retry a call that fails with a temporary error (default: 3)')
+    parser.add_argument('--timeout', type=float, default=120,
+                        help='seconds to wait for the account to answer, or to send more of a download (default: 120)')
+    return parser.parse_args()
+
+
+def print_error_report(report):
+    # The policy's ErrorReport counted every call and retry, and kept the details of every call that still
+    # failed; those are saved as JSON lines so a long run can be followed up without scrolling back through it
+    print("API calls: {}".format(report.summary()))
+    if report.failures:
+        report.save(ERRORS_FILE)
+        print("Details of the failed calls are in {}".format(ERRORS_FILE))
+
+
+def list_csv_files(resources_api, recursive, max_depth, workers):
+    # The ResourcesApi.list_resources attribute returns a swagger_client.model.ResourceCollectionResponse object
+    # See https://www.exavault.com/developer/api-docs/#operation/listResources for the response schema
+    #
+    # Each call only returns one page of matches, so iter_resources keeps calling list_resources with an
+    # increasing offset until every match has been returned. The next page is requested in the background
+    # while we work through the current one.
+    #
+    # With --recursive we walk the whole folder tree instead. walk_resources works like Python's os.walk,
+    # handing us each folder's subfolders and files, and lists sibling folders in parallel so that a deep
+    # tree takes about one round trip per level rather than one per folder.
+    #
+    # Either way the files are handed over as they are listed rather than collected into one big list first.
+    if recursive:
+        for _, _, folder_files in walk_resources(resources_api, API_KEY, ACCESS_TOKEN, "/Sample Files and Folders",
+                                                 workers=workers, max_depth=max_depth):
+            for listed_file in folder_files:
+                if listed_file.attributes.name.lower().endswith('.csv'):
+                    yield listed_file
+    else:
+        for listed_file in iter_resources(resources_api, API_KEY, ACCESS_TOKEN, "/Sample Files and Folders",
+                                          type='file', name='*.csv'):
+            yield listed_file
+
 
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api. We have to override this setting for each of the API classes we use.
-    resources_api = ResourcesApi()
-    resources_api.api_client.configuration.host = ACCOUNT_URL
+def download_parallel(resources_api, listed_files, workers, manifest=None):
+    # Each file is written to the same path under files/csv_mirror as it has in the account.
+    # If we were given a SyncManifest, files that haven't changed since they were last downloaded are skipped.
+    #
+    # listed_files can come straight from list_csv_files: download_many only takes a few more jobs than it has
+    # workers at a time, so files are downloaded while the listing carries on, and only the files waiting for or
+    # being downloaded are held in memory.
+    listed_by_id = {}
+    counts = {'listed': 0, 'skipped': 0}
 
+    def jobs():
+        for listed_file in listed_files:
+            counts['listed'] += 1
+            local_path = os.path.join(MIRROR_ROOT, *listed_file.attributes.path.strip('/').split('/'))
+            if manifest is not None and manifest.is_current(listed_file, local_path):
+                counts['skipped'] += 1
+                continue
+            resource = "id:{}".format(listed_file.id)
+            listed_by_id[resource] = listed_file
+            yield resource, local_path
+
+    failures = 0
+    downloaded_bytes = 0
+    started = time.time()
     try:
-        # For this demo, we want to download all of the CSV files located within a certain folder.
-        # - Your account comes pre-loaded with a folder tree named "Sample Files and Folders" which contains
-        # a folder tree containing many samples. If you have renamed, deleted or moved this folder,
-        # this demo script will not work.
+        # The session's policy already retries calls that fail before the download starts, so download_many only
+        # needs to start a file again once, if its connection breaks part way through
+        for result in download_many(resources_api, API_KEY, ACCESS_TOKEN, jobs(), workers=workers, retries=1):
+            listed_file = listed_by_id.pop(result.resource)
+            if result.error is not None:
+                failures += 1
+                print("FAILED {}: {}".format(result.resource, result.error))
+                continue
+            downloaded_bytes += result.size
+            if manifest is not None:
+                manifest.record(listed_file, result.local_path)
+            print("Downloaded {} ({} bytes in {:.2f}s)".format(result.local_path, result.size, result.seconds))
+    except Exception as e:
+        # Listing the files failed part way through
+        print('Exception when calling Api:', error_summary(e))
+        print_error_report(resources_api.api_client.policy.report)
+        sys.exit(1)
+
+    if not counts['listed']:
+        print("Found no files to download")
+        return
+    if counts['skipped']:
+        print("Skipped {} files that are unchanged since the last download".format(counts['skipped']))
+    elapsed = time.time() - started
+    print("Downloaded {:.1f} MB in {:.1f}s ({:.1f} MB/s) to {}".format(
+        downloaded_bytes / (1024 ** 2), elapsed, downloaded_bytes / (1024 ** 2) / elapsed if elapsed else 0,
+        MIRROR_ROOT))
+    if failures:
+        print("{} files could not be downloaded".format(failures))
+        print_error_report(resources_api.api_client.policy.report)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    args = parse_args()
 
-        # First, we'll get a list of all the CSV files within the desired folder
+    # We are demonstrating the use of the ResourcesApi, which can be used to
+    # manage files and folders in your account.
 
-        list_result = resources_api.list_resources(
-            API_KEY, ACCESS_TOKEN, "/Sample Files and Folders", offset=0, type='file', name='*.csv')
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    #
+    # In parallel mode every download shares this one client, so we also make sure its connection pool has room
+    # for one connection per worker.
+    #
+    # The policy applies to every call the client makes. Listing and downloading only read from the account, so
+    # they are safe to retry. The breaker opens after 5 temporary failures in a row, and then holds every call
+    # back for 30 seconds before letting one through to see whether the account has recovered.
+    policy = CallPolicy(timeout=(10, args.timeout), retries=args.retries,
+                        breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+    resources_api = ApiSession(ACCOUNT_URL, pool_size=args.workers, policy=policy).api(ResourcesApi)
 
-        # The ResourcesApi.list_resources attribute returns a swagger_client.model.ResourceCollectionResponse object
-        # See https://www.exavault.com/developer/api-docs/#operation/listResources for the response schema
+    # For this demo, we want to download all of the CSV files located within a certain folder.
+    # - Your account comes pre-loaded with a folder tree named "Sample Files and Folders" which contains
+    # a folder tree containing many samples. If you have renamed, deleted or moved this folder,
+    # this demo script will not work.
+    #
+    # With --sync or --mode parallel, each file is downloaded as soon as it has been listed.
+    if args.sync:
+        with SyncManifest(MANIFEST_FILE) as manifest:
+            download_parallel(resources_api, list_csv_files(resources_api, args.recursive, args.max_depth,
+                                                            args.workers), args.workers, manifest)
+        sys.exit(0)
+    if args.mode == 'parallel':
+        download_parallel(resources_api, list_csv_files(resources_api, args.recursive, args.max_depth, args.workers),
+                          args.workers)
+        sys.exit(0)
 
-        # The ResourceCollectionResponse.returned_results attribute will indicate how many matching files are included
-        # in this response. If we didn't find any matches, there's nothing else to do
-        if list_result.returned_results == 0:
+    try:
+        # Otherwise we go through the listing once first. All we keep of each file is its ID, which is what a
+        # download needs, and we add up the sizes to decide how to download them.
+        downloads = []
+        total_size = 0
+        for listed_file in list_csv_files(resources_api, args.recursive, args.max_depth, args.workers):
+            downloads.append("id:{}".format(listed_file.id))
+            total_size += listed_file.attributes.size or 0
+            print(listed_file.attributes.path)
+
+        # If we didn't find any matches, there's nothing else to do
+        if not downloads:
             print("Found no files to download")
             sys.exit(0)
         else:
-            print("Found {} CSV files to download".format(list_result.returned_results))
+            print("Found {} CSV files to download".format(len(downloads)))
 
     except Exception as e:
-        raise e
-        print('Exception when calling Api:', str(e))
+        print('Exception when calling Api:', error_summary(e))
+        print_error_report(policy.report)
         sys.exit(1)
 
-    # If we got this far, there are files for us to download
-    # We are going to save the IDs of all the files we want to download into an array
-    downloads = []
-    listed_files = list_result.data
-    for listed_file in listed_files:
-        downloads.append("id:{}".format(listed_file.id))
-        print(listed_file.attributes.path)
+    # Asking the server for a zip of every file saves a request per file, but the server has to finish
+    # compressing all of them before the download can start. Downloading the files separately and in
+    # parallel is usually quicker unless there are a great many small files.
+    #
+    # For parallel downloads the folder is listed again, a page of files per call, rather than keeping every
+    # file's details from the first listing in memory.
+    mode = args.mode if args.mode != 'auto' else choose_download_mode(len(downloads), total_size)
+    if mode == 'parallel':
+        download_parallel(resources_api, list_csv_files(resources_api, args.recursive, args.max_depth, args.workers),
+                          args.workers)
+        sys.exit(0)
 
     try:
         # Now that we used the ResourcesApi to gather all of the IDs of the resources that
         # matched our search, we will use the ResourceApi.download method to download multiple files.
-
-        result = resources_api.download(API_KEY, ACCESS_TOKEN, downloads)
-
+        #
         # The body of the result is the binary content of our file(s),
         # We write that content into a single file, named with .zip if there were multiple files
         # downloaded or just named .csv if not (since we were storing CSVs)
@@ -93,11 +259,17 @@ if __name__ == "__main__":
             download_file = os.path.join(os.path.dirname(__file__),
                                          "files/download-{}.csv".format(datetime.datetime.today().strftime("%s")))
 
-        with open(download_file, 'wb') as f:
-            f.write(result)
+        # Rather than holding the whole download in memory and writing it out at the end, download_to_file
+        # asks the API client for the raw response (_preload_content=False) and copies it to disk a chunk at a
+        # time, so even a very large zip file only ever needs a small, fixed amount of memory.
+        reporter = RateReporter('Downloaded', unit='MB', scale=1024 ** 2)
+        downloaded_bytes = download_to_file(
+            resources_api, API_KEY, ACCESS_TOKEN, downloads, download_file, progress=reporter.update)
+        reporter.finish(downloaded_bytes)
 
         print("File(s) downloaded to", os.path.abspath(download_file))
 
     except Exception as e:
-        print('Exception when calling Api:', str(e))
+        print('Exception when calling Api:', error_summary(e))
+        print_error_report(policy.report)
         sys.exit(1)
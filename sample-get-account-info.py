@@ -1,14 +1,35 @@
-from __future__ import division
+import argparse
+import json
 import os
 import sys
+import time
 
 from exavault import AccountApi
 from dotenv import load_dotenv
 
+from evsamples.account import DEFAULT_TTL
+from evsamples.account import AccountInfoCache
+from evsamples.fleet import fetch_fleet
+from evsamples.fleet import read_fleet
+from evsamples.session import ApiSession
+
 
 ##
 # sample_get_account.py
 # Use the AccountApi to return your account info and check disk usage
+#
+# With --cache the account is kept in files/account_cache.json for --ttl seconds, so running the script again
+# within that time doesn't call the API at all. --watch, which turns on --cache, keeps printing the disk usage
+# every few seconds, the way a dashboard would, while the account is only fetched again once the cached copy is
+# older than --ttl:
+#
+#   python sample-get-account-info.py --cache --ttl 60 --watch 5
+#
+# --fleet reports on many accounts at once. It reads the credentials of every account from a .csv, .jsonl or
+# .json file with name, account_url, api_key and access_token fields (the .env file isn't used), asks all of
+# the accounts at the same time and prints one table, or a JSON report with --json:
+#
+#   python sample-get-account-info.py --fleet accounts.csv --workers 32 --json
 ##
 
 # To use this script, add your credentials to a file named .env which is located in the same directory as the script
@@ -31,22 +52,150 @@ load_dotenv()
 API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
+CACHE_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "account_cache.json")
+FLEET_CACHE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "fleet_cache")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Show your account\'s disk usage')
+    parser.add_argument('--cache', action='store_true',
+                        help='reuse the account info saved by an earlier run if it is recent enough')
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL,
+                        help='with --cache, seconds before the account info is fetched again (default: %(default)s)')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='print the disk usage every SECONDS seconds until interrupted; implies --cache')
+    parser.add_argument('--fleet', metavar='CREDENTIALS_FILE',
+                        help='report on every account listed in this .csv, .jsonl or .json file')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='with --fleet, accounts to ask at the same time (default: 16)')
+    parser.add_argument('--json', action='store_true', help='with --fleet, print a JSON report instead of a table')
+    args = parser.parse_args()
+    if args.watch is not None:
+        if args.watch <= 0:
+            parser.error('--watch needs a positive number of seconds')
+        if args.fleet:
+            parser.error("--watch can't be used with --fleet")
+        # Without the cache every refresh would call the API
+        args.cache = True
+    return args
+
+
+def print_usage(quota):
+    account_max_size = quota.disk_limit / (1024 ** 3)
+    account_current_size = quota.disk_used / (1024 ** 3)
+
+    print('Account used: {:.1f} GB ({:.1f}%)'.format(
+        account_current_size, account_current_size / account_max_size * 100))
+    print('Total size: {:.1f} GB'.format(account_max_size))
+
+
+def watch(cache, interval):
+    # Every refresh is answered from the cache. Once it is older than --ttl the cached account is still shown
+    # while a new one is fetched in the background, so a refresh never waits on the API.
+    try:
+        while True:
+            disk_used, disk_limit = cache.quota()
+            print('{}  used {:.1f} of {:.1f} GB  (cached {:.0f}s ago, {} API calls so far)'.format(
+                time.strftime('%H:%M:%S'), disk_used / (1024 ** 3), disk_limit / (1024 ** 3), cache.age(),
+                cache.fetches))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print('Stopped.')
+
+
+def fleet_report(args):
+    try:
+        accounts = read_fleet(args.fleet)
+    except (IOError, ValueError) as e:
+        print('Cannot read {}: {}'.format(args.fleet, e), file=sys.stderr)
+        sys.exit(1)
+    cache_dir = None
+    if args.cache:
+        cache_dir = FLEET_CACHE_DIR
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+
+    # fetch_fleet calls getAccount for up to --workers accounts at once, each through its own ApiSession,
+    # and hands back every account as soon as it has answered
+    started = time.time()
+    for _ in fetch_fleet(accounts, workers=args.workers, cache_dir=cache_dir, ttl=args.ttl):
+        pass
+    elapsed = time.time() - started
+
+    accounts.sort(key=lambda fleet_account: fleet_account.name.lower())
+    reported = [fleet_account for fleet_account in accounts if fleet_account.error is None]
+    total_used = sum(fleet_account.quota.disk_used for fleet_account in reported)
+    total_limit = sum(fleet_account.quota.disk_limit for fleet_account in reported)
+
+    if args.json:
+        print(json.dumps({
+            'accounts': [{
+                'name': fleet_account.name,
+                'account_url': fleet_account.account_url,
+                'account_name': fleet_account.account.data.attributes.account_name if fleet_account.account else None,
+                'disk_used': fleet_account.quota.disk_used if fleet_account.quota else None,
+                'disk_limit': fleet_account.quota.disk_limit if fleet_account.quota else None,
+                'user_count': fleet_account.account.data.attributes.user_count if fleet_account.account else None,
+                'master_email': fleet_account.master_email,
+                'error': fleet_account.error,
+            } for fleet_account in accounts],
+            'total_disk_used': total_used,
+            'total_disk_limit': total_limit,
+            'failed': len(accounts) - len(reported),
+            'seconds': round(elapsed, 3),
+        }, indent=2))
+    else:
+        print("{0: <24} {1: >10} {2: >10} {3: >7} {4: >6}  {5}".format(
+            'Account', 'Used GB', 'Limit GB', 'Used %', 'Users', 'Primary Email Address'))
+        print("=" * 90)
+        for fleet_account in accounts:
+            if fleet_account.error is not None:
+                print("{0: <24} FAILED: {1}".format(fleet_account.name, fleet_account.error))
+                continue
+            quota = fleet_account.quota
+            print("{0: <24} {1: >10.1f} {2: >10.1f} {3: >7.1f} {4: >6}  {5}".format(
+                fleet_account.name, quota.disk_used / (1024 ** 3), quota.disk_limit / (1024 ** 3),
+                quota.disk_used / quota.disk_limit * 100 if quota.disk_limit else 0,
+                fleet_account.account.data.attributes.user_count, fleet_account.master_email or ''))
+        print("=" * 90)
+        print("{0: <24} {1: >10.1f} {2: >10.1f} {3: >7.1f}".format(
+            'Total', total_used / (1024 ** 3), total_limit / (1024 ** 3),
+            total_used / total_limit * 100 if total_limit else 0))
+        print("{} accounts in {:.2f}s".format(len(accounts), elapsed))
+
+    if len(reported) < len(accounts):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.fleet:
+        fleet_report(args)
+        sys.exit(0)
+
     # We are demonstrating the use of the AccountAPI, which can be used to manage the account settings
-    # We have to override the default configuration of the AccountApi with an updated host URL so that our code
-    # will reach the correct URL for the api.
-    api = AccountApi()
-    api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    api = ApiSession(ACCOUNT_URL).api(AccountApi)
+
+    cache = AccountInfoCache(api, API_KEY, ACCESS_TOKEN, ttl=args.ttl, path=CACHE_FILE) if args.cache else None
 
     result = None
     try:
+        if args.watch:
+            watch(cache, args.watch)
+            sys.exit(0)
+
         # The getAccount method of the AccountApi class will give us access to the current status of our account
         # See https://www.exavault.com/developer/api-docs/#operation/getAccount for the details of this method
         # We must pass in our API Key and Access Token with every call, which we
         # retrieved from the .env file above
-        result = api.get_account(API_KEY, ACCESS_TOKEN, include='masterUser')
+        #
+        # AccountInfoCache.get only makes that call when the cached account is missing or out of date
+        if cache is not None:
+            result = cache.get()
+        else:
+            result = api.get_account(API_KEY, ACCESS_TOKEN, include='masterUser')
     except Exception as e:
         # If there was a problem, such as our credentials not being correct, or the URL not working,
         # there will be an exception thrown
@@ -59,13 +208,7 @@ if __name__ == "__main__":
     #
     # The AccountResponse object that we got back (`result`) is composed of additional, nested objects
     # The Quota object will tell us how much space we've used
-    quota = result.data.attributes.quota
-    account_max_size = quota.disk_limit / (1024 ** 3)
-    account_current_size = quota.disk_used / (1024 ** 3)
-
-    print('Account used: {:.1f} GB ({:.1f}%)'.format(
-        account_current_size, account_current_size / account_max_size * 100))
-    print('Total size: {:.1f} GB'.format(account_max_size))
+    print_usage(result.data.attributes.quota)
 
     for included in result.included:
         if included.type == 'user':
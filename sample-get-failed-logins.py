@@ -1,14 +1,29 @@
+import argparse
 import datetime
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import ActivityApi
 
+from evsamples.activity import FailedLoginMonitor
+from evsamples.activity import count_failed_logins
+from evsamples.activity import fetch_session_logs
+from evsamples.session import ApiSession
+
 
 ##
 # sample_get_failed_logins.py
 # Use the ActivityApi to retrieve the list of users who had failed logins in the last 24 hours.
+#
+# Use --days to look further back. The window is split into --slices parts that are fetched in parallel.
+#
+# Use --brute-force to also list users and IP addresses with at least --threshold failures within any --window
+# minutes. That analysis is done with pandas (pip install pandas).
+#
+# Use --watch to keep running and check for new failed logins every --interval seconds. Only log entries newer
+# than the last check are fetched, and the running counts are saved to --state so they survive a restart.
 ##
 
 
@@ -35,14 +50,106 @@ API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
+# Where --watch keeps its high-water mark and rolling counts between checks
+STATE_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "failed_logins_state.json")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='List the users who had failed logins recently')
+    parser.add_argument('--days', type=float, default=1, help='how many days back to look (default: 1)')
+    parser.add_argument('--slices', type=int, default=8,
+                        help='number of parts to split the time window into and fetch in parallel (default: 8)')
+    parser.add_argument('--brute-force', action='store_true',
+                        help='list users and IP addresses with bursts of failed logins (needs pandas)')
+    parser.add_argument('--window', type=float, default=5, help='brute-force window in minutes (default: 5)')
+    parser.add_argument('--threshold', type=int, default=10,
+                        help='failures within the window that count as brute force (default: 10)')
+    parser.add_argument('--watch', action='store_true',
+                        help='keep running, fetching only new log entries every --interval seconds')
+    parser.add_argument('--interval', type=float, default=60, help='seconds between checks with --watch (default: 60)')
+    parser.add_argument('--state', default=STATE_FILE, help='file that --watch saves its progress to')
+    return parser.parse_args()
+
+
+def print_counts(failed_logins, failed_ips):
+    print("{} Users with failed logins:".format(len(failed_logins)))
+    print("  {0: <35} {1}".format("Username", "Count"))
+    print("=" * 46)
+
+    for user, failed_count in failed_logins.most_common():
+        print("{0: <35} {1}".format(user, failed_count))
+
+    print("")
+    print("{} IP addresses with failed logins:".format(len(failed_ips)))
+    print("  {0: <35} {1}".format("IP Address", "Count"))
+    print("=" * 46)
+
+    for ip_address, failed_count in failed_ips.most_common():
+        print("{0: <35} {1}".format(ip_address, failed_count))
+
+
+def print_brute_force(activity_logs, args):
+    # evsamples.analytics copies the log entries into a pandas DataFrame and slides a --window minute window
+    # over every user's (and every IP address's) failures using whole-column operations
+    from evsamples.analytics import detect_brute_force
+    from evsamples.analytics import failed_logins
+    from evsamples.analytics import session_logs_frame
+
+    failures = failed_logins(session_logs_frame(activity_logs))
+    for by, title, heading in (('username', 'Users', 'Username'), ('ip_address', 'IP addresses', 'IP Address')):
+        report = detect_brute_force(failures, by=by, window='{}min'.format(args.window), threshold=args.threshold)
+        print("")
+        print("{0} {1} with {2}+ failed logins within {3:g} minutes:".format(
+            len(report), title, args.threshold, args.window))
+        print("  {0: <35} {1: >5}  {2}".format(heading, "Peak", "Peak Ended"))
+        print("=" * 66)
+        for name, row in report.iterrows():
+            print("{0: <35} {1: >5}  {2}".format(name, row['peak'], row['peak_end']))
+
+
+def watch(activity_api, args):
+    # FailedLoginMonitor remembers the time of the newest log entry it has seen. Each check asks getSessionLogs
+    # only for entries from that point on, which is usually a single short page, and adds the new failures to
+    # counts covering the last --days. Failures that fall out of that window are subtracted again.
+    monitor = FailedLoginMonitor(args.state, window=datetime.timedelta(days=args.days))
+    print("Watching for failed logins every {0:g} seconds. Press Ctrl-C to stop.".format(args.interval))
+
+    while True:
+        try:
+            new_failures = monitor.poll(activity_api, API_KEY, ACCESS_TOKEN)
+        except Exception as e:
+            # A failed check is not fatal; the next one picks up from the same high-water mark
+            print('Exception when calling ActivityApi.getSessionLogs:', str(e))
+        else:
+            for entry in new_failures:
+                print("{0} failed login for {1} from {2}".format(
+                    entry.attributes.created, entry.attributes.username, entry.attributes.ip_address))
+            if new_failures:
+                print("Last {0:g} day(s): {1} failed logins, top users: {2}".format(
+                    args.days, sum(monitor.by_user.values()),
+                    ", ".join("{0} ({1})".format(user, count) for user, count in monitor.by_user.most_common(5))))
+
+        time.sleep(args.interval)
+
 
 if __name__ == "__main__":
+    args = parse_args()
 
     # We are demonstrating the use of the ActivityApi, which can be used to retrieve session and webhook logs
-    # We have to override the default configuration of the ActivityApi object with an updated host URL so that our code
-    # will reach the correct URL for the api.
-    activity_api = ActivityApi()
-    activity_api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    #
+    # The logs are fetched by several threads at once, all sharing this client, so we make sure its connection
+    # pool has room for each of them.
+    activity_api = ApiSession(ACCOUNT_URL, pool_size=args.slices).api(ActivityApi)
+
+    if args.watch:
+        try:
+            watch(activity_api, args)
+        except KeyboardInterrupt:
+            print("")
+            print("Stopped. Progress is saved in {}".format(args.state))
+        sys.exit(0)
 
     try:
         # The getSessionLogs method of the ActivityApi class will give us access activity logs for our account
@@ -51,14 +158,29 @@ if __name__ == "__main__":
         # We must pass in our API Key and Access Token with every call, which we retrieved from the .env file above
         # This method also supports filtering parameters to limit the results returned. Check the link to
         # our API documentation for a list of those parameters.
+        #
+        # Each call returns at most one page of log entries, and a busy account can have far more failed logins
+        # in a day than fit on one page. fetch_session_logs splits the time window into --slices smaller windows,
+        # fetches every page of each of them in parallel and hands us all of the entries.
+        # We only ask for "pass" (login) operations.
 
         end_date = datetime.datetime.today()
-        start_date = end_date - datetime.timedelta(days=1)
-
-        list_result = activity_api.get_session_logs(
-            API_KEY, ACCESS_TOKEN, start_date=start_date, end_date=end_date,
-            type='pass', offset=0, limit=200, sort="-date"
-        )
+        start_date = end_date - datetime.timedelta(days=args.days)
+
+        activity_logs = fetch_session_logs(
+            activity_api, API_KEY, ACCESS_TOKEN, start_date, end_date,
+            slices=args.slices, workers=args.slices, type='pass')
+
+        # The returned activity will be swagger_client.model.SessionActivityEntry objects.
+        # Each SessionActivityEntry object has an attributes attribute that allows us to access the details for
+        # the logged activity, which will be a swagger_client.model.SessionActivityEntryAttributes object.
+        # That object has accessors for username, client IP address, status, operation, etc.
+        #
+        # count_failed_logins tallies the entries with a "failed" status by username and by IP address,
+        # using collections.Counter
+        if args.brute_force:
+            activity_logs = list(activity_logs)
+        failed_logins, failed_ips = count_failed_logins(activity_logs)
 
     except Exception as e:
         # If there was a problem, such as our credentials not being correct, or the URL not working,
@@ -66,33 +188,6 @@ if __name__ == "__main__":
         print('Exception when calling ActivityApi.getSessionLogs:', str(e))
         sys.exit(1)
 
-    # If we got this far without the program ending, our call to getSessionLogs succeeded and returned something.
-    # The call returns a swagger_client.model.SessionActivityResponse object.
-    # See https://www.exavault.com/developer/api-docs/#operation/getSessionLogs for the details of the response object.
-
-    failed_logins = {}  # dictionary to hold our info
-
-    # The returned activity will be an array of swagger_client.model.SessionActivityEntry objects, which we can access
-    # from the SessionActivityResponse.data attribute.
-    activity_logs = list_result.data
-
-    # Loop over the returned items, which should include only "Connect" operations, per our 
-    # filters to the get_session_logs call
-    for activity in activity_logs:
-        # Each SessionActivityEntry object has a getAttributes method that allows us to access the details for the
-        # logged activity, which will be a swagger_client.model.SessionActivityEntryAttributes object
-
-        # The SessionActivityEntryAttributes object has accessors for username,
-        # client IP address, status, operation, etc.
-        if activity.attributes.status == "failed":
-            if failed_logins.get(activity.attributes.username):
-                failed_logins[activity.attributes.username] += 1
-            else:
-                failed_logins[activity.attributes.username] = 1
-
-    print("{} Users with failed logins:".format(len(failed_logins)))
-    print("  {0: <35} {1}".format("Username", "Count"))
-    print("=" * 46)
-
-    for user, failed_count in failed_logins.items():
-        print("{0: <35} {1}".format(user, failed_count))
+    print_counts(failed_logins, failed_ips)
+    if args.brute_force:
+        print_brute_force(activity_logs, args)
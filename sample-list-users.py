@@ -1,11 +1,24 @@
+import argparse
+import operator
 import os
 import sys
 
 from dotenv import load_dotenv
 from exavault import UsersApi
 
+from evsamples.paging import iter_items
+from evsamples.progress import RateReporter
+from evsamples.session import ApiSession
+from evsamples.tables import FORMATS
+from evsamples.tables import Column
+from evsamples.tables import open_table
+from evsamples.users import PERMISSION_NAMES
+
 ##
 # sample_list_users.py - Use the UsersApi to create a report of account users
+#
+# The report is written as CSV by default. Use --format jsonl for one JSON object per line, or --format parquet
+# or --format arrow for columnar files that analytics tools load quickly (these two need `pip install pyarrow`).
 ##
 
 ##
@@ -31,16 +44,71 @@ API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
+
+def user_attribute(name):
+    return operator.attrgetter('attributes.' + name)
+
+
+def last_logged_in(user):
+    # The access timestamp returns a non-standard value representing 'never'
+    access_timestamp = user.attributes.access_timestamp
+    return None if not access_timestamp or access_timestamp[:4] == "0000" else access_timestamp
+
+
+# The columns of our report, in order: the CSV heading, the field name used in the JSON/Parquet formats,
+# and how to get the value from a swagger_client.model.User object.
+#
+# The detailed data about the individual user is accessed through the User.attributes attribute, which returns a
+# swagger_client.model.UserAttributes object. Its permissions attribute returns a
+# swagger_client.model.UserPermissions object, which contains the True/False flags for each of the permissions
+# available to a user. See https://www.exavault.com/docs/account/04-users/00-introduction#managing-user-roles-and-permissions
+USER_COLUMNS = [
+    # The internal ID of a user isn't visible in the web file manager. It is used by the API to access the user.
+    Column('Id', 'id', operator.attrgetter('id'), kind='int'),
+    Column('Username', 'username', user_attribute('username')),
+    Column('Nickname', 'nickname', user_attribute('nickname')),
+    Column('Email Address', 'email', user_attribute('email')),
+    Column('Home Folder', 'home_path', user_attribute('home_path')),
+    Column('Role', 'role', user_attribute('role')),
+    Column('Time Zone', 'time_zone', user_attribute('time_zone')),
+] + [
+    Column(name.replace('_', ' ').title(), name, user_attribute('permissions.' + name), kind='bool', true_text=name)
+    for name in PERMISSION_NAMES
+] + [
+    Column('Expiration', 'expiration', user_attribute('expiration')),
+    Column('Last Logged In', 'last_logged_in', last_logged_in, none_text='never'),
+    Column('locked', 'locked', lambda user: not user.attributes.status, kind='bool', true_text='locked'),
+    Column('Created', 'created', user_attribute('created'), kind='timestamp'),
+    Column('Modified', 'modified', user_attribute('modified'), kind='timestamp'),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Create a report of the users in your ExaVault account')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='csv', help='report format (default: csv)')
+    parser.add_argument('--output', help='where to write the report (default: files/users_listing.<format>)')
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
 
     # We are demonstrating the use of the UsersApi, which can be used to retrieve user settings and create a report
-    # We have to override the default configuration of the UserApi object with an updated host URL so that our code
-    #  will reach the correct URL for the api.
-    users_api = UsersApi()
-    users_api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    users_api = ApiSession(ACCOUNT_URL).api(UsersApi)
+
+    # We are creating a report file in the same directory as this script, as CSV unless --format says otherwise.
+    #
+    # open_table opens the file for writing (which removes existing data) and gives us a writer that turns each
+    # User object into one row, using the USER_COLUMNS table above. The csv format quotes values properly, so
+    # nicknames or emails containing commas can't break the file.
+    output_filename = args.output or os.path.join(
+        os.path.dirname(__file__), "files/users_listing{}".format(FORMATS[args.format]))
 
-    # List to store our results in
-    list_of_users = []
+    total_users_for_account = None
+    total_users_retrieved = 0
+    reporter = RateReporter('Listed', unit='users')
 
     try:
         # The listUsers method of the UsersApi class will give us access the users defined in our account
@@ -49,125 +117,35 @@ if __name__ == "__main__":
         # We must pass in our API Key and Access Token with every call, which we retrieved from the .env file above
         # This method also supports filtering parameters to limit the results returned. Check the link to
         # our API documentation for a list of those parameters.
-        list_result = users_api.list_users(API_KEY, ACCESS_TOKEN)
+        #
+        # Each call returns a swagger_client.model.UserCollectionResponse object with one page of users, so we ask
+        # for them a page at a time using the offset and limit parameters. iter_items does that for us, and
+        # fetches the next page in the background while we are writing out the current one, so the whole account
+        # never has to be held in memory at once.
+        # See https://www.exavault.com/developer/api-docs/#operation/listUsers for the details of the response
+        def fetch_page(offset, limit):
+            global total_users_for_account
+            page = users_api.list_users(API_KEY, ACCESS_TOKEN, offset=offset, limit=limit)
+            total_users_for_account = page.total_results
+            return page
+
+        with open_table(output_filename, USER_COLUMNS, args.format) as table:
+
+            # The users come to us one at a time as swagger_client.model.User objects, taken from the
+            # UserCollectionResponse.data attribute of each page
+            for user in iter_items(fetch_page):
+                table.write(user)
+
+                total_users_retrieved += 1
+                reporter.update(total_users_retrieved)
 
     except Exception as e:
 
         # If there was a problem, such as our credentials not being correct, or the URL not working,
-        # there will be an exception thrown.
+        # there will be an exception thrown. Pages after the first are only asked for as the report is written,
+        # so this can happen part way through too.
         print('Exception when calling UserApi.listUsers:', str(e))
         sys.exit(1)
 
-    # If we got this far without the program ending, our call to list_users succeeded and returned something
-    # The call returns a swagger_client.model.UserCollectionResponse object
-    # See https://www.exavault.com/developer/api-docs/#operation/listUsers for
-    # the details of the response object
-
-    total_users_for_account = list_result.total_results
-    total_users_retrieved = list_result.returned_results
-
-    # The returned users will be an array of wagger_client.model.User objects which we can access from the
-    # UserCollectionResponse.data attribute
-    users_retrieved = list_result.data
-
-    # We are creating a CSV file in the same directory as this script.
-    #
-    # This opens the file for writing (which removes existing data) and gives us a file handle that we
-    # can use to write the CSV data with.
-    output_filename = os.path.join(os.path.dirname(__file__), "files/users_listing.csv")
-    with open(output_filename, 'w') as f:
-
-        # Writing the column titles to our CSV file
-        csv_column_headers = [
-            'Id',
-            'Username',
-            'Nickname',
-            'Email Address',
-            'Home Folder',
-            'Role',
-            'Time Zone',
-            'Download',
-            'Upload',
-            'Modify',
-            'Delete',
-            'List',
-            'Change Password',
-            'Share',
-            'Notification',
-            'View Form Data',
-            'Delete Form Data',
-            'Expiration',
-            'Last Logged In',
-            'locked',
-            'Created',
-            'Modified']
-        f.write(','.join(csv_column_headers) + '\n')
-
-        # Looping over the users array that we got back from our list_users call.
-        for user in users_retrieved:
-
-            # The internal ID of a user isn't visible in the web file manager. It is used by the API to
-            # access the user.
-            user_id = user.id
-
-            # The detailed data about the individual user is accessed through the User.attributes attribute
-            # which returns a swagger_client.model.UserAttributes object
-
-            username = user.attributes.username
-            nickname = user.attributes.nickname
-            email = user.attributes.email
-            home_path = user.attributes.home_path
-            role = user.attributes.role
-            time_zone = user.attributes.time_zone
-            created = user.attributes.created
-            modified = user.attributes.modified
-            access_timestamp = user.attributes.access_timestamp
-            expiration = user.attributes.expiration if user.attributes.expiration else ''
-            locked = '' if user.attributes.status else 'locked'
-
-            # The access timestamp returns a non-standard value representing 'never'
-            last_logged_in = 'never' if access_timestamp[:4] == "0000" else access_timestamp
-
-            # The UserAttributes.permissions attribute returns a swagger_client.model.UserPermissions object,
-            #   which contains the True/False flags for each of the permissions available to a user
-            #   See https://www.exavault.com/docs/account/04-users/00-introduction#managing-user-roles-and-permissions
-            #
-            download = 'download' if user.attributes.permissions.download else ''
-            upload = 'upload' if user.attributes.permissions.upload else ''
-            modify = 'modify' if user.attributes.permissions.modify else ''
-            delete = 'delete' if user.attributes.permissions.delete else ''
-            list_permission = 'list' if user.attributes.permissions.list else ''
-            change_password = 'change_password' if user.attributes.permissions.change_password else ''
-            share = 'share' if user.attributes.permissions.share else ''
-            notification = 'notification' if user.attributes.permissions.notification else ''
-            view_form_data = 'view_form_data' if user.attributes.permissions.view_form_data else ''
-            delete_form_data = 'delete_form_data' if user.attributes.permissions.delete_form_data else ''
-
-            # Make an array of the current user's data and append it to the list we
-            # will use to create our report
-            data = [
-                user_id,
-                username,
-                nickname,
-                email,
-                home_path,
-                role,
-                time_zone,
-                download,
-                upload,
-                modify,
-                delete,
-                list_permission,
-                change_password,
-                share,
-                notification,
-                view_form_data,
-                delete_form_data,
-                expiration,
-                last_logged_in,
-                locked,
-                created,
-                modified]
-            f.write(','.join(map(str, data)) + '\n')
-
-    print("Listed: {} users to {}".format(total_users_retrieved, output_filename))
+    reporter.finish(total_users_retrieved)
+    print("Listed: {} of {} users to {}".format(total_users_retrieved, total_users_for_account, output_filename))
@@ -0,0 +1,132 @@
+import argparse
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from exavault import ResourcesApi
+from exavault import SharesApi
+from exavault import UsersApi
+
+from evsamples.provision import load_spec
+from evsamples.reconcile import ReconcilePlan
+from evsamples.reconcile import apply_plan
+from evsamples.reconcile import fetch_state
+from evsamples.retry import error_summary
+from evsamples.session import ApiSession
+
+##
+# sample_reconcile.py - Make the users, folders and shares in your account match a JSON or YAML file
+#
+# The other samples add timestamps to the names of what they create, and create everything again on every run.
+# This one reads the state you want from a spec file (see evsamples/reconcile.py for the format), lists what is
+# in the account now with a handful of paginated list calls, and works out the differences locally. Only the
+# creates, updates and (with --prune) deletes needed to close the gap are sent, so running it again with the
+# same spec makes no changes at all:
+#
+#   python sample-reconcile.py --spec clients.yaml --dry-run
+#   python sample-reconcile.py --spec clients.yaml --workers 16
+#
+# YAML specs need `pip install pyyaml`.
+##
+
+##
+# To use this script, add your credentials to a file named .env which is located in the same directory as this script
+#
+# Your API key will be the EV_KEY
+# Your access token will be EV_TOKEN
+# Your account URL will be the address you should use for the API endpoint
+#
+# To obtain your API Key and Token, you'll need to use the Developer page within the web file manager
+# See https://www.exavault.com/developer/api-docs/#section/Obtaining-Your-API-Key-and-Access-Token
+#
+# Access tokens do not expire, so you should only need to obtain the key and token once.
+#
+# Your account URL is determined by the name of your account.
+# The URL that you will use is https://accountname.exavault.com/api/v2/ replacing the "accountname" part with your
+#   account name
+# See https://www.exavault.com/developer/api-docs/#section/Introduction/The-API-URL
+##
+
+load_dotenv()
+API_KEY = os.getenv('EV_KEY')
+ACCESS_TOKEN = os.getenv('EV_TOKEN')
+ACCOUNT_URL = os.getenv('ACCOUNT_URL')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Make the users, folders and shares in your account match a spec')
+    parser.add_argument('--spec', required=True, help='the .json or .yaml file describing what should be there')
+    parser.add_argument('--prune', action='store_true',
+                        help="delete users and shares in the spec's scopes, and folders below its root, that the "
+                             "spec doesn't list")
+    parser.add_argument('--dry-run', action='store_true', help='only print the changes that would be made')
+    parser.add_argument('--workers', type=int, default=16, help='API calls to make at the same time (default: 16)')
+    parser.add_argument('--page-size', type=int, default=1000,
+                        help='items requested per list call (default: 1000)')
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    try:
+        spec = load_spec(args.spec)
+    except (IOError, ImportError, ValueError) as e:
+        print('Could not read {}: {}'.format(args.spec, e))
+        sys.exit(1)
+
+    # All three APIs share one session, with a connection for each worker and for the list calls running
+    # alongside them
+    session = ApiSession(ACCOUNT_URL, pool_size=args.workers + 6)
+    resources_api = session.api(ResourcesApi)
+    users_api = session.api(UsersApi)
+    shares_api = session.api(SharesApi)
+
+    # fetch_state lists the users, the shares and every folder below the spec's root, all at the same time,
+    # and indexes them by username, share name and path
+    started = time.time()
+    try:
+        state = fetch_state(resources_api, users_api, shares_api, API_KEY, ACCESS_TOKEN,
+                            root='/' + (spec.get('root') or '').strip('/'), page_size=args.page_size)
+    except Exception as e:
+        print('Exception when listing the account:', error_summary(e))
+        sys.exit(1)
+    print("Found {} users, {} shares and {} folders with {} list calls in {:.2f}s".format(
+        len(state.users), len(state.shares), len(state.folders), state.list_calls, time.time() - started))
+
+    # Comparing the spec with what is there happens entirely in memory
+    try:
+        plan = ReconcilePlan(spec, state, resources_api, users_api, shares_api, API_KEY, ACCESS_TOKEN,
+                             prune=args.prune)
+    except (KeyError, ValueError) as e:
+        print('Problem in {}: {}'.format(args.spec, e))
+        sys.exit(1)
+
+    if not plan.change_count:
+        print("Nothing to do: the account already matches {}".format(args.spec))
+        sys.exit(0)
+    if args.dry_run:
+        for path in plan.folder_creates:
+            print("create folder {}".format(path))
+        for change in plan.changes + plan.deletes:
+            print(change)
+        print("{} changes would be made".format(plan.change_count))
+        sys.exit(0)
+
+    failed = 0
+    made = 0
+    started = time.time()
+    for change in apply_plan(plan, resources_api, API_KEY, ACCESS_TOKEN, workers=args.workers):
+        if change.error is not None:
+            failed += 1
+            print("FAILED to {}: {}".format(change, error_summary(change.error)))
+            continue
+        made += 1
+        print(change)
+        if change.password:
+            print("  password: {}".format(change.password))
+
+    print("Made {} changes ({} failed) in {:.2f}s".format(made, failed, time.time() - started))
+    if failed:
+        sys.exit(1)
@@ -1,6 +1,10 @@
+import argparse
 import datetime
+import io
+import json
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import ResourcesApi
@@ -9,9 +13,32 @@ from exavault.models import AddFolderRequestBody
 from exavault.models import AddShareRequestBody
 from exavault.models import AccessMode
 
+from evsamples.provision import ProvisionPlan
+from evsamples.provision import provision
+from evsamples.records import read_records
+from evsamples.retry import error_summary
+from evsamples.session import ApiSession
+from evsamples.shares import AccessProfiles
+from evsamples.shares import ShareResult
+from evsamples.shares import add_shares
+from evsamples.shares import build_share_body
+from evsamples.shares import iter_shares
+from evsamples.shares import rotate_passwords
+
 
 ##
 # sample_shared_folder.py - Use the SharesApi to create a shared folder with a password
+#
+# The script can also manage shares in bulk, writing one JSON object per share (its name, id, hash, paths and,
+# when it was just set, password) to standard output or --output as each call finishes:
+#
+#   python sample-shared-folder.py --from-file client_shares.csv --create-folders --workers 16 > onboarding.jsonl
+#   python sample-shared-folder.py --list "client*"
+#   python sample-shared-folder.py --rotate "client*" --output new_passwords.jsonl
+#
+# Each record in --from-file needs a name and resources (the folders to share). access is any of download,
+# upload, modify and delete (default: download upload), and password defaults to "generate", which gives
+# every share its own random password. Shares with the same access share one AccessMode object.
 ##
 
 
@@ -38,7 +65,97 @@ API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
 
+# Values used for any field a record in --from-file leaves out
+BULK_DEFAULTS = {
+    'type': 'shared_folder',
+    'access': 'download upload',
+    'password': 'generate',
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Create and manage shared folders')
+    parser.add_argument('--from-file', help='create every share listed in this .csv, .jsonl or .json file')
+    parser.add_argument('--create-folders', action='store_true',
+                        help='with --from-file, create the shared folders first if they are not there yet')
+    parser.add_argument('--list', nargs='?', const='*', metavar='NAME',
+                        help='list the shares whose names match NAME (wildcards allowed; default: all of them)')
+    parser.add_argument('--rotate', metavar='NAME',
+                        help='give every share whose name matches NAME (e.g. "client*") a new password')
+    parser.add_argument('--output', default='-',
+                        help='where to write one JSON line per share (default: standard output)')
+    parser.add_argument('--workers', type=int, default=8, help='API calls to make at the same time (default: 8)')
+    return parser.parse_args()
+
+
+def bulk_shares(args):
+    # One connection per worker, plus one for fetching the next page of shares while the workers are busy
+    session = ApiSession(ACCOUNT_URL, pool_size=args.workers + 1)
+    shares_api = session.api(SharesApi)
+    # Shares with the same access flags share a single AccessMode object rather than each building their own
+    profiles = AccessProfiles()
+    invalid = []
+
+    if args.from_file:
+        bodies = []
+        for number, spec in enumerate(read_records(args.from_file), 1):
+            try:
+                bodies.append(build_share_body(spec, profiles, BULK_DEFAULTS))
+            except ValueError as e:
+                invalid.append(number)
+                print("Record #{} is invalid: {}".format(number, e), file=sys.stderr)
+
+        if args.create_folders:
+            # provision creates each folder once, parents first, and leaves folders that are already there alone
+            plan = ProvisionPlan({'folders': sorted(set(path for body in bodies for path in body.resources))})
+            for result in provision(session.api(ResourcesApi), None, API_KEY, ACCESS_TOKEN, plan,
+                                    workers=args.workers):
+                if result.error is not None:
+                    print("FAILED to create folder {}: {}".format(result.path, result.error), file=sys.stderr)
+        results = add_shares(shares_api, API_KEY, ACCESS_TOKEN, bodies, workers=args.workers)
+    else:
+        shares = iter_shares(shares_api, API_KEY, ACCESS_TOKEN, name=args.rotate or args.list)
+        if args.rotate:
+            results = rotate_passwords(shares_api, API_KEY, ACCESS_TOKEN, shares, workers=args.workers)
+        else:
+            results = (ShareResult.from_share(share, 'listed') for share in shares)
+
+    # Every share is written out as one JSON object per line as soon as its call finishes, so the output can be
+    # piped into whatever sends the share links and passwords on to each client
+    output = sys.stdout if args.output == '-' else io.open(args.output, 'w', encoding='utf-8')
+    done = 0
+    failed = 0
+    started = time.time()
+    try:
+        for result in results:
+            done += 1
+            if result.error is not None:
+                failed += 1
+            output.write(json.dumps(result.record()) + '\n')
+            output.flush()
+    except Exception as e:
+        # With --list and --rotate the shares are listed a page at a time as they are written out, so listing
+        # can fail part way through
+        print("Exception when calling SharesApi after {} shares: {}".format(done, error_summary(e)),
+              file=sys.stderr)
+        sys.exit(1)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    print("{} shares, {} failed, {} invalid in {:.2f}s".format(done, failed, len(invalid), time.time() - started),
+          file=sys.stderr)
+    if args.from_file:
+        print("{} access profiles were shared by all of the new shares".format(len(profiles)), file=sys.stderr)
+    if failed or invalid:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    if args.from_file or args.list or args.rotate:
+        bulk_shares(args)
+        sys.exit(0)
 
     # We are demonstrating the use of the SharesApi, which is used for managing shared folders and receives,
     # as well as for sending files. See our Sharing 101 documentation at
@@ -47,11 +164,11 @@ if __name__ == "__main__":
     # For this demo, we'll create a share for a new folders. If you have an existing file or folder that you want to use
     # for the share, you won't need this step where we use the ResourcesApi to create the folders first.
     #
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api. We have to override this setting
-    # for each of the API classes we use
-    resources_api = ResourcesApi()
-    resources_api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates a single ApiClient configured with the host URL for our account. Every API class we ask it
+    # for is bound to that one client, so the ResourcesApi and SharesApi below share the same pool of HTTP
+    # connections instead of each opening their own.
+    session = ApiSession(ACCOUNT_URL)
+    resources_api = session.api(ResourcesApi)
 
     try:
         # We will create a new folder for the demo. The folder will have a
@@ -77,10 +194,8 @@ if __name__ == "__main__":
     # If we got this far without the program ending, we were able to set up our folder
     # and now we can use the SharesApi to share the folder.
     #
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api.
-    shares_api = SharesApi()
-    shares_api.api_client.configuration.host = ACCOUNT_URL
+    # It comes from the same session, so it reuses the connection the folder was just created over.
+    shares_api = session.api(SharesApi)
 
     try:
 
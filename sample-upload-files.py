@@ -1,13 +1,32 @@
+import argparse
 import datetime
 import os
 import sys
+import time
 
 from dotenv import load_dotenv
 from exavault import ResourcesApi
 
+from evsamples.dedup import UploadIndex
+from evsamples.dedup import upload_deduplicated
+from evsamples.session import ApiSession
+from evsamples.upload import DEFAULT_CHUNK_SIZE
+from evsamples.upload import iter_local_files
+from evsamples.upload import upload_many
+from evsamples.upload import upload_resumable
+
 
 ##
 # sample_upload_files.py - Use the ResourcesApi to upload a file to your account
+#
+# Run with --directory to upload a whole local folder tree in parallel instead of the single sample file:
+#
+#   python sample-upload-files.py --directory ./nightly --target /incoming --workers 16
+#
+# Add --dedup to only send content that isn't in the account already. Files are hashed locally and checked
+# against a small sqlite index of earlier uploads (files/upload_index.sqlite): files that haven't changed since
+# they were last uploaded to the same place are skipped, and content already uploaded elsewhere is copied on the
+# server instead of being sent again. Running the same nightly upload twice sends nothing the second time.
 ##
 
 
@@ -33,8 +52,91 @@ load_dotenv()
 API_KEY = os.getenv('EV_KEY')
 ACCESS_TOKEN = os.getenv('EV_TOKEN')
 ACCOUNT_URL = os.getenv('ACCOUNT_URL')
+INDEX_FILE = os.path.join(os.path.abspath(os.path.dirname(__file__)), "files", "upload_index.sqlite")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Upload files to your ExaVault account')
+    parser.add_argument('--directory',
+                        help='upload every file below this local folder instead of the single sample file')
+    parser.add_argument('--target',
+                        help='folder in your account to upload the directory into '
+                             '(default: a new sample_upload_<timestamp> folder)')
+    parser.add_argument('--workers', type=int, default=8, help='number of uploads to run at once (default: 8)')
+    parser.add_argument('--retries', type=int, default=3,
+                        help='times to retry a file after a temporary failure (default: 3)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE // (1024 ** 2),
+                        help='files larger than this many MB are uploaded in resumable chunks of this size '
+                             '(default: %(default)s)')
+    parser.add_argument('--dedup', action='store_true',
+                        help='with --directory, skip files that are already uploaded and copy duplicate content on '
+                             'the server instead of sending it again')
+    return parser.parse_args()
+
+
+def upload_directory(args):
+    # All of the upload threads share a single ResourcesApi object, and so a single ApiClient and its pool of
+    # HTTP connections. The pool is sized when the session is created, so we ask for one connection per worker.
+    resources_api = ApiSession(ACCOUNT_URL, pool_size=args.workers).api(ResourcesApi)
+
+    target = args.target or "sample_upload_{}".format(datetime.datetime.today().strftime("%Y%m%d_%H%M%S"))
+
+    # Files are handed to the workers as the folder is walked, so we never build a list of every file first.
+    # Each finished upload (or failure) is reported as soon as it completes.
+    uploaded_files = 0
+    uploaded_bytes = 0
+    unsent = {'skipped': 0, 'copied': 0}
+    failures = []
+    started = time.time()
+
+    jobs = iter_local_files(args.directory, target)
+    chunk_size = args.chunk_size * 1024 ** 2
+    if args.dedup:
+        # upload_deduplicated lists what is already in the target folder, hashes every file and only uploads
+        # content it can't skip or copy. The index is kept between runs, so unchanged files aren't hashed again.
+        index = UploadIndex(INDEX_FILE)
+        results = upload_deduplicated(resources_api, API_KEY, ACCESS_TOKEN, jobs, index,
+                                      remote_root='/' + target.strip('/'), workers=args.workers,
+                                      retries=args.retries, chunk_size=chunk_size)
+    else:
+        results = upload_many(resources_api, API_KEY, ACCESS_TOKEN, jobs, workers=args.workers,
+                              retries=args.retries, chunk_size=chunk_size)
+
+    for result in results:
+        if result.error is not None:
+            failures.append(result)
+            print("FAILED {}: {}".format(result.remote_path, result.error))
+            continue
+
+        if result.action != 'uploaded':
+            unsent[result.action] += 1
+            print("{} {} ({} bytes not sent)".format(result.action.capitalize(), result.remote_path, result.size))
+            continue
+        uploaded_files += 1
+        uploaded_bytes += result.size
+        print("Uploaded {} ({} bytes in {:.2f}s, {:.2f} MB/s)".format(
+            result.remote_path, result.size, result.seconds, result.bytes_per_second / (1024 ** 2)))
+    if args.dedup:
+        index.close()
+
+    elapsed = time.time() - started
+    print("Uploaded {} files ({:.1f} MB) to /{} in {:.1f}s: {:.2f} MB/s, {:.1f} files/s".format(
+        uploaded_files, uploaded_bytes / (1024 ** 2), target.strip('/'), elapsed,
+        uploaded_bytes / (1024 ** 2) / elapsed if elapsed else 0,
+        uploaded_files / elapsed if elapsed else 0))
+    if args.dedup:
+        print("Skipped {skipped} files that were already uploaded and copied {copied} on the server".format(**unsent))
+
+    if failures:
+        print("{} files could not be uploaded".format(len(failures)))
+        sys.exit(1)
+
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.directory:
+        upload_directory(args)
+        sys.exit(0)
 
     # We are demonstrating the use of the ResourcesApi, which can be used to
     # manage files and folders in your account
@@ -44,11 +146,9 @@ if __name__ == "__main__":
     # We are going to upload the file as a different name each time so that it is obvious that the file is being upload
     # There are parameters to control whether files can be overwritten by repeated uploads
     #
-    # We have to override the default configuration of the API object with an updated host URL so that our code
-    # will reach the correct URL for the api. We have to override this setting
-    # for each of the API classes we use
-    resources_api = ResourcesApi()
-    resources_api.api_client.configuration.host = ACCOUNT_URL
+    # ApiSession creates an ApiClient configured with the host URL for our account, and hands out API classes
+    # that are bound to it.
+    resources_api = ApiSession(ACCOUNT_URL).api(ResourcesApi)
 
     try:
 
@@ -62,7 +162,11 @@ if __name__ == "__main__":
         # The uploadFile method of the ResourcesApi class will let us upload a file to our account
         # See https://www.exavault.com/developer/api-docs/#operation/uploadFile for the details of this method
         #
-        result = resources_api.upload_file(API_KEY, ACCESS_TOKEN, target_filename, target_size, file=filename)
+        # upload_resumable calls uploadFile for us. If the file is larger than --chunk-size it instead sends
+        # the file in pieces using the offsetBytes and resume parameters, and keeps a small .evupload file next
+        # to it so that running the script again after an interruption picks up where it left off.
+        result, _ = upload_resumable(resources_api, API_KEY, ACCESS_TOKEN, filename, target_filename,
+                                     chunk_size=args.chunk_size * 1024 ** 2)
 
         # The uploadFile method of the ResourcesApi returns a swagger_client.model.ResourceResponse object
         # See https://www.exavault.com/developer/api-docs/#operation/uploadFile
@@ -0,0 +1,62 @@
+import json
+import threading
+import time
+
+from exavault import ApiClient
+
+from evsamples.account import AccountInfoCache
+
+
+class FakeAccountApi(object):
+    """Answers get_account slowly, counting the calls, with a plain dict in place of an AccountResponse."""
+
+    def __init__(self, delay=0.05):
+        self.api_client = ApiClient()
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def get_account(self, api_key, access_token, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'quota': self.calls}
+
+
+def get_from_threads(cache, count=16):
+    accounts = []
+    threads = [threading.Thread(target=lambda: accounts.append(cache.get())) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return accounts
+
+
+def test_empty_cache_fetches_once_for_concurrent_callers():
+    account_api = FakeAccountApi()
+    cache = AccountInfoCache(account_api, 'key', 'token', ttl=60)
+    assert get_from_threads(cache) == [{'quota': 1}] * 16
+    assert account_api.calls == 1
+
+
+def test_expired_cache_fetches_once_for_concurrent_callers():
+    account_api = FakeAccountApi()
+    cache = AccountInfoCache(account_api, 'key', 'token', ttl=60, stale_ttl=0)
+    cache.get()
+    cache.fetched -= 120
+    assert get_from_threads(cache) == [{'quota': 2}] * 16
+    assert account_api.calls == 2
+
+
+def test_corrupt_cache_file_is_ignored(tmp_path):
+    path = tmp_path / 'account_cache.json'
+    for text in ['{"include": "masterUser", "fetch', '[]', '{"include": "masterUser"}']:
+        path.write_text(text)
+        account_api = FakeAccountApi(delay=0)
+        cache = AccountInfoCache(account_api, 'key', 'token', path=str(path))
+        assert cache.account is None
+        assert cache.get() == {'quota': 1}
+        # The fetched account replaces the bad file
+        assert json.loads(path.read_text())['account'] == {'quota': 1}
+    assert [p.name for p in tmp_path.iterdir()] == ['account_cache.json']
@@ -0,0 +1,108 @@
+import datetime
+
+from types import SimpleNamespace
+
+import pytest
+
+from evsamples.activity import FailedLoginMonitor
+from evsamples.activity import fetch_session_logs
+from evsamples.activity import iter_webhook_logs
+
+START = datetime.datetime(2026, 1, 1)
+
+
+def make_entries(count, step=datetime.timedelta(seconds=10), status='failed'):
+    return [SimpleNamespace(id=number, attributes=SimpleNamespace(
+        created=(START + step * number).strftime('%Y-%m-%dT%H:%M:%SZ'), status=status,
+        username='user{}'.format(number % 3), ip_address='10.0.0.{}'.format(number % 5)))
+        for number in range(count)]
+
+
+def created_of(entry):
+    # Webhook entries keep their attributes as the raw response dict
+    attributes = entry.attributes
+    return attributes['created'] if isinstance(attributes, dict) else attributes.created
+
+
+def naive_utc(value):
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+class FakeActivityApi(object):
+    """Serves log entries between start_date and end_date, always reporting totalResults=0 as the API does."""
+
+    def __init__(self, session_entries=(), webhook_entries=()):
+        self.session_entries = list(session_entries)
+        self.webhook_entries = list(webhook_entries)
+        self.calls = 0
+
+    def _page(self, entries, start_date, end_date, offset, limit):
+        self.calls += 1
+        start_date, end_date = naive_utc(start_date), naive_utc(end_date)
+        matching = [entry for entry in entries
+                    if start_date <= datetime.datetime.strptime(created_of(entry), '%Y-%m-%dT%H:%M:%SZ') <= end_date]
+        return SimpleNamespace(data=matching[offset:offset + limit], total_results=0)
+
+    def get_session_logs(self, api_key, access_token, start_date, end_date, offset, limit, sort, **filters):
+        return self._page(self.session_entries, start_date, end_date, offset, limit)
+
+    def get_webhook_logs(self, api_key, access_token, start_date, end_date, offset, limit, sort, **filters):
+        return self._page(self.webhook_entries, start_date, end_date, offset, limit)
+
+
+def test_fetch_session_logs_pages_past_the_first_page_of_each_slice():
+    entries = make_entries(1000)
+    activity_api = FakeActivityApi(entries)
+    end = START + datetime.timedelta(seconds=10 * 999)
+    fetched = list(fetch_session_logs(activity_api, 'key', 'token', START, end, slices=2, workers=2))
+    assert sorted(entry.id for entry in fetched) == list(range(1000))
+
+
+def test_failed_login_monitor_mixes_naive_and_offset_timestamps(tmp_path):
+    # Entries carry a Z suffix, and the state file and the caller's now may not
+    activity_api = FakeActivityApi(make_entries(500))
+    state_path = str(tmp_path / 'monitor.json')
+    monitor = FailedLoginMonitor(state_path, window=datetime.timedelta(hours=1))
+
+    now = START + datetime.timedelta(seconds=10 * 499)
+    new_failures = monitor.poll(activity_api, 'key', 'token', now=now)
+    # The first poll looks back over the whole window, which holds more entries than one page
+    assert len(new_failures) == 361
+    assert sum(monitor.by_user.values()) == 361
+
+    # A restarted monitor picks up where the last one stopped, with its timestamps read back from the file
+    activity_api.session_entries.extend(make_entries(510)[500:])
+    monitor = FailedLoginMonitor(state_path, window=datetime.timedelta(hours=1))
+    later = (now + datetime.timedelta(seconds=100)).replace(tzinfo=datetime.timezone.utc).astimezone(
+        datetime.timezone(datetime.timedelta(hours=2)))
+    new_failures = monitor.poll(activity_api, 'key', 'token', now=later)
+    assert [entry.id for entry in new_failures] == list(range(500, 510))
+    assert sum(monitor.by_user.values()) == 361
+
+
+def make_webhook_entries(count):
+    return [SimpleNamespace(id=number, attributes={
+        'created': (START + datetime.timedelta(seconds=number)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'username': 'user{}'.format(number % 3), 'ipAddress': '10.0.0.1', 'event': 'resources.upload',
+        'status': 200, 'endpointUrl': 'https://example.com/hook', 'resourcePath': '/a'})
+        for number in range(count)]
+
+
+def test_webhook_logs_page_past_the_first_page():
+    activity_api = FakeActivityApi(webhook_entries=make_webhook_entries(450))
+    end = START + datetime.timedelta(seconds=449)
+    entries = list(iter_webhook_logs(activity_api, 'key', 'token', START, end))
+    assert [entry.id for entry in entries] == list(range(450))
+    assert activity_api.calls == 3
+
+
+def test_webhook_analytics_see_every_page():
+    pytest.importorskip('pandas')
+    from evsamples.analytics import counts_by
+    from evsamples.analytics import webhook_logs_frame
+
+    activity_api = FakeActivityApi(webhook_entries=make_webhook_entries(450))
+    end = START + datetime.timedelta(seconds=449)
+    frame = webhook_logs_frame(iter_webhook_logs(activity_api, 'key', 'token', START, end))
+    assert len(frame) == 450
+    assert counts_by(frame, 'username').to_dict() == {'user0': 150, 'user1': 150, 'user2': 150}
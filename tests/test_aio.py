@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+from exavault import ResourcesApi
+
+from evsamples.aio import AsyncSession
+
+
+def test_header_and_query_values_are_sent_as_text(tmp_path):
+    aiohttp = pytest.importorskip('aiohttp')
+    session = AsyncSession('http://127.0.0.1/api/v2')
+    session._aiohttp = aiohttp
+    upload = tmp_path / 'part.bin'
+    upload.write_bytes(b'x' * 10)
+
+    # uploadFile sends offsetBytes as a header, and the generated client leaves it as an int
+    prepared = ResourcesApi(session._recorder).upload_file('key', 'token', '/part.bin', 20, file=str(upload),
+                                                           offset_bytes=10, resume=True)
+    kwargs = session._request_kwargs(prepared)
+    assert all(isinstance(value, str) for value in kwargs['headers'].values())
+    assert kwargs['headers']['offsetBytes'] == '10'
+    assert all(isinstance(value, str) for _, value in kwargs['params'])
+
+
+def test_error_headers_stay_case_insensitive():
+    pytest.importorskip('aiohttp')
+    multidict = pytest.importorskip('multidict')
+    from exavault.rest import ApiException
+
+    from evsamples.retry import retry_after
+
+    class Response(object):
+        status = 429
+        reason = 'Too Many Requests'
+        headers = multidict.CIMultiDictProxy(multidict.CIMultiDict([('retry-after', '3')]))
+
+        async def read(self):
+            return b'{}'
+
+    session = AsyncSession('http://127.0.0.1/api/v2')
+    with pytest.raises(ApiException) as raised:
+        asyncio.run(session._check(Response()))
+    assert raised.value.status == 429
+    assert retry_after(raised.value) == 3.0
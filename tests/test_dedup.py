@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import dedup
+from evsamples import retry
+from evsamples.dedup import copy_one
+from evsamples.upload import UploadResult
+
+
+class FakeResourcesApi(object):
+    """Copies resource 1 into a folder as resource 2, keeping the source's name, and fails as told to."""
+
+    def __init__(self, copy_errors=(), rename_errors=()):
+        self.copy_errors = list(copy_errors)
+        self.rename_errors = list(rename_errors)
+        self.calls = []
+
+    def copy_resources(self, api_key, access_token, body):
+        self.calls.append(('copy', body.parent_resource))
+        if self.copy_errors:
+            raise self.copy_errors.pop(0)
+        return SimpleNamespace(data=SimpleNamespace(id=2, attributes=SimpleNamespace(name='report.pdf')))
+
+    def update_resource_by_id(self, access_token, api_key, id, body):
+        self.calls.append(('rename', id, body.name))
+        if self.rename_errors:
+            raise self.rename_errors.pop(0)
+        return SimpleNamespace(data=SimpleNamespace(id=id, attributes=SimpleNamespace(name=body.name)))
+
+    def delete_resource_by_id(self, id, api_key, access_token):
+        self.calls.append(('delete', id))
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+    uploaded = []
+
+    def upload_one(resources_api, api_key, access_token, local_path, remote_path, *args):
+        uploaded.append(remote_path)
+        return UploadResult(local_path, remote_path, 0)
+
+    monkeypatch.setattr(dedup, 'upload_one', upload_one)
+    return uploaded
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / 'copy.pdf'
+    path.write_bytes(b'%PDF')
+    return str(path)
+
+
+def test_copy_is_renamed_to_the_target_name(uploads, local_file):
+    resources_api = FakeResourcesApi()
+    result = copy_one(resources_api, 'key', 'token', 1, local_file, '/reports/copy.pdf')
+    assert result.action == 'copied' and result.error is None
+    assert resources_api.calls == [('copy', '/reports'), ('rename', 2, 'copy.pdf')]
+    assert uploads == []
+
+
+def test_failed_rename_deletes_the_copy_before_uploading(uploads, local_file):
+    resources_api = FakeResourcesApi(rename_errors=[ApiException(status=400)])
+    result = copy_one(resources_api, 'key', 'token', 1, local_file, '/reports/copy.pdf')
+    assert result.action == 'uploaded'
+    assert resources_api.calls == [('copy', '/reports'), ('rename', 2, 'copy.pdf'), ('delete', 2)]
+    assert uploads == ['/reports/copy.pdf']
+
+
+def test_copy_that_may_have_been_made_is_not_asked_for_again(uploads, local_file):
+    resources_api = FakeResourcesApi(copy_errors=[ReadTimeoutError(None, '/resources/copy', 'Read timed out.')])
+    result = copy_one(resources_api, 'key', 'token', 1, local_file, '/reports/copy.pdf')
+    assert result.action == 'uploaded'
+    assert resources_api.calls == [('copy', '/reports')]
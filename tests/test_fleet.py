@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from evsamples.fleet import FleetAccount
+from evsamples.fleet import read_fleet
+
+
+@pytest.mark.parametrize('name', ['../../etc/passwd', 'C:\\temp\\acme', 'acme/eu', 'Ünïcode ☃', '..', ''])
+def test_cache_file_name_is_a_plain_file_name(name):
+    file_name = FleetAccount(name, 'https://acme.exavault.com/api/v2', 'key', 'token').cache_file_name
+    assert file_name.endswith('.json')
+    assert '/' not in file_name and '\\' not in file_name and not file_name.startswith('.')
+
+
+def test_cache_file_names_differ_between_accounts():
+    names = set(FleetAccount(name, url, 'key', 'token').cache_file_name for name, url in [
+        ('acme/eu', 'https://a.exavault.com/api/v2'),
+        ('acme_eu', 'https://a.exavault.com/api/v2'),
+        ('acme', 'https://a.exavault.com/api/v2'),
+        ('acme', 'https://b.exavault.com/api/v2'),
+    ])
+    assert len(names) == 4
+
+
+def test_read_fleet_names_accounts_by_host(tmp_path):
+    path = tmp_path / 'fleet.jsonl'
+    path.write_text(u'\n'.join(json.dumps(record) for record in [
+        {'account_url': 'https://a.exavault.com/api/v2', 'api_key': 'k', 'access_token': 't'},
+        {'name': 42, 'account_url': 'https://b.exavault.com/api/v2', 'api_key': 'k', 'access_token': 't'},
+    ]))
+    assert [account.name for account in read_fleet(str(path))] == ['a.exavault.com', '42']
+
+
+def test_read_fleet_rejects_missing_credentials(tmp_path):
+    path = tmp_path / 'fleet.jsonl'
+    path.write_text(u'{"account_url": "https://a.exavault.com/api/v2", "api_key": "k"}\n')
+    with pytest.raises(ValueError, match='access_token'):
+        read_fleet(str(path))
+
+
+@pytest.mark.parametrize('text', [u'["a"]', u'{"account_url": "x"}', u'[7]'])
+def test_read_fleet_rejects_records_that_are_not_objects(tmp_path, text):
+    path = tmp_path / 'fleet.json'
+    path.write_text(text)
+    with pytest.raises(ValueError, match='must be an object'):
+        read_fleet(str(path))
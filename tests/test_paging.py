@@ -0,0 +1,47 @@
+import pytest
+
+from evsamples.paging import iter_items
+from evsamples.paging import iter_pages
+
+
+class Page(object):
+    def __init__(self, data, total_results):
+        self.data = data
+        self.total_results = total_results
+
+
+def fake_fetcher(count, total_results):
+    """A fetch_page over `count` items that reports total_results on every page, and records its calls."""
+    calls = []
+
+    def fetch_page(offset, limit):
+        calls.append((offset, limit))
+        return Page(list(range(offset, min(count, offset + limit))), total_results)
+
+    return fetch_page, calls
+
+
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_pages_through_known_total(prefetch):
+    fetch_page, calls = fake_fetcher(1000, 1000)
+    assert list(iter_items(fetch_page, 200, prefetch)) == list(range(1000))
+    assert [offset for offset, _ in calls] == [0, 200, 400, 600, 800]
+
+
+@pytest.mark.parametrize('total_results', [0, None])
+@pytest.mark.parametrize('prefetch', [True, False])
+def test_unknown_total_pages_until_a_short_page(total_results, prefetch):
+    # The ActivityApi log endpoints always answer totalResults=0
+    fetch_page, calls = fake_fetcher(1000, total_results)
+    assert list(iter_items(fetch_page, 200, prefetch)) == list(range(1000))
+    assert [offset for offset, _ in calls] == [0, 200, 400, 600, 800, 1000]
+
+    fetch_page, calls = fake_fetcher(950, total_results)
+    assert list(iter_items(fetch_page, 200, prefetch)) == list(range(950))
+    assert len(calls) == 5
+
+
+def test_empty_listing_makes_one_call():
+    fetch_page, calls = fake_fetcher(0, 0)
+    assert [page.data for page in iter_pages(fetch_page, 100)] == [[]]
+    assert calls == [(0, 100)]
@@ -0,0 +1,57 @@
+from types import SimpleNamespace
+
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import retry
+from evsamples.provision import ProvisionPlan
+from evsamples.provision import provision
+
+SPEC = {'root': '/clients', 'folders': [{'path': 'acme', 'notifications': [{'action': 'upload'}]}]}
+
+
+class FakeApi(object):
+    """Stands in for ResourcesApi and NotificationsApi; add_notification raises each of `errors` in turn."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.notification_calls = 0
+
+    def add_folder(self, api_key, access_token, body):
+        raise ApiException(status=409)
+
+    def list_notifications(self, api_key, access_token, **kwargs):
+        return SimpleNamespace(data=[], total_results=0)
+
+    def add_notification(self, api_key, access_token, body):
+        self.notification_calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(data=None)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+
+
+def notification_result(api):
+    results = list(provision(api, api, 'key', 'token', ProvisionPlan(SPEC), workers=1))
+    assert [(result.kind, result.path) for result in results] == [
+        ('folder', '/clients'), ('folder', '/clients/acme'), ('notification', '/clients/acme')]
+    return results[-1]
+
+
+def test_throttled_notification_is_retried():
+    api = FakeApi(ApiException(status=429))
+    assert notification_result(api).error is None
+    assert api.notification_calls == 2
+
+
+@pytest.mark.parametrize('error', [ReadTimeoutError(None, '/notifications', 'Read timed out.'),
+                                   ApiException(status=500)])
+def test_notification_that_may_have_been_added_is_not_sent_again(error):
+    api = FakeApi(error)
+    assert notification_result(api).error is error
+    assert api.notification_calls == 1
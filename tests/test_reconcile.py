@@ -0,0 +1,114 @@
+from types import SimpleNamespace
+
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import retry
+from evsamples.reconcile import AccountState
+from evsamples.reconcile import ReconcilePlan
+from evsamples.reconcile import apply_plan
+
+
+class FakeApi(object):
+    """Stands in for UsersApi, SharesApi and ResourcesApi, raising each of `errors` in turn from any call."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            if self.errors:
+                raise self.errors.pop(0)
+            return SimpleNamespace(data=None)
+        return call
+
+
+def make_user(user_id, username, home_path, role='user'):
+    return SimpleNamespace(id=user_id, attributes=SimpleNamespace(
+        username=username, home_path=home_path, role=role, email='{}@example.com'.format(username),
+        nickname=None, time_zone='UTC', expiration=None, locked=False, permissions=None))
+
+
+def make_share(share_id, name, paths):
+    return SimpleNamespace(id=share_id, attributes=SimpleNamespace(name=name, paths=paths, access_mode=None))
+
+
+@pytest.fixture
+def state():
+    state = AccountState()
+    state.users = {
+        'admin': make_user(1, 'admin', '/', role='master'),
+        'client_a': make_user(2, 'client_a', '/clients/a'),
+        'client_old': make_user(3, 'client_old', '/clients/old'),
+        'partner': make_user(4, 'partner', '/clients/partner/inbox'),
+    }
+    state.shares = {
+        'client-a-drop': make_share(10, 'client-a-drop', ['/clients/a/drop']),
+        'client-old-drop': make_share(11, 'client-old-drop', ['/clients/old/drop']),
+        'press-kit': make_share(12, 'press-kit', ['/clients/press']),
+    }
+    state.folders = set(['/clients', '/clients/a', '/clients/a/drop', '/clients/old', '/clients/old/drop',
+                         '/clients/partner', '/clients/partner/inbox', '/clients/press', '/clients/stale',
+                         '/clients/stale/x'])
+    return state
+
+
+SPEC = {
+    'root': '/clients',
+    'users': [{'username': 'client_a', 'home_resource': '/clients/a'}],
+    'shares': [{'name': 'client-a-drop', 'resources': '/clients/a/drop'}],
+    'user_scope': 'client_*',
+    'share_scope': 'client-*',
+}
+
+
+def make_plan(spec, state, prune=True, api=None):
+    api = api or FakeApi()
+    return ReconcilePlan(spec, state, api, api, api, 'key', 'token', prune=prune)
+
+
+def test_prune_keeps_folders_of_users_and_shares_that_stay(state):
+    # partner and press-kit are outside user_scope and share_scope, so they stay and so do their folders
+    plan = make_plan(SPEC, state)
+    assert sorted(str(change) for change in plan.deletes) == [
+        'delete folder /clients/old, /clients/stale',
+        'delete share client-old-drop',
+        'delete user client_old',
+    ]
+
+
+def test_prune_without_scopes_only_deletes_unused_folders(state):
+    spec = dict(SPEC, user_scope=None, share_scope=None)
+    assert [str(change) for change in make_plan(spec, state).deletes] == ['delete folder /clients/stale']
+
+
+def test_matching_account_needs_no_changes(state):
+    plan = make_plan(SPEC, state, prune=False)
+    assert plan.change_count == 0
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+
+
+def test_creates_are_not_resent_after_a_timeout(state, no_sleep):
+    spec = dict(SPEC, users=SPEC['users'] + [{'username': 'client_b', 'email': 'b@example.com',
+                                               'password': 'Secret123!x', 'home_resource': '/clients/a',
+                                               'permissions': 'download'}])
+    api = FakeApi(ReadTimeoutError(None, '/users', 'Read timed out.'))
+    plan = make_plan(spec, state, prune=False, api=api)
+    [change] = list(apply_plan(plan, api, 'key', 'token', workers=1))
+    assert change.action == 'create' and isinstance(change.error, ReadTimeoutError)
+    assert api.calls == ['add_user']
+
+
+def test_deletes_are_retried(state, no_sleep):
+    api = FakeApi(ApiException(status=502), ReadTimeoutError(None, '/users/3', 'Read timed out.'))
+    plan = make_plan(dict(SPEC, share_scope=None), state, api=api)
+    changes = list(apply_plan(plan, api, 'key', 'token', workers=1))
+    assert [change.error for change in changes] == [None, None]
+    assert api.calls == ['delete_user'] * 3 + ['delete_resources']
@@ -0,0 +1,190 @@
+import json
+
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import resilience
+from evsamples.resilience import CallPolicy
+from evsamples.resilience import CircuitBreaker
+from evsamples.resilience import CircuitOpenError
+from evsamples.resilience import ErrorReport
+
+URL = 'https://acme.exavault.com/api/v2/resources/list'
+
+
+class Clock(object):
+    """Stands in for time.time and time.sleep, so sleeping moves the clock on without waiting."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, 'time', clock.time)
+    monkeypatch.setattr(resilience.time, 'sleep', clock.sleep)
+    monkeypatch.setattr(resilience.random, 'uniform', lambda low, high: 0.0)
+    return clock
+
+
+def sender(*outcomes):
+    """A send(timeout) that raises or returns each of outcomes in turn, and records the timeouts it was given."""
+    outcomes = list(outcomes)
+    timeouts = []
+
+    def send(timeout):
+        timeouts.append(timeout)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return send, timeouts
+
+
+def test_get_is_retried_on_transient_errors(clock):
+    policy = CallPolicy(timeout=(1, 2), retries=3, backoff=1.0)
+    send, timeouts = sender(ApiException(status=503), ReadTimeoutError(None, '/', 'Read timed out.'), 'listing')
+    assert policy.call('GET', URL, send) == 'listing'
+    assert timeouts == [(1, 2)] * 3
+    assert policy.report.calls == 1 and policy.report.retries == 2 and policy.report.failure_count == 0
+
+
+def test_call_timeout_overrides_the_policy(clock):
+    send, timeouts = sender('listing')
+    CallPolicy(timeout=(1, 2)).call('GET', URL, send, timeout=30)
+    assert timeouts == [30]
+
+
+def test_get_gives_up_after_its_retries(clock):
+    policy = CallPolicy(retries=2)
+    send, timeouts = sender(*[ApiException(status=502)] * 3)
+    with pytest.raises(ApiException):
+        policy.call('GET', URL, send)
+    assert len(timeouts) == 3
+    assert policy.report.counts() == {'HTTP 502': 1}
+    assert policy.report.failures[0]['path'] == '/api/v2/resources/list'
+    assert policy.report.failures[0]['attempts'] == 3
+
+
+def test_permanent_errors_are_not_retried(clock):
+    policy = CallPolicy(retries=3)
+    send, timeouts = sender(ApiException(status=404))
+    with pytest.raises(ApiException):
+        policy.call('GET', URL, send)
+    assert len(timeouts) == 1
+
+
+@pytest.mark.parametrize('error', [ReadTimeoutError(None, '/', 'Read timed out.'), ApiException(status=500)])
+def test_post_that_may_have_arrived_is_not_resent(clock, error):
+    policy = CallPolicy(retries=3)
+    send, timeouts = sender(error, 'created')
+    with pytest.raises(type(error)):
+        policy.call('POST', URL, send)
+    assert len(timeouts) == 1
+
+
+@pytest.mark.parametrize('error', [ApiException(status=429),
+                                   MaxRetryError(None, '/', NewConnectionError(None, 'Connection refused'))])
+def test_post_that_never_arrived_is_resent(clock, error):
+    policy = CallPolicy(retries=3)
+    send, timeouts = sender(error, 'created')
+    assert policy.call('POST', URL, send) == 'created'
+    assert len(timeouts) == 2
+
+
+def test_retry_after_is_capped_at_max_backoff(clock):
+    throttled = ApiException(status=429)
+    throttled.headers = {'Retry-After': '3600'}
+    send, _ = sender(throttled, 'listing')
+    assert CallPolicy(max_backoff=30.0).call('GET', URL, send) == 'listing'
+    assert clock.sleeps == [30.0]
+
+
+@pytest.mark.parametrize('header, slept', [('-5', 0.0), ('nan', None)])
+def test_bad_retry_after_falls_back_to_backoff(clock, header, slept):
+    throttled = ApiException(status=503)
+    throttled.headers = {'Retry-After': header}
+    send, _ = sender(throttled, 'listing')
+    assert CallPolicy(backoff=1.0).call('GET', URL, send) == 'listing'
+    [delay] = clock.sleeps
+    if slept is None:
+        # No usable header, so the usual backoff: half of it fixed and half jittered (here to 0)
+        assert delay == 0.5
+    else:
+        assert delay == slept
+
+
+def test_breaker_opens_after_repeated_failures_and_lets_one_call_through(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=10.0)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError) as raised:
+        breaker.before_call()
+    assert raised.value.status == 503 and raised.value.headers['Retry-After'] == '10.00'
+
+    clock.now += 10.0
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only the trial call goes through until it has been answered
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN and breaker.times_opened == 2
+
+    clock.now += 10.0
+    breaker.before_call()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.failures == 0
+
+
+def test_held_calls_wait_for_the_breaker_without_using_retries(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10.0)
+    breaker.record(False)
+    policy = CallPolicy(retries=0, breaker=breaker)
+    send, timeouts = sender('created')
+    # Even a POST may wait, since nothing was sent while the breaker was open
+    assert policy.call('POST', URL, send) == 'created'
+    assert timeouts == [resilience.DEFAULT_TIMEOUT]
+    assert clock.sleeps == [10.0]
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_held_calls_give_up_after_max_hold(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60.0)
+    breaker.record(False)
+    policy = CallPolicy(breaker=breaker, max_hold=30.0)
+    send, timeouts = sender('listing')
+    with pytest.raises(CircuitOpenError):
+        policy.call('GET', URL, send)
+    assert timeouts == [] and clock.sleeps == []
+    assert policy.report.counts() == {'HTTP 503': 1}
+
+
+def test_report_summary_and_save(tmp_path):
+    report = ErrorReport(limit=1)
+    report.count_call()
+    report.count_call()
+    report.count_retry()
+    report.add('GET', '/resources/list', ApiException(status=503), 2)
+    report.add('POST', '/users', ReadTimeoutError(None, '/', 'Read timed out.'), 1)
+    assert report.summary() == '2 calls, 1 retries, 2 failed (1 HTTP 503, 1 ReadTimeoutError)'
+
+    path = tmp_path / 'errors.jsonl'
+    report.save(str(path))
+    [failure] = [json.loads(line) for line in path.read_text().splitlines()]
+    assert failure['method'] == 'GET' and failure['status'] == 503 and failure['attempts'] == 2
@@ -0,0 +1,105 @@
+import socket
+
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+from urllib3.exceptions import ProtocolError
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import retry
+from evsamples.retry import call_with_retries
+from evsamples.retry import is_transient_error
+from evsamples.retry import is_unsent_error
+
+
+@pytest.mark.parametrize('error', [
+    ApiException(status=429),
+    ApiException(status=503),
+    ApiException(),
+    ProtocolError('Connection aborted.'),
+    ReadTimeoutError(None, '/', 'Read timed out.'),
+    NewConnectionError(None, 'Connection refused'),
+    MaxRetryError(None, '/', NewConnectionError(None, 'Connection refused')),
+    ConnectionResetError(),
+    socket.timeout(),
+])
+def test_transient_errors(error):
+    assert is_transient_error(error)
+
+
+@pytest.mark.parametrize('error', [
+    ApiException(status=400),
+    ApiException(status=401),
+    ApiException(status=404),
+    FileNotFoundError(2, 'No such file or directory'),
+    PermissionError(13, 'Permission denied'),
+    ValueError('bad value'),
+])
+def test_permanent_errors(error):
+    assert not is_transient_error(error)
+
+
+def test_call_with_retries_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+    outcomes = [ApiException(status=503), ConnectionResetError(), 'done']
+
+    def fn():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert call_with_retries(fn, retries=3) == ('done', 3)
+
+
+def test_call_with_retries_raises_permanent_errors_straight_away(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+    calls = []
+
+    def fn():
+        calls.append(1)
+        raise FileNotFoundError(2, 'No such file or directory')
+
+    with pytest.raises(FileNotFoundError):
+        call_with_retries(fn, retries=3)
+    assert len(calls) == 1
+
+
+@pytest.mark.parametrize('error, unsent', [
+    (ApiException(status=429), True),
+    (ApiException(status=503), True),
+    (ApiException(status=500), False),
+    (ApiException(status=409), False),
+    (NewConnectionError(None, 'Connection refused'), True),
+    (MaxRetryError(None, '/', NewConnectionError(None, 'Connection refused')), True),
+    (ReadTimeoutError(None, '/', 'Read timed out.'), False),
+    (MaxRetryError(None, '/', ReadTimeoutError(None, '/', 'Read timed out.')), False),
+    (ProtocolError('Connection aborted.'), False),
+])
+def test_is_unsent_error(error, unsent):
+    assert is_unsent_error(error) == unsent
+
+
+def test_call_with_retries_caps_retry_after(monkeypatch):
+    slept = []
+    monkeypatch.setattr(retry.time, 'sleep', slept.append)
+    throttled = ApiException(status=429)
+    throttled.headers = {'Retry-After': '3600'}
+    outcomes = [throttled, 'done']
+
+    def fn():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    assert call_with_retries(fn, retries=1, max_backoff=30.0) == ('done', 2)
+    assert slept == [30.0]
+
+
+@pytest.mark.parametrize('header, expected', [('5', 5.0), ('-5', 0.0), ('nan', None), ('inf', None), ('soon', None)])
+def test_retry_after_ignores_values_it_cannot_wait_for(header, expected):
+    throttled = ApiException(status=429)
+    throttled.headers = {'Retry-After': header}
+    assert retry.retry_after(throttled) == expected
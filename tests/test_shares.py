@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import retry
+from evsamples.shares import AccessProfiles
+from evsamples.shares import add_shares
+from evsamples.shares import build_share_body
+
+SPEC = {'name': 'client_a', 'resources': '/clients/a', 'access': 'download upload', 'password': 'generate'}
+
+
+class FakeSharesApi(object):
+    """Raises each of `errors` in turn, then creates the share."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def add_share(self, api_key, access_token, body):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return SimpleNamespace(data=SimpleNamespace(id=7, attributes=SimpleNamespace(
+            hash='abc123', paths=body.resources)))
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+
+
+def add_one(shares_api):
+    body = build_share_body(SPEC, AccessProfiles())
+    return list(add_shares(shares_api, 'key', 'token', [body], workers=1))[0]
+
+
+def test_create_that_was_not_sent_is_retried():
+    shares_api = FakeSharesApi(ApiException(status=429),
+                               MaxRetryError(None, '/shares', NewConnectionError(None, 'Connection refused')))
+    result = add_one(shares_api)
+    assert result.error is None and result.share_id == 7 and result.attempts == 3
+    assert result.password is not None
+
+
+@pytest.mark.parametrize('error', [ReadTimeoutError(None, '/shares', 'Read timed out.'), ApiException(status=502)])
+def test_create_that_may_have_worked_is_not_sent_again(error):
+    shares_api = FakeSharesApi(error)
+    result = add_one(shares_api)
+    assert result.error is error
+    assert shares_api.calls == 1
+
+
+@pytest.mark.parametrize('record', [['client_a'], 'client_a', None])
+def test_record_that_is_not_an_object_is_rejected(record):
+    with pytest.raises(ValueError):
+        build_share_body(record, AccessProfiles())
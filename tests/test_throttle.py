@@ -0,0 +1,74 @@
+import contextlib
+
+import pytest
+from exavault.rest import ApiException
+
+from evsamples import throttle
+from evsamples.throttle import AimdController
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(throttle.time, 'time', clock.time)
+    return clock
+
+
+def run_round(controller, clock, seconds):
+    """Start as many calls as the limit allows, let `seconds` pass, then finish them all."""
+    with contextlib.ExitStack() as calls:
+        for _ in range(int(controller.limit)):
+            calls.enter_context(controller.slot())
+        clock.now += seconds
+
+
+def test_limit_grows_to_its_cap_while_calls_are_steady(clock):
+    controller = AimdController(initial=4, max_limit=8)
+    for _ in range(100):
+        run_round(controller, clock, 0.1)
+    assert controller.limit == 8 and controller.decreases == 0
+
+
+def test_limit_recovers_after_a_fast_outlier(clock):
+    controller = AimdController(initial=4, max_limit=8)
+    for _ in range(100):
+        run_round(controller, clock, 0.1)
+    run_round(controller, clock, 0.001)
+    for _ in range(100):
+        run_round(controller, clock, 0.1)
+    assert controller.limit == 8
+    assert controller.decreases <= 1
+
+
+def test_quick_errors_are_not_latency_samples(clock):
+    controller = AimdController(initial=4, max_limit=8)
+    for _ in range(20):
+        with pytest.raises(ApiException):
+            with controller.slot():
+                clock.now += 0.001
+                raise ApiException(status=404)
+    assert controller.baseline is None and controller.limit == 4
+    run_round(controller, clock, 0.1)
+    assert controller.decreases == 0
+
+
+def test_throttled_call_halves_the_limit(clock):
+    controller = AimdController(initial=8, max_limit=8)
+    with pytest.raises(ApiException):
+        with controller.slot():
+            clock.now += 0.1
+            raise ApiException(status=429)
+    assert controller.limit == 4 and controller.decreases == 1
+
+
+def test_initial_limit_is_capped(clock):
+    assert AimdController(max_limit=2).limit == 2
+    assert AimdController(initial=0, min_limit=1).limit == 1
@@ -0,0 +1,58 @@
+import pytest
+from exavault.rest import ApiException
+from urllib3.exceptions import ReadTimeoutError
+
+from evsamples import retry
+from evsamples.users import PermissionProfiles
+from evsamples.users import add_users
+from evsamples.users import build_add_user_body
+
+SPEC = {'username': 'client_a', 'email': 'a@example.com', 'password': 'Secret123!x', 'home_resource': '/a',
+        'permissions': 'download upload list'}
+
+
+class FakeUsersApi(object):
+    """Raises each of `errors` in turn, then creates the user."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def add_user(self, api_key, access_token, body):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return type('Response', (), {'data': type('User', (), {'id': 42})})()
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(retry.time, 'sleep', lambda seconds: None)
+
+
+def add_one(users_api):
+    body = build_add_user_body(SPEC, PermissionProfiles())
+    return list(add_users(users_api, 'key', 'token', [body], workers=1))[0]
+
+
+def test_throttled_create_is_retried():
+    users_api = FakeUsersApi(ApiException(status=429), ApiException(status=503))
+    result = add_one(users_api)
+    assert result.error is None and result.user_id == 42 and result.attempts == 3
+
+
+def test_create_that_may_have_worked_is_not_sent_again():
+    users_api = FakeUsersApi(ReadTimeoutError(None, '/users', 'Read timed out.'))
+    result = add_one(users_api)
+    assert isinstance(result.error, ReadTimeoutError)
+    assert users_api.calls == 1
+
+    users_api = FakeUsersApi(ApiException(status=500))
+    assert add_one(users_api).error.status == 500
+    assert users_api.calls == 1
+
+
+@pytest.mark.parametrize('record', [['client_a'], 'client_a', 7])
+def test_record_that_is_not_an_object_is_rejected(record):
+    with pytest.raises(ValueError):
+        build_add_user_body(record, PermissionProfiles())
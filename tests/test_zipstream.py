@@ -0,0 +1,51 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from evsamples.zipstream import iter_zip
+from evsamples.zipstream import zip_size
+
+
+@pytest.fixture
+def entries(tmp_path):
+    files = {
+        'notes.txt': b'the quick brown fox jumps over the lazy dog\n' * 50000,
+        'empty.csv': b'',
+        'photo.jpg': os.urandom(300000),
+        u'résumé.txt': b'caf\xc3\xa9 ' * 1000,
+    }
+    result = []
+    for name, data in files.items():
+        local_path = tmp_path / name
+        local_path.write_bytes(data)
+        result.append((str(local_path), 'folder/' + name))
+    return result
+
+
+@pytest.mark.parametrize('compression', ['auto', 'deflate', 'store'])
+@pytest.mark.parametrize('level', [None, 1, 9])
+def test_zip_size_matches_the_archive(entries, compression, level):
+    archive = b''.join(iter_zip(entries, compression, level))
+    assert zip_size(entries, compression, level) == len(archive)
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as unzipped:
+        assert unzipped.testzip() is None
+        assert sorted(unzipped.namelist()) == sorted(name for _, name in entries)
+        for local_path, name in entries:
+            with open(local_path, 'rb') as f:
+                assert unzipped.read(name) == f.read()
+
+
+def test_iter_zip_stops_at_a_missing_file(entries, tmp_path):
+    missing = [entries[0], (str(tmp_path / 'missing.txt'), 'missing.txt')]
+    with pytest.raises(FileNotFoundError):
+        list(iter_zip(missing))
+
+
+def test_iter_zip_can_be_abandoned(entries):
+    archive = iter_zip([(local_path, '{}/{}'.format(copy, name)) for copy in range(20) for local_path, name in entries],
+                       'store')
+    next(archive)
+    archive.close()